@@ -0,0 +1,202 @@
+'''
+    (c) adb_backup_parser contributors 2026
+
+    License: MIT
+
+    Purpose: Read call logs and settings directly from an Android backup
+             file (Backup.ab / Backup.adb created by 'adb backup') without
+             extracting it to disk first.
+
+             The backup is a short text header followed by a (usually zlib
+             compressed) tar stream. The tar is decompressed on the fly and
+             only the 'apps/<package>/k' members of interest are read, one
+             at a time, and handed to the existing parsers.
+
+             Only unencrypted backups are supported.
+
+    Requires: Python 3 and construct
+              Construct can be installed via 'pip install construct' on Windows
+              or 'pip3 install construct' on Linux
+'''
+
+from backup_reader import IterEntities
+import argparse
+import io
+import os
+import tarfile
+import zlib
+
+import callparser
+import providers_settings_parser
+
+BACKUP_MAGIC = b'ANDROID BACKUP\n'
+CALLLOG_PACKAGE = 'com.android.calllogbackup'
+SETTINGS_PACKAGE = 'com.android.providers.settings'
+READ_CHUNK_SIZE = 1024 * 1024
+
+class BackupFormatError(Exception):
+    pass
+
+class ZlibStreamReader(io.RawIOBase):
+    '''
+        Read-only file object that inflates a zlib stream from another file
+        object on demand, never holding more than a chunk of either the
+        compressed or decompressed data.
+    '''
+    def __init__(self, compressed_file):
+        self._file = compressed_file
+        self._decompressor = zlib.decompressobj()
+        self._pending = b''
+        self._out = b''
+        self._out_pos = 0
+        self._truncated = False
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while self._out_pos >= len(self._out):
+            if self._decompressor.eof or self._truncated:
+                return 0
+            if not self._pending:
+                self._pending = self._file.read(READ_CHUNK_SIZE)
+                if not self._pending:
+                    print('Error, compressed backup stream ended prematurely, backup may be truncated')
+                    self._truncated = True
+                    return 0
+            self._out = self._decompressor.decompress(self._pending, READ_CHUNK_SIZE)
+            self._pending = self._decompressor.unconsumed_tail
+            self._out_pos = 0
+        size = min(len(buffer), len(self._out) - self._out_pos)
+        buffer[:size] = self._out[self._out_pos:self._out_pos + size]
+        self._out_pos += size
+        return size
+
+def ReadBackupHeader(f):
+    '''
+        Reads the text header of an Android backup, leaving f positioned at
+        the start of the tar stream. Returns (version, is_compressed, encryption)
+    '''
+    magic = f.read(len(BACKUP_MAGIC))
+    if magic != BACKUP_MAGIC:
+        raise BackupFormatError('Not an Android backup file, header was {}'.format(magic))
+    try:
+        version = int(f.readline().strip())
+        is_compressed = int(f.readline().strip()) == 1
+    except ValueError as ex:
+        raise BackupFormatError('Invalid backup header : ' + str(ex))
+    encryption = f.readline().strip().decode('utf8', 'replace')
+    return version, is_compressed, encryption
+
+def GetPackageName(member_name):
+    '''Returns the package name if member_name is under apps/<package>/k, else None'''
+    parts = member_name.replace('\\', '/').split('/')
+    if len(parts) >= 3 and parts[0] == 'apps' and parts[2] == 'k':
+        return parts[1]
+    return None
+
+def IterBackupDataFiles(f, packages=(CALLLOG_PACKAGE, SETTINGS_PACKAGE)):
+    '''
+        Generator yielding (package, member_name, data) for every key/value
+        data file of the wanted packages found while streaming the backup.
+        Only one member is held in memory at a time.
+
+        args:
+            f: backup file opened in binary mode
+            packages: package names to extract
+    '''
+    version, is_compressed, encryption = ReadBackupHeader(f)
+    if encryption.lower() != 'none':
+        raise BackupFormatError('Encrypted backups ({}) are not supported'.format(encryption))
+    tar_stream = io.BufferedReader(ZlibStreamReader(f), READ_CHUNK_SIZE) if is_compressed else f
+    with tarfile.open(fileobj=tar_stream, mode='r|') as tar:
+        for member in tar:
+            if not member.isfile():
+                continue
+            package = GetPackageName(member.name)
+            if package in packages:
+                yield package, member.name, tar.extractfile(member).read()
+
+def GetSettingsFormats(formats):
+    '''Settings are always written as json, and also in any of the (call log) formats the settings parser supports'''
+    return ['json'] + [fmt for fmt in formats if fmt != 'json' and fmt in providers_settings_parser.OUTPUT_FORMATS]
+
+def ParseBackup(input_path, output_path, formats=callparser.DEFAULT_FORMATS, call_filter=None, settings_keys=None):
+    '''
+        Parses call logs and settings out of the Android backup at
+        input_path, writing output to output_path. call_filter (a
+        callparser.CallLogFilter) and settings_keys (set of keys) limit
+        what is decoded.
+        Returns list of package names that were found and parsed.
+    '''
+    parsed = []
+    with open(input_path, 'rb') as f:
+        for package, member_name, data in IterBackupDataFiles(f):
+            print('Found {} in backup'.format(member_name))
+            source = input_path + '/' + member_name
+            if package == CALLLOG_PACKAGE:
+                callparser.ParseCallLogs(IterEntities(data), output_path, formats, source=source, call_filter=call_filter)
+            elif package == SETTINGS_PACKAGE:
+                providers_settings_parser.ParseSettings(IterEntities(data, keys=settings_keys), output_path,
+                                                        GetSettingsFormats(formats), source, settings_keys)
+            parsed.append(package)
+    return parsed
+
+def main():
+    usage = "Parser for call logs and settings in an Android backup (Backup.ab)"\
+            "\n--------------------------------------------"\
+            "\nUsage: android_backup.py backup_file output_folder"\
+            "\nExample: android_backup.py  Backup.ab  c:\\output_folder\\"\
+            "\n\nReads apps/{}/k and apps/{}/k".format(CALLLOG_PACKAGE, SETTINGS_PACKAGE) + \
+            "\nstraight from the compressed backup, nothing is extracted to disk."\
+            "\nOnly unencrypted backups are supported."\
+            "\nNote: All times in output are UTC"\
+            "\nSend bugs/comments to yogesh@swiftforensics.com"
+
+    parser = argparse.ArgumentParser(description=usage, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('backup_file', help='Path to Android backup file')
+    parser.add_argument('output_folder', help='Folder to write output files to')
+    parser.add_argument('--formats', default='csv,json',
+                        help='Call log output formats from {} (default: csv,json), settings are written as json and to sqlite if chosen'.format(','.join(callparser.OUTPUT_FORMATS)))
+    callparser.AddFilterArguments(parser)
+    parser.add_argument('--settings-keys', help='Comma separated settings keys to parse (eg: secure,wifi_new_config)')
+    args = parser.parse_args()
+
+    input_path = args.backup_file
+    output_path = args.output_folder
+    formats = callparser.GetOutputFormats(args.formats)
+    if formats is None:
+        return
+    call_filter = callparser.GetCallLogFilter(args)
+    if call_filter is False:
+        return
+    settings_keys = None
+    if args.settings_keys:
+        settings_keys = set(key.strip() for key in args.settings_keys.split(',') if key.strip())
+
+    if not os.path.exists(input_path):
+        print("Error: Failed to find file at specified path. Path was : " + input_path)
+        return
+    if not os.path.isdir(output_path):
+        if os.path.isfile(output_path):
+            print("Error: There is already a file existing by that name. Cannot create folder : " + output_path)
+            return
+        try:
+            os.makedirs(output_path)
+        except OSError as ex:
+            print("Error: Cannot create output folder : " + output_path + "\nError Details: " + str(ex))
+            return
+
+    try:
+        print("Trying to read backup " + input_path)
+        parsed = ParseBackup(input_path, output_path, formats, call_filter, settings_keys)
+        for package in (CALLLOG_PACKAGE, SETTINGS_PACKAGE):
+            if package not in parsed:
+                print("No data for {} found in backup".format(package))
+    except BackupFormatError as ex:
+        print("Error: " + str(ex))
+    except (OSError, tarfile.TarError, zlib.error) as ex:
+        print("Error: Cannot read backup : " + input_path + "\nError Details: " + str(ex))
+
+if __name__ == '__main__':
+    main()
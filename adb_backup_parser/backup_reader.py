@@ -0,0 +1,296 @@
+'''
+    (c) adb_backup_parser contributors 2026
+
+    License: MIT
+
+    Purpose: Shared reader for the entity stream found in backup 'k' files
+             (<Backup.adb>/apps/<package>/k). Each entity is laid out as
+
+               'Data' | size_key (uint32 LE) | size_data (uint32 LE)
+               key + NUL, padded to 4 bytes
+               data (size_data bytes), padded to 4 bytes
+
+             A size_data of 0xFFFFFFFF marks a deleted entity (no data).
+
+             The file is memory-mapped and entities are handed out as
+             memoryview slices over the map, so no per-record copies or
+             read/seek calls are needed.
+
+             IterEntityLocations() walks the stream and records where each
+             entity is, IterEntities() hands out the data of those entities.
+
+             CarveEntities() recovers what it can from damaged files or
+             raw images by resyncing on the 'Data' signature.
+
+    Requires: Python 3
+'''
+
+import mmap
+import struct
+
+DATA_MAGIC = b'Data'
+DATA_HEADER_SIZE = 12
+DELETED_ENTITY_SIZE = 0xFFFFFFFF
+
+_data_header = struct.Struct('<4sII')
+
+def Align4(pos):
+    '''Returns pos rounded up to the next 4 byte boundary'''
+    return (pos + 3) & ~3
+
+def ReadEntityKey(buf, pos=0):
+    '''
+        Returns the key (without NUL terminator) of the entity whose header
+        is at pos, or None if there is no valid header there. Only the
+        header and key need to be present in buf.
+    '''
+    if len(buf) - pos < DATA_HEADER_SIZE:
+        return None
+    magic, size_key, size_data = _data_header.unpack_from(buf, pos)
+    key_start = pos + DATA_HEADER_SIZE
+    if magic != DATA_MAGIC or key_start + size_key > len(buf):
+        return None
+    try:
+        return str(buf[key_start:key_start + size_key], 'utf8')
+    except UnicodeDecodeError:
+        return None
+
+def IterEntityLocations(buf, pos=0):
+    '''
+        Generator yielding (key, data_offset, size_data) for every entity in
+        buf, with key utf8 decoded and not including its NUL terminator.
+        Deleted entities are skipped. Iteration stops with an error message
+        at the first truncated or invalid header. This is the one walk over
+        the entity stream, IterEntities() and the offset indexes (see
+        entity_index.py) are built on it.
+    '''
+    size = len(buf)
+    unpack_header = _data_header.unpack_from
+    while pos < size:
+        if size - pos < DATA_HEADER_SIZE:
+            print('Error, read less than 12 bytes from file, expected full Data header!')
+            break
+        magic, size_key, size_data = unpack_header(buf, pos)
+        if magic != DATA_MAGIC:
+            print('Error, invalid Data header at offset {}, found {}'.format(pos, bytes(magic)))
+            break
+        pos += DATA_HEADER_SIZE
+        key_end = pos + size_key
+        if key_end + 1 > size:
+            print('Error, key at offset {} runs past end of file'.format(pos))
+            break
+        key = str(buf[pos:key_end], 'utf8')
+        pos = Align4(key_end + 1)
+        if size_data != DELETED_ENTITY_SIZE:
+            if pos + size_data > size:
+                print('Error, data for key {} at offset {} runs past end of file'.format(key, pos))
+                break
+            yield key, pos, size_data
+            pos = Align4(pos + size_data)
+
+def IterEntities(buf, pos=0, keys=None):
+    '''
+        Generator yielding (key, data) for every entity in buf, where
+        key is the utf8 decoded key (including its NUL terminator, as
+        stored on disk) and data is a memoryview over buf. Walks the
+        entities with IterEntityLocations(), so deleted entities are
+        skipped and iteration stops at the first bad header.
+
+        args:
+            buf: bytes, mmap or memoryview holding the entity stream
+            pos: offset to start reading from
+            keys: optional set of keys (without NUL) to return, the data
+                  of all other entities is stepped over without being read
+    '''
+    view = memoryview(buf)
+    for key, data_offset, size_data in IterEntityLocations(view, pos):
+        if keys is None or key in keys:
+            yield key + '\x00', view[data_offset:data_offset + size_data]
+
+def SplitEntities(buf, entities_per_chunk):
+    '''
+        Framing pass that cuts the entity stream into chunks of (at most)
+        entities_per_chunk entities, so they can be decoded in parallel.
+        Returns list of (start, end) offsets, chunk i is read with
+        IterEntities(view[:end], start).
+    '''
+    chunks = []
+    start = 0
+    end = 0
+    count = 0
+    for _, data_offset, size_data in IterEntityLocations(buf):
+        end = data_offset + Align4(size_data)
+        count += 1
+        if count == entities_per_chunk:
+            chunks.append((start, end))
+            start = end
+            count = 0
+    if count:
+        chunks.append((start, end))
+    return chunks
+
+MAX_CARVE_KEY_SIZE = 1024
+MAX_CARVE_DATA_SIZE = 256 * 1024 * 1024
+
+def ReadPlausibleEntity(view, pos):
+    '''
+        Checks whether a believable entity header starts at pos. Returns
+        (key, data_start, data_end, next_pos) if so, else None. data_start
+        and data_end are None for deleted entities.
+    '''
+    size = len(view)
+    if size - pos < DATA_HEADER_SIZE:
+        return None
+    magic, size_key, size_data = _data_header.unpack_from(view, pos)
+    if magic != DATA_MAGIC or size_key == 0 or size_key > MAX_CARVE_KEY_SIZE:
+        return None
+    # Padding is relative to the entity, carved data need not be 4 byte aligned in buf
+    key_start = pos + DATA_HEADER_SIZE
+    key_end = key_start + size_key + 1
+    data_start = pos + Align4(DATA_HEADER_SIZE + size_key + 1)
+    if data_start > size or view[key_end - 1] != 0:
+        return None
+    if any(view[key_end:data_start]): # padding is always zero
+        return None
+    try:
+        key = str(view[key_start:key_end], 'utf8')
+    except UnicodeDecodeError:
+        return None
+    if not key[:-1].isprintable():
+        return None
+    if size_data == DELETED_ENTITY_SIZE:
+        return key, None, None, data_start
+    data_end = data_start + size_data
+    if size_data > MAX_CARVE_DATA_SIZE or data_end > size:
+        return None
+    return key, data_start, data_end, data_start + Align4(size_data)
+
+def CarveEntities(buf, validate=None, skipped=None):
+    '''
+        Recovery version of IterEntities() for damaged files, carved
+        fragments or raw images. Entities are read in sequence for as long
+        as they look right; after a bad one the buffer is searched for the
+        next b'Data' signature whose header, key and sizes are plausible
+        (and, if given, for which validate(key, data) returns True).
+
+        args:
+            buf: bytes, mmap or memoryview to scan
+            validate: optional function(key, data) -> bool to vet candidates
+            skipped: optional list, gets (start, end) of every region that
+                     could not be read as an entity
+    '''
+    view = memoryview(buf)
+    size = len(view)
+    find = buf.find if hasattr(buf, 'find') else bytes(view).find
+    pos = 0
+    skip_start = None
+    while pos < size:
+        entity = ReadPlausibleEntity(view, pos)
+        if entity is not None:
+            key, data_start, data_end, next_pos = entity
+            data = None if data_start is None else view[data_start:data_end]
+            if data is None or validate is None or validate(key, data):
+                if skip_start is not None:
+                    if skipped is not None:
+                        skipped.append((skip_start, pos))
+                    skip_start = None
+                if data is not None:
+                    yield key, data
+                pos = min(next_pos, size)
+                continue
+        # Not a (valid) entity here, resync on the next signature
+        if skip_start is None:
+            skip_start = pos
+        next_magic = find(DATA_MAGIC, pos + 1)
+        if next_magic == -1:
+            pos = size
+        else:
+            pos = next_magic
+    if skip_start is not None and skipped is not None:
+        skipped.append((skip_start, size))
+
+def PrintSkippedRegions(skipped, max_listed=20):
+    '''Prints a summary of regions skipped by CarveEntities()'''
+    if not skipped:
+        print('Recovery: no unreadable regions found')
+        return
+    total = sum(end - start for start, end in skipped)
+    print('Recovery: skipped {} unreadable region(s), {} bytes in total'.format(len(skipped), total))
+    for start, end in skipped[:max_listed]:
+        print('  offset {} - {} ({} bytes)'.format(start, end, end - start))
+    if len(skipped) > max_listed:
+        print('  ... and {} more'.format(len(skipped) - max_listed))
+
+class BackupDataFile:
+    '''
+        Memory-mapped backup data file. Use as a context manager:
+
+            with BackupDataFile(path) as backup:
+                for key, data in backup.entities():
+                    ...
+    '''
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        self._map = None
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError: # Cannot map an empty file
+            pass
+
+    @property
+    def size(self):
+        return len(self._map) if self._map is not None else 0
+
+    def entities(self, keys=None, start=0, end=None):
+        '''
+            Generator yielding (key, memoryview) for every entity in the
+            file, or only those in keys if given. start and end limit the
+            walk to a part of the file, e.g. a chunk from split().
+        '''
+        if self._map is None:
+            return iter(())
+        if end is not None:
+            return IterEntities(memoryview(self._map)[:end], start, keys)
+        return IterEntities(self._map, start, keys)
+
+    def split(self, entities_per_chunk):
+        '''Returns list of (start, end) offsets of chunks of entities, see SplitEntities()'''
+        if self._map is None:
+            return []
+        return SplitEntities(self._map, entities_per_chunk)
+
+    def carve_entities(self, validate=None, skipped=None):
+        '''Generator yielding (key, memoryview) for every entity that CarveEntities() can recover'''
+        if self._map is None:
+            return iter(())
+        return CarveEntities(self._map, validate, skipped)
+
+    def entity_locations(self, pos=0):
+        '''Generator yielding (key, data_offset, size_data) for every entity in the file, starting at offset pos'''
+        if self._map is None:
+            return iter(())
+        return IterEntityLocations(self._map, pos)
+
+    def read_at(self, offset, size):
+        '''Returns a memoryview of size bytes at offset, or None if that runs past end of file'''
+        if self._map is None or offset < 0 or offset + size > len(self._map):
+            return None
+        return memoryview(self._map)[offset:offset + size]
+
+    def close(self):
+        if self._map is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                # A caller still holds a memoryview into the map, it is
+                # unmapped once the last reference goes away.
+                pass
+            self._map = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,238 @@
+'''
+    (c) adb_backup_parser contributors 2026
+
+    License: MIT
+
+    Purpose: Parse many backup files in one go. Inputs are given as files,
+             folders (searched recursively) or a manifest listing one path
+             per line. The parser needed for each file is detected from its
+             name or contents:
+
+               Android backup (.ab)                -> android_backup.py
+               com.android.calllogbackup.data      -> callparser.py
+               com.android.providers.settings.data -> providers_settings_parser.py
+
+             Files are spread over a pool of worker processes and each one
+             gets its own output folder, holding the parser's normal output
+             and a parse_log.txt with everything it printed. A failure on
+             one input is recorded and the batch carries on.
+
+    Requires: Python 3 and construct
+              Construct can be installed via 'pip install construct' on Windows
+              or 'pip3 install construct' on Linux
+'''
+
+from backup_reader import BackupDataFile, ReadEntityKey
+import argparse
+import concurrent.futures
+import contextlib
+import json
+import os
+import time
+import traceback
+
+import android_backup
+import callparser
+import entity_index
+import providers_settings_parser
+
+INPUT_BACKUP = 'backup'
+INPUT_CALLLOG = 'calllog'
+INPUT_SETTINGS = 'settings'
+
+SETTINGS_KEYS = ('system', 'secure', 'global', 'locale', 'lock_settings',
+                 'softap_config', 'network_policies', 'wifi_new_config')
+SNIFF_SIZE = 4096
+
+def DetectInputType(path):
+    '''
+        Returns INPUT_BACKUP, INPUT_CALLLOG or INPUT_SETTINGS depending on
+        which parser the file at path needs, or None if it is not recognised
+    '''
+    with open(path, 'rb') as f:
+        head = f.read(SNIFF_SIZE)
+    if head.startswith(android_backup.BACKUP_MAGIC):
+        return INPUT_BACKUP
+    if not head.startswith(b'Data'):
+        return None
+    name = path.replace('\\', '/').lower()
+    if 'calllogbackup' in name:
+        return INPUT_CALLLOG
+    if 'providers.settings' in name:
+        return INPUT_SETTINGS
+    # Fall back to looking at the first key
+    key = ReadEntityKey(head)
+    if key in SETTINGS_KEYS:
+        return INPUT_SETTINGS
+    if key and key.isdigit(): # call log entities are keyed by serial number
+        return INPUT_CALLLOG
+    return None
+
+def FindInputs(paths, manifest_path=None, exclude_path=None):
+    '''
+        Returns list of (input_path, root) for all files in paths (files or
+        folders searched recursively) and in the manifest, if given. root is
+        the folder the file was found under, or None. Folders are not
+        searched below exclude_path (the output folder), so the batch does
+        not pick up its own output.
+    '''
+    exclude_path = os.path.realpath(exclude_path) if exclude_path else None
+    if manifest_path:
+        with open(manifest_path, 'r', encoding='utf8') as manifest:
+            for line in manifest:
+                line = line.strip()
+                if line and not line.startswith('#'):
+                    paths.append(line)
+    inputs = []
+    for path in paths:
+        if os.path.isdir(path):
+            for folder, folders, files in os.walk(path):
+                if exclude_path:
+                    folders[:] = [name for name in folders if os.path.realpath(os.path.join(folder, name)) != exclude_path]
+                for name in sorted(files):
+                    if name.endswith(entity_index.INDEX_SUFFIX): # our own sidecar index files
+                        continue
+                    inputs.append((os.path.join(folder, name), path))
+        else:
+            inputs.append((path, None))
+    return inputs
+
+def GetOutputFolderName(input_path, root, used_names):
+    '''Returns a unique output folder name for input_path (relative to root if given)'''
+    rel_path = os.path.relpath(input_path, root) if root else os.path.basename(input_path)
+    name = rel_path.replace(os.sep, '_').replace('/', '_').replace(':', '_')
+    unique_name = name
+    index = 2
+    while unique_name in used_names:
+        unique_name = '{}_{}'.format(name, index)
+        index += 1
+    used_names.add(unique_name)
+    return unique_name
+
+def ProcessInput(input_type, input_path, output_path, formats):
+    '''
+        Parses one input file, run inside a worker process. All parser output
+        is captured to parse_log.txt in output_path. Never raises, returns
+        a result dict for the batch summary.
+    '''
+    result = { 'input' : input_path, 'type' : input_type, 'output' : output_path,
+               'status' : 'failed', 'error' : '', 'warnings' : 0, 'seconds' : 0 }
+    start_time = time.time()
+    try:
+        os.makedirs(output_path, exist_ok=True)
+        log_path = os.path.join(output_path, 'parse_log.txt')
+        with open(log_path, 'w', encoding='utf8') as log, contextlib.redirect_stdout(log):
+            try:
+                if input_type == INPUT_BACKUP:
+                    android_backup.ParseBackup(input_path, output_path, formats)
+                elif input_type == INPUT_CALLLOG:
+                    with BackupDataFile(input_path) as backup:
+                        if callparser.ParseCallLogs(backup.entities(), output_path, formats, source=input_path) is None:
+                            raise OSError('Could not create output files')
+                elif input_type == INPUT_SETTINGS:
+                    with BackupDataFile(input_path) as backup:
+                        providers_settings_parser.ParseSettings(backup.entities(), output_path,
+                                                                android_backup.GetSettingsFormats(formats), input_path)
+                result['status'] = 'ok'
+            except Exception as ex:
+                traceback.print_exc(file=log)
+                result['error'] = '{}: {}'.format(type(ex).__name__, ex)
+        with open(log_path, 'r', encoding='utf8') as log:
+            result['warnings'] = sum(1 for line in log if line.startswith('Error'))
+    except Exception as ex: # Could not even create output folder or log
+        result['error'] = '{}: {}'.format(type(ex).__name__, ex)
+    result['seconds'] = round(time.time() - start_time, 3)
+    return result
+
+def RunBatch(inputs, output_root, formats=callparser.DEFAULT_FORMATS, jobs=None):
+    '''
+        Detects and parses every input on a process pool of 'jobs' workers
+        (default: number of cpus). Returns list of result dicts, one per input.
+    '''
+    results = []
+    used_names = set()
+    futures = {}
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as pool:
+        for input_path, root in inputs:
+            try:
+                input_type = DetectInputType(input_path)
+            except OSError as ex:
+                results.append({ 'input' : input_path, 'type' : None, 'output' : '',
+                                 'status' : 'failed', 'error' : str(ex), 'warnings' : 0, 'seconds' : 0 })
+                continue
+            if input_type is None:
+                results.append({ 'input' : input_path, 'type' : None, 'output' : '',
+                                 'status' : 'skipped', 'error' : 'Unrecognised file type', 'warnings' : 0, 'seconds' : 0 })
+                continue
+            output_path = os.path.join(output_root, GetOutputFolderName(input_path, root, used_names))
+            future = pool.submit(ProcessInput, input_type, input_path, output_path, formats)
+            futures[future] = (input_path, input_type, output_path)
+
+        for future in concurrent.futures.as_completed(futures):
+            input_path, input_type, output_path = futures[future]
+            try:
+                result = future.result()
+            except Exception as ex: # Worker process died
+                result = { 'input' : input_path, 'type' : input_type, 'output' : output_path,
+                           'status' : 'failed', 'error' : '{}: {}'.format(type(ex).__name__, ex), 'warnings' : 0, 'seconds' : 0 }
+            print('[{}] {} ({}) {}'.format(result['status'], input_path, input_type, result['error']))
+            results.append(result)
+    return results
+
+def main():
+    usage = "Batch parser for many backup files at once"\
+            "\n--------------------------------------------"\
+            "\nUsage: batch_parser.py [-m manifest.txt] [-j jobs] input [input ..] output_folder"\
+            "\nExample: batch_parser.py  -j 8  c:\\cases\\device_backups  c:\\output_folder\\"\
+            "\n\nInputs can be .ab backups, com.android.calllogbackup.data or"\
+            "\ncom.android.providers.settings.data files, or folders holding them."\
+            "\nEach input gets its own output folder, a summary is written to"\
+            "\nbatch_summary.json in the output folder."\
+            "\nNote: All times in output are UTC"\
+            "\nSend bugs/comments to yogesh@swiftforensics.com"
+
+    parser = argparse.ArgumentParser(description=usage, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('inputs', nargs='*', help='Input files or folders')
+    parser.add_argument('output_folder', help='Folder to write output folders to')
+    parser.add_argument('-m', '--manifest', help='Text file listing input paths, one per line')
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='Number of worker processes (default: number of cpus)')
+    parser.add_argument('--formats', default='csv,json',
+                        help='Call log output formats from {} (default: csv,json)'.format(','.join(callparser.OUTPUT_FORMATS)))
+    args = parser.parse_args()
+
+    formats = callparser.GetOutputFormats(args.formats)
+    if formats is None:
+        return
+    if args.jobs is not None and args.jobs < 1:
+        print("Error: jobs must be 1 or more")
+        return
+    if not args.inputs and not args.manifest:
+        print("Error: No inputs given..")
+        print(usage)
+        return
+
+    output_path = args.output_folder
+    if os.path.isfile(output_path):
+        print("Error: There is already a file existing by that name. Cannot create folder : " + output_path)
+        return
+    try:
+        os.makedirs(output_path, exist_ok=True)
+        inputs = FindInputs(list(args.inputs), args.manifest, output_path)
+    except OSError as ex:
+        print("Error: " + str(ex))
+        return
+
+    print("Processing {} input files".format(len(inputs)))
+    results = RunBatch(inputs, output_path, formats, args.jobs)
+
+    summary_path = os.path.join(output_path, 'batch_summary.json')
+    with open(summary_path, 'w') as summary_file:
+        json.dump({ 'results' : results }, summary_file, indent=2)
+    counts = {}
+    for result in results:
+        counts[result['status']] = counts.get(result['status'], 0) + 1
+    print("Done. " + ", ".join('{} {}'.format(count, status) for status, count in sorted(counts.items())))
+    print("Summary written to " + summary_path)
+
+if __name__ == '__main__':
+    main()
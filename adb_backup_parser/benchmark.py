@@ -0,0 +1,293 @@
+'''
+    (c) adb_backup_parser contributors 2026
+
+    License: MIT
+
+    Purpose: Measure parser throughput on synthetic data (see
+             generate_test_data.py). Every stage of parsing and output is
+             timed on its own, in a fresh process, and reported as
+             records/sec, MB/sec (of input) and peak RSS.
+
+             Results can be saved as JSON and compared against an earlier
+             run to check whether a change helped.
+
+    Requires: Python 3 and construct
+              Peak RSS is only reported where the 'resource' module exists
+              (Linux/macOS).
+'''
+
+from backup_reader import BackupDataFile
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError: # Windows
+    resource = None
+
+import callparser
+import generate_test_data
+import providers_settings_parser
+
+SETTINGS_NAME_VALUE_KEYS = ('system', 'secure', 'global')
+
+def GetPeakRss():
+    '''Returns peak resident set size of this process in bytes, or None if unavailable'''
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+def GetFolderSize(path):
+    return sum(os.path.getsize(os.path.join(folder, name)) for folder, _, names in os.walk(path) for name in names)
+
+# Each stage takes (input_path, scratch_folder) and returns (records, bytes_written)
+
+def StageCallLogFraming(input_path, out_path):
+    records = 0
+    with BackupDataFile(input_path) as backup:
+        for key, data in backup.entities():
+            records += 1
+    return records, 0
+
+def StageCallLogDecodeNative(input_path, out_path):
+    records = 0
+    decode = callparser.DecodeCallRecord
+    with BackupDataFile(input_path) as backup:
+        for key, data in backup.entities():
+            decode(data)
+            records += 1
+    return records, 0
+
+def StageCallLogDecodeConstruct(input_path, out_path):
+    records = 0
+    decode = callparser.DecodeCallRecordConstruct
+    with BackupDataFile(input_path) as backup:
+        for key, data in backup.entities():
+            decode(data)
+            records += 1
+    return records, 0
+
+def StageCallLogFormat(input_path, out_path):
+    records = 0
+    with BackupDataFile(input_path) as backup:
+        for key, data in backup.entities():
+            callparser.GetCallLogRecord(key, data)
+            records += 1
+    return records, 0
+
+def StageCallLogFormatColumnar(input_path, out_path):
+    records = 0
+    decode = callparser.DecodeCallRecord
+    batch = callparser.CallLogBatch()
+    with BackupDataFile(input_path) as backup:
+        for key, data in backup.entities():
+            batch.append(key, decode(data))
+            if len(batch) >= callparser.COLUMNAR_BATCH_SIZE:
+                records += len(batch.tuples())
+                batch.clear()
+    records += len(batch.tuples())
+    return records, 0
+
+def MakeCallLogOutputStage(output_format, columnar=False):
+    def StageCallLogOutput(input_path, out_path):
+        with BackupDataFile(input_path) as backup, contextlib.redirect_stdout(None):
+            records = callparser.ParseCallLogs(backup.entities(), out_path, [output_format], columnar=columnar)
+        return records, GetFolderSize(out_path)
+    return StageCallLogOutput
+
+def MakeCallLogParallelStage(jobs):
+    def StageCallLogParallel(input_path, out_path):
+        with contextlib.redirect_stdout(None):
+            records = callparser.ParseCallLogsParallel(input_path, out_path, ['csv'], jobs=jobs)
+        return records, GetFolderSize(out_path)
+    return StageCallLogParallel
+
+def StageSettingsFraming(input_path, out_path):
+    records = 0
+    with BackupDataFile(input_path) as backup:
+        for key, data in backup.entities():
+            records += 1
+    return records, 0
+
+def StageSettingsNameValues(input_path, out_path):
+    records = 0
+    with BackupDataFile(input_path) as backup:
+        for key, data in backup.entities():
+            key = key.rstrip('\x00')
+            logs = []
+            if key in SETTINGS_NAME_VALUE_KEYS:
+                providers_settings_parser.ReadNameValuePairs(data, logs)
+            elif key == 'lock_settings':
+                providers_settings_parser.ReadNameValue2Pairs(data, logs)
+            records += sum(len(items) for items in logs)
+    return records, 0
+
+def StageSettingsWifi(input_path, out_path):
+    records = 0
+    with BackupDataFile(input_path) as backup:
+        for key, data in backup.entities():
+            if key.rstrip('\x00') == 'wifi_new_config':
+                logs = []
+                providers_settings_parser.ReadWifiNewConfig(data, logs)
+                records += len(logs)
+    return records, 0
+
+def StageSettingsOutput(input_path, out_path):
+    with BackupDataFile(input_path) as backup, contextlib.redirect_stdout(None):
+        settings = providers_settings_parser.ParseSettings(backup.entities(), out_path)
+    records = sum(len(items) for data in settings.values() for items in data)
+    return records, GetFolderSize(out_path)
+
+# name : (data type, function, is_slow)
+STAGES = {
+    'calllog.framing'          : ('calllog', StageCallLogFraming, False),
+    'calllog.decode.native'    : ('calllog', StageCallLogDecodeNative, False),
+    'calllog.decode.construct' : ('calllog', StageCallLogDecodeConstruct, True),
+    'calllog.format'           : ('calllog', StageCallLogFormat, False),
+    'calllog.format.columnar'  : ('calllog', StageCallLogFormatColumnar, False),
+    'calllog.output.csv'       : ('calllog', MakeCallLogOutputStage('csv'), False),
+    'calllog.output.json'      : ('calllog', MakeCallLogOutputStage('json'), False),
+    'calllog.output.ndjson'    : ('calllog', MakeCallLogOutputStage('ndjson'), False),
+    'calllog.output.csv.columnar' : ('calllog', MakeCallLogOutputStage('csv', True), False),
+    'calllog.output.csv.parallel' : ('calllog', MakeCallLogParallelStage(None), False),
+    'settings.framing'         : ('settings', StageSettingsFraming, False),
+    'settings.name_values'     : ('settings', StageSettingsNameValues, False),
+    'settings.wifi'            : ('settings', StageSettingsWifi, False),
+    'settings.output'          : ('settings', StageSettingsOutput, False),
+}
+
+def RunStage(stage_name, input_path, result_queue):
+    '''Runs a single stage (in a child process) and puts its measurements on result_queue'''
+    out_path = tempfile.mkdtemp(prefix='bench_out_')
+    try:
+        stage_function = STAGES[stage_name][1]
+        start_time = time.perf_counter()
+        records, bytes_written = stage_function(input_path, out_path)
+        elapsed = time.perf_counter() - start_time
+        result_queue.put({ 'seconds' : elapsed, 'records' : records,
+                           'bytes_written' : bytes_written, 'peak_rss' : GetPeakRss() })
+    except Exception as ex:
+        result_queue.put({ 'error' : '{}: {}'.format(type(ex).__name__, ex) })
+    finally:
+        shutil.rmtree(out_path, ignore_errors=True)
+
+def MeasureStage(stage_name, input_path, repeat):
+    '''Runs a stage 'repeat' times, each in a fresh process, and returns the fastest run'''
+    context = multiprocessing.get_context('spawn')
+    best = None
+    for _ in range(repeat):
+        result_queue = context.Queue()
+        process = context.Process(target=RunStage, args=(stage_name, input_path, result_queue))
+        process.start()
+        result = result_queue.get()
+        process.join()
+        if 'error' in result:
+            return result
+        if best is None or result['seconds'] < best['seconds']:
+            best = result
+    input_size = os.path.getsize(input_path)
+    seconds = max(best['seconds'], 1e-9)
+    best['input_bytes'] = input_size
+    best['records_per_sec'] = round(best['records'] / seconds, 1)
+    best['mb_per_sec'] = round(input_size / (1024 * 1024) / seconds, 2)
+    best['seconds'] = round(best['seconds'], 4)
+    return best
+
+def FormatRss(peak_rss):
+    return '{:.1f}'.format(peak_rss / (1024 * 1024)) if peak_rss else '-'
+
+def PrintResults(results, baseline=None):
+    print('{:<28} {:>10} {:>9} {:>13} {:>9} {:>10}{}'.format('stage', 'records', 'seconds', 'records/sec', 'MB/sec',
+                                                              'peak MB', '   vs baseline' if baseline else ''))
+    for stage_name, result in results.items():
+        if 'error' in result:
+            print('{:<28} failed: {}'.format(stage_name, result['error']))
+            continue
+        line = '{:<28} {:>10} {:>9.3f} {:>13.0f} {:>9.2f} {:>10}'.format(
+                stage_name, result['records'], result['seconds'], result['records_per_sec'],
+                result['mb_per_sec'], FormatRss(result['peak_rss']))
+        previous = (baseline or {}).get(stage_name)
+        if previous and previous.get('records_per_sec'):
+            line += '   {:+.1f}%'.format((result['records_per_sec'] / previous['records_per_sec'] - 1) * 100)
+        print(line)
+
+def main():
+    usage = "Benchmark for the backup parsers"\
+            "\n--------------------------------------------"\
+            "\nUsage: benchmark.py [--records N | --size SIZE] [--stages a,b] [--save results.json] [--compare old.json]"\
+            "\nExample: benchmark.py  --size 100MB  --save after.json  --compare before.json"\
+            "\n\nSynthetic input is generated with generate_test_data.py unless"\
+            "\n--calllog-input/--settings-input point to existing files."\
+            "\nStages: " + ', '.join(STAGES) + \
+            "\nSend bugs/comments to yogesh@swiftforensics.com"
+
+    parser = argparse.ArgumentParser(description=usage, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--records', type=int, help='Call records to generate, settings get records/10 per table (default: 100000)')
+    parser.add_argument('--size', help='Target size of generated call log file, e.g. 64MB (instead of --records)')
+    parser.add_argument('--calllog-input', help='Use this call log data file instead of generating one')
+    parser.add_argument('--settings-input', help='Use this settings data file instead of generating one')
+    parser.add_argument('--stages', help='Comma separated stages to run (default: all but the slow construct decoder)')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per stage, the fastest is reported (default: 3)')
+    parser.add_argument('--save', help='Save results as json to this path')
+    parser.add_argument('--compare', help='Earlier results json to compare against')
+    args = parser.parse_args()
+
+    if args.stages:
+        stage_names = [name.strip() for name in args.stages.split(',') if name.strip()]
+        for name in stage_names:
+            if name not in STAGES:
+                print("Error: Unknown stage '{}', choose from {}".format(name, ', '.join(STAGES)))
+                return
+    else:
+        stage_names = [name for name, (_, _, is_slow) in STAGES.items() if not is_slow]
+
+    baseline = None
+    if args.compare:
+        try:
+            with open(args.compare, 'r') as f:
+                baseline = json.load(f)['stages']
+        except (OSError, ValueError, KeyError) as ex:
+            print("Error: Could not read results to compare from {} : {}".format(args.compare, ex))
+            return
+
+    size = generate_test_data.ParseSize(args.size) if args.size else None
+    records = args.records if (args.records or size) else 100000
+    temp_folder = tempfile.mkdtemp(prefix='bench_data_')
+    try:
+        inputs = { 'calllog' : args.calllog_input, 'settings' : args.settings_input }
+        if inputs['calllog'] is None and any(STAGES[name][0] == 'calllog' for name in stage_names):
+            inputs['calllog'] = os.path.join(temp_folder, 'com.android.calllogbackup.data')
+            count, written = generate_test_data.WriteCallLogData(inputs['calllog'], records, size)
+            print('Generated {} call records ({:.1f} MB)'.format(count, written / (1024 * 1024)))
+        if inputs['settings'] is None and any(STAGES[name][0] == 'settings' for name in stage_names):
+            inputs['settings'] = os.path.join(temp_folder, 'com.android.providers.settings.data')
+            count, written = generate_test_data.WriteSettingsData(inputs['settings'], max(1, (records or 100000) // 10),
+                                                                  size // 10 if size else None)
+            print('Generated {} settings per table ({:.1f} MB)'.format(count, written / (1024 * 1024)))
+
+        results = {}
+        for name in stage_names:
+            results[name] = MeasureStage(name, inputs[STAGES[name][0]], max(1, args.repeat))
+        PrintResults(results, baseline)
+
+        if args.save:
+            report = { 'python' : platform.python_version(), 'platform' : platform.platform(),
+                       'inputs' : { data_type : os.path.getsize(path) for data_type, path in inputs.items() if path },
+                       'stages' : results }
+            with open(args.save, 'w') as f:
+                json.dump(report, f, indent=2)
+            print('Results saved to ' + args.save)
+    finally:
+        shutil.rmtree(temp_folder, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
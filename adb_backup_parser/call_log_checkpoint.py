@@ -0,0 +1,246 @@
+'''
+    (c) adb_backup_parser contributors 2026
+
+    License: MIT
+
+    Purpose: State for appending new call log records to an existing
+             output folder (callparser.py --append). Call log entities are
+             keyed by serial number, the checkpoint file saved in the
+             output folder records:
+
+               serials  - every serial number already written out, stored
+                          as ranges as they are mostly consecutive
+               input    - size of the last input, how far into it every
+                          entity was read, and the SHA-256 of that part
+
+             If the next input starts with exactly the same bytes (a newer
+             backup of the same device usually does), the covered part is
+             not read again. Without a checkpoint, the serial numbers are
+             read from the existing call_logs output instead.
+
+             An append that fails part way is undone (see SaveOutputState),
+             so the outputs always match the checkpoint.
+
+    Requires: Python 3
+'''
+
+from backup_reader import Align4
+from output_sinks import OpenTextFile, IterArrowRows, SQLITE_DB_NAME
+import bisect
+import csv
+import hashlib
+import json
+import os
+import sqlite3
+
+CHECKPOINT_NAME = 'call_logs.checkpoint.json'
+CHECKPOINT_VERSION = 1
+
+class SerialSet:
+    '''
+        Set of serial number strings. Numeric serials are kept as sorted,
+        merged [start, end] ranges, others in a plain set.
+    '''
+    def __init__(self, ranges=(), others=()):
+        self.starts = [start for start, _ in ranges]
+        self.ends = [end for _, end in ranges]
+        self.others = set(others)
+
+    @staticmethod
+    def _AsNumber(serial):
+        if serial.isdigit() and serial.isascii() and (serial == '0' or serial[0] != '0'):
+            return int(serial)
+        return None
+
+    def __contains__(self, serial):
+        number = self._AsNumber(serial)
+        if number is None:
+            return serial in self.others
+        i = bisect.bisect_right(self.starts, number) - 1
+        return i >= 0 and number <= self.ends[i]
+
+    def __len__(self):
+        return sum(end - start + 1 for start, end in zip(self.starts, self.ends)) + len(self.others)
+
+    def update(self, serials):
+        '''Adds all serials (strings) to the set'''
+        numbers = []
+        for serial in serials:
+            number = self._AsNumber(serial)
+            if number is None:
+                self.others.add(serial)
+            else:
+                numbers.append(number)
+        if not numbers:
+            return
+        ranges = sorted(list(zip(self.starts, self.ends)) + [(number, number) for number in numbers])
+        merged = [list(ranges[0])]
+        for start, end in ranges[1:]:
+            if start <= merged[-1][1] + 1:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+        self.starts = [start for start, _ in merged]
+        self.ends = [end for _, end in merged]
+
+    def ranges(self):
+        return [[start, end] for start, end in zip(self.starts, self.ends)]
+
+def GetCheckpointPath(output_path):
+    return os.path.join(output_path, CHECKPOINT_NAME)
+
+def LoadCheckpoint(output_path):
+    '''Returns (SerialSet, input info dict) from the checkpoint in output_path, or None if there is no usable checkpoint'''
+    path = GetCheckpointPath(output_path)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r') as f:
+            checkpoint = json.load(f)
+        if checkpoint.get('version') != CHECKPOINT_VERSION:
+            print("Error: Checkpoint {} is from another version, it will be ignored".format(path))
+            return None
+        return SerialSet(checkpoint['serials'], checkpoint['other_serials']), checkpoint['input']
+    except (OSError, ValueError, KeyError, TypeError) as ex:
+        print("Error: Could not read checkpoint {} , it will be ignored. Error was: {}".format(path, ex))
+    return None
+
+def SaveCheckpoint(output_path, serials, input_size, covered, covered_sha256):
+    '''Writes the checkpoint, via a temporary file so a failed write leaves the old one intact'''
+    path = GetCheckpointPath(output_path)
+    checkpoint = { 'version' : CHECKPOINT_VERSION,
+                   'serials' : serials.ranges(), 'other_serials' : sorted(serials.others),
+                   'input' : { 'size' : input_size, 'covered' : covered, 'covered_sha256' : covered_sha256 } }
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w') as f:
+        json.dump(checkpoint, f)
+    os.replace(temp_path, path)
+
+def DeleteCheckpoint(output_path):
+    '''Deletes the checkpoint, so the next append reads the serial numbers from the output'''
+    path = GetCheckpointPath(output_path)
+    if os.path.exists(path):
+        os.remove(path)
+
+def SaveOutputState(output_path, formats):
+    '''
+        Returns what RestoreOutputState() needs to undo an append to the
+        call_logs outputs in output_path: the size and last two bytes (the
+        end of a json array) of every output file, or None if it does not
+        exist yet, and the last rowid of the sqlite call_logs table.
+    '''
+    state = []
+    for fmt in formats:
+        if fmt == 'sqlite':
+            path = os.path.join(output_path, SQLITE_DB_NAME)
+            last_rowid = 0
+            if os.path.exists(path):
+                connection = sqlite3.connect(path)
+                try:
+                    last_rowid = connection.execute('SELECT MAX(rowid) FROM "call_logs"').fetchone()[0] or 0
+                except sqlite3.OperationalError: # no call_logs table
+                    pass
+                finally:
+                    connection.close()
+            state.append((fmt, path, last_rowid, None))
+            continue
+        path = os.path.join(output_path, 'call_logs.' + fmt)
+        size = None
+        tail = None
+        if os.path.exists(path):
+            size = os.path.getsize(path)
+            with open(path, 'rb') as f:
+                f.seek(max(0, size - 2))
+                tail = f.read()
+        state.append((fmt, path, size, tail))
+    return state
+
+def RestoreOutputState(state):
+    '''Undoes an append that failed part way, putting every output back as SaveOutputState() found it'''
+    for fmt, path, size, tail in state:
+        try:
+            if fmt == 'sqlite':
+                if os.path.exists(path):
+                    connection = sqlite3.connect(path)
+                    try:
+                        with connection:
+                            connection.execute('DELETE FROM "call_logs" WHERE rowid > ?', (size,))
+                    finally:
+                        connection.close()
+            elif size is None:
+                if os.path.exists(path):
+                    os.remove(path)
+            else:
+                os.truncate(path, size - len(tail))
+                with open(path, 'ab') as f:
+                    f.write(tail)
+        except (OSError, sqlite3.Error) as ex:
+            print("Error: Could not undo the append to {}, error was: {}".format(path, ex))
+
+def LoadSerialsFromOutput(output_path):
+    '''
+        Reads the serial numbers of the records in an existing call_logs
+        output (csv, ndjson, json, sqlite, or parquet/arrow, the first one
+        found), for folders written without --append. Returns a SerialSet,
+        empty if there is no output yet.
+    '''
+    serials = SerialSet()
+    csv_path = os.path.join(output_path, 'call_logs.csv')
+    ndjson_paths = [os.path.join(output_path, 'call_logs.' + fmt) for fmt in ('ndjson', 'ndjson.gz', 'ndjson.zst')]
+    ndjson_path = next((path for path in ndjson_paths if os.path.exists(path)), None)
+    json_path = os.path.join(output_path, 'call_logs.json')
+    arrow_paths = [os.path.join(output_path, 'call_logs.' + fmt) for fmt in ('parquet', 'arrow')]
+    arrow_path = next((path for path in arrow_paths if os.path.exists(path)), None)
+    if os.path.exists(csv_path):
+        with open(csv_path, 'r', newline='') as f:
+            serials.update(row['serial_number'].rstrip('\x00') for row in csv.DictReader(f))
+    elif ndjson_path:
+        with OpenTextFile(ndjson_path, 'r') as f:
+            serials.update(json.loads(line)['serial_number'].rstrip('\x00') for line in f if line.strip())
+    elif arrow_path:
+        serials.update(row[0].rstrip('\x00') for row in IterArrowRows(arrow_path, ['serial_number']))
+    elif os.path.exists(json_path) and os.path.getsize(json_path):
+        with open(json_path, 'r') as f:
+            serials.update(record['serial_number'].rstrip('\x00') for record in json.load(f)['call_logs'])
+    else:
+        db_path = os.path.join(output_path, SQLITE_DB_NAME)
+        if os.path.exists(db_path):
+            connection = sqlite3.connect(db_path)
+            try:
+                serials.update(row[0].rstrip('\x00') for row in connection.execute('SELECT "serial_number" FROM "call_logs"'))
+            except sqlite3.OperationalError: # no call_logs table
+                pass
+            finally:
+                connection.close()
+    return serials
+
+def HashPrefix(backup, size):
+    '''Returns hex SHA-256 of the first size bytes of the BackupDataFile'''
+    return hashlib.sha256(backup.read_at(0, size) if size else b'').hexdigest()
+
+def GetResumeOffset(backup, last_input):
+    '''
+        Returns the offset to start reading backup from, past the part the
+        checkpoint's last_input covered if backup begins with the same bytes
+    '''
+    if not last_input:
+        return 0
+    covered = last_input['covered']
+    if 0 < covered <= backup.size and HashPrefix(backup, covered) == last_input['covered_sha256']:
+        return covered
+    return 0
+
+def IterNewEntities(backup, pos, serials, progress):
+    '''
+        Generator yielding (key, data) for the entities of the BackupDataFile
+        from offset pos on, whose serial number is not in serials (SerialSet).
+        progress (dict) gets 'new_serials' (list) and 'covered', the offset
+        just past the last entity read.
+    '''
+    new_serials = progress.setdefault('new_serials', [])
+    progress['covered'] = pos
+    for key, data_offset, size_data in backup.entity_locations(pos):
+        if key not in serials:
+            new_serials.append(key)
+            yield key + '\x00', backup.read_at(data_offset, size_data)
+        progress['covered'] = data_offset + Align4(size_data)
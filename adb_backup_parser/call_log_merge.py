@@ -0,0 +1,396 @@
+'''
+    (c) adb_backup_parser contributors 2026
+
+    License: MIT
+
+    Purpose: Merge the call logs of many backups of the same device into
+             one de-duplicated, time sorted list. Inputs can be raw
+             'com.android.calllogbackup.data' files, Android backups (.ab)
+             or earlier callparser.py output (csv, ndjson, json, sqlite,
+             parquet, arrow, or the folder holding it).
+
+             Two records are the same call if they have the same number,
+             timestamp, duration and type. The first one read (in input
+             order) is kept, and the 'sources' column lists every input
+             the call was found in.
+
+             Up to --max-records unique calls are merged in memory. Past
+             that, records are spread over partition files on disk by a
+             hash of their call, so all copies of a call land in the same
+             partition. Each partition is then de-duplicated and sorted
+             on its own and the sorted partitions merged into the output.
+
+    Requires: Python 3 and construct
+              Construct can be installed via 'pip install construct' on Windows
+              or 'pip3 install construct' on Linux
+'''
+
+from backup_reader import BackupDataFile, IterEntities
+from output_sinks import SqliteSink, ArrowSink, OpenSqliteDatabase, OpenTextFile, IterArrowRows, SQLITE_DB_NAME, ARROW_FORMATS
+import argparse
+import csv
+import heapq
+import json
+import marshal
+import os
+import shutil
+import sqlite3
+import struct
+import tarfile
+import tempfile
+import zlib
+
+import android_backup
+import callparser
+
+MERGED_NAME = 'merged_call_logs'
+MERGED_COLUMNS = callparser.CALL_LOG_COLUMNS + ('sources', 'source_count')
+MERGED_SQLITE_COLUMNS = callparser.CALL_LOG_SQLITE_COLUMNS + [('sources', 'TEXT'), ('source_count', 'INTEGER')]
+MERGED_SQLITE_INDEXES = ('timestamp', 'number')
+SOURCES_SEPARATOR = ' | '
+
+DEFAULT_MAX_RECORDS = 500000
+DEFAULT_PARTITIONS = 64
+SPILL_BATCH_SIZE = 512 # per partition, so 64 partitions buffer at most 32k records
+
+_col = { name : pos for pos, name in enumerate(callparser.CALL_LOG_COLUMNS) }
+_NUMBER, _TIMESTAMP, _DURATION, _TYPE = _col['number'], _col['timestamp'], _col['duration'], _col['type']
+
+def GetCallKey(record):
+    '''Returns the (number, timestamp, duration, type) a call is de-duplicated on'''
+    return record[_NUMBER], record[_TIMESTAMP], record[_DURATION], record[_TYPE]
+
+def GetSortKey(record):
+    '''Returns the key records are sorted by, timestamp first (timestamps in output are sortable text)'''
+    return record[_TIMESTAMP], record[_NUMBER], record[_DURATION], record[_TYPE]
+
+def _IterEntityRecords(entities):
+    '''Yields record tuples (CALL_LOG_COLUMNS order) for the call log entities, decoded in column batches'''
+    batch = callparser.CallLogBatch()
+    for key, data in entities:
+        batch.append(key, callparser.DecodeCallRecord(data))
+        if len(batch) >= callparser.COLUMNAR_BATCH_SIZE:
+            yield from batch.tuples()
+            batch.clear()
+    yield from batch.tuples()
+
+def _RecordFromDict(record):
+    return tuple(record.get(name, '') for name in callparser.CALL_LOG_COLUMNS)
+
+def _IterCsvRecords(path):
+    with open(path, 'r', newline='', encoding='utf8') as f:
+        for row in csv.DictReader(f):
+            version = row.get('version', '')
+            if version.isdigit():
+                row['version'] = int(version) # as in every other input
+            yield _RecordFromDict(row)
+
+def FindCallLogOutput(folder):
+    '''Returns the path of the call log output in a callparser.py output folder, or None'''
+    for name in ('call_logs.csv', 'call_logs.ndjson', 'call_logs.ndjson.gz', 'call_logs.ndjson.zst', 'call_logs.json',
+                 SQLITE_DB_NAME, 'call_logs.parquet', 'call_logs.arrow'):
+        path = os.path.join(folder, name)
+        if os.path.isfile(path):
+            return path
+    return None
+
+def IterCallLogInput(path):
+    '''
+        Generator yielding (record tuple in CALL_LOG_COLUMNS order, source)
+        for every call in one input. source is the input path, except for
+        sqlite databases, where it is the row's own source if it has one.
+        Raises ValueError if the input is not recognised.
+    '''
+    if os.path.isdir(path):
+        output_path = FindCallLogOutput(path)
+        if output_path is None:
+            raise ValueError('No call log output found in folder ' + path)
+        path = output_path
+    with open(path, 'rb') as f:
+        head = f.read(len(android_backup.BACKUP_MAGIC))
+    lower_path = path.lower()
+    if head.startswith(android_backup.BACKUP_MAGIC):
+        with open(path, 'rb') as f:
+            for _, member_name, data in android_backup.IterBackupDataFiles(f, (android_backup.CALLLOG_PACKAGE,)):
+                source = path + '/' + member_name
+                for record in _IterEntityRecords(IterEntities(data)):
+                    yield record, source
+    elif head.startswith(b'Data'):
+        with BackupDataFile(path) as backup:
+            for record in _IterEntityRecords(backup.entities()):
+                yield record, path
+    elif lower_path.endswith('.csv'):
+        for record in _IterCsvRecords(path):
+            yield record, path
+    elif lower_path.endswith(('.ndjson', '.ndjson.gz', '.ndjson.zst')):
+        with OpenTextFile(path, 'r') as f:
+            for line in f:
+                if line.strip():
+                    yield _RecordFromDict(json.loads(line)), path
+    elif lower_path.endswith('.json'):
+        with open(path, 'r', encoding='utf8') as f:
+            records = json.load(f).get('call_logs', []) if os.path.getsize(path) else []
+        for record in records:
+            yield _RecordFromDict(record), path
+    elif lower_path.endswith(('.parquet', '.arrow')):
+        for row in IterArrowRows(path, callparser.CALL_LOG_COLUMNS):
+            yield tuple('' if value is None else value for value in row), path
+    elif lower_path.endswith(('.sqlite', '.db')):
+        connection = sqlite3.connect(path)
+        try:
+            columns = ', '.join('"{}"'.format(name) for name in callparser.CALL_LOG_COLUMNS)
+            for row in connection.execute('SELECT {}, "source" FROM "call_logs"'.format(columns)):
+                yield tuple('' if value is None else value for value in row[:-1]), row[-1] or path
+        finally:
+            connection.close()
+    else:
+        raise ValueError('Not a call log input : ' + path)
+
+def _DumpBatches(items, out_file):
+    for pos in range(0, len(items), SPILL_BATCH_SIZE):
+        marshal.dump(items[pos:pos + SPILL_BATCH_SIZE], out_file)
+
+def _IterBatches(path):
+    '''Yields the items of a file written with marshal.dump() in batches'''
+    with open(path, 'rb') as f:
+        while True:
+            try:
+                batch = marshal.load(f)
+            except EOFError:
+                return
+            yield from batch
+
+class CallLogMerger:
+    '''
+        De-duplicates call records added with add(). Merged records come
+        out of iter_merged() sorted by time, each with the list of sources
+        it was found in. Spills to partition files in a temporary folder
+        when more than max_records unique calls are held, call close()
+        to remove them.
+    '''
+    def __init__(self, max_records=DEFAULT_MAX_RECORDS, partitions=DEFAULT_PARTITIONS, temp_dir=None):
+        self.max_records = max_records
+        self.partitions = partitions
+        self.temp_dir = temp_dir
+        self.sources = []   # source names, a record's sources are kept as positions in this
+        self._source_ids = {}
+        self.records = {}   # call key : [record, [source ids]]
+        self.read_count = 0
+        self.spill_folder = None
+        self._partition_files = None
+        self._partition_pending = None
+
+    def source_id(self, source):
+        source_id = self._source_ids.get(source)
+        if source_id is None:
+            source_id = len(self.sources)
+            self._source_ids[source] = source_id
+            self.sources.append(source)
+        return source_id
+
+    def add(self, record, source_id):
+        '''Adds one record (tuple in CALL_LOG_COLUMNS order) read from the source with source_id'''
+        self.read_count += 1
+        key = GetCallKey(record)
+        if self._partition_files is not None:
+            self._spill_item(key, (record, (source_id,)))
+            return
+        entry = self.records.get(key)
+        if entry is None:
+            self.records[key] = [record, [source_id]]
+            if len(self.records) > self.max_records:
+                self._start_spilling()
+        elif source_id not in entry[1]:
+            entry[1].append(source_id)
+
+    def add_input(self, path):
+        '''Adds every record of an input (see IterCallLogInput), returns the number read'''
+        count = 0
+        last_source = None
+        source_id = None
+        for record, source in IterCallLogInput(path):
+            if source != last_source:
+                source_id = self.source_id(source)
+                last_source = source
+            self.add(record, source_id)
+            count += 1
+        return count
+
+    def _start_spilling(self):
+        print("More than {} unique calls, merging on disk in {} partitions".format(self.max_records, self.partitions))
+        self.spill_folder = tempfile.mkdtemp(prefix='call_log_merge_', dir=self.temp_dir)
+        self._partition_files = [open(os.path.join(self.spill_folder, 'partition_{}'.format(n)), 'wb')
+                                 for n in range(self.partitions)]
+        self._partition_pending = [[] for _ in range(self.partitions)]
+        for key, (record, source_ids) in self.records.items():
+            self._spill_item(key, (record, tuple(source_ids)))
+        self.records = {}
+
+    def _spill_item(self, key, item):
+        partition = hash(key) % self.partitions
+        pending = self._partition_pending[partition]
+        pending.append(item)
+        if len(pending) >= SPILL_BATCH_SIZE:
+            marshal.dump(pending, self._partition_files[partition])
+            pending.clear()
+
+    def _iter_sorted_runs(self):
+        '''De-duplicates and sorts every partition into its own run file, returns the iterators over the runs'''
+        for partition, out_file in enumerate(self._partition_files):
+            _DumpBatches(self._partition_pending[partition], out_file)
+            out_file.close()
+        self._partition_pending = None
+        runs = []
+        for partition in range(self.partitions):
+            partition_path = os.path.join(self.spill_folder, 'partition_{}'.format(partition))
+            records = {}
+            for record, source_ids in _IterBatches(partition_path):
+                key = GetCallKey(record)
+                entry = records.get(key)
+                if entry is None:
+                    records[key] = [record, list(source_ids)]
+                else:
+                    entry[1].extend(source_id for source_id in source_ids if source_id not in entry[1])
+            os.remove(partition_path)
+            run_path = partition_path + '.sorted'
+            with open(run_path, 'wb') as run_file:
+                _DumpBatches(sorted(((record, tuple(source_ids)) for record, source_ids in records.values()),
+                                    key=lambda item: GetSortKey(item[0])), run_file)
+            runs.append(_IterBatches(run_path))
+        return runs
+
+    def iter_merged(self):
+        '''Generator yielding (record, [source names]) for every unique call, sorted by time'''
+        if self._partition_files is None:
+            items = sorted(self.records.values(), key=lambda item: GetSortKey(item[0]))
+        else:
+            items = heapq.merge(*self._iter_sorted_runs(), key=lambda item: GetSortKey(item[0]))
+        sources = self.sources
+        for record, source_ids in items:
+            yield record, [sources[source_id] for source_id in source_ids]
+
+    def close(self):
+        if self._partition_files is not None:
+            for out_file in self._partition_files:
+                out_file.close()
+        if self.spill_folder:
+            shutil.rmtree(self.spill_folder, ignore_errors=True)
+            self.spill_folder = None
+
+def WriteMergedCallLogs(merged, output_path, formats=callparser.DEFAULT_FORMATS):
+    '''
+        Writes (record, sources) from CallLogMerger.iter_merged() to
+        merged_call_logs.<format> (or that table in the sqlite database)
+        in output_path. Returns number of records written, or None if the
+        output could not be created.
+    '''
+    out_files = []
+    sinks = []
+    try:
+        try:
+            for fmt in formats:
+                if fmt == 'sqlite':
+                    out_file_path = os.path.join(output_path, SQLITE_DB_NAME)
+                    connection = OpenSqliteDatabase(out_file_path, MERGED_NAME, MERGED_SQLITE_COLUMNS)
+                    out_files.append((out_file_path, connection))
+                    sinks.append(SqliteSink(connection, MERGED_NAME, MERGED_SQLITE_COLUMNS, MERGED_SQLITE_INDEXES))
+                    continue
+                out_file_path = os.path.join(output_path, MERGED_NAME + '.' + fmt)
+                if fmt in ARROW_FORMATS:
+                    sink = ArrowSink(out_file_path, MERGED_SQLITE_COLUMNS, fmt, callparser.CALL_LOG_DICTIONARY_COLUMNS)
+                    out_files.append((out_file_path, sink))
+                    sinks.append(sink)
+                    continue
+                out_file = OpenTextFile(out_file_path, 'w')
+                out_files.append((out_file_path, out_file))
+                sinks.append(callparser.CreateSink(fmt, out_file) if fmt != 'json' else
+                             callparser.JsonArraySink(out_file, MERGED_NAME))
+        except (OSError, ValueError, sqlite3.Error) as ex:
+            print("Error: Could not create output file, error was: " + str(ex))
+            return None
+        count = 0
+        rows = []
+        for record, sources in merged:
+            rows.append(record + (SOURCES_SEPARATOR.join(sources), len(sources)))
+            if len(rows) >= callparser.COLUMNAR_BATCH_SIZE:
+                for sink in sinks:
+                    sink.write_rows(MERGED_COLUMNS, rows)
+                count += len(rows)
+                rows = []
+        for sink in sinks:
+            sink.write_rows(MERGED_COLUMNS, rows)
+        count += len(rows)
+        for sink in sinks:
+            sink.finish()
+        for out_file_path, _ in out_files:
+            print("Wrote out " + out_file_path)
+        return count
+    finally:
+        for _, out_file in out_files:
+            out_file.close()
+
+def main():
+    usage = "Merge and de-duplicate call logs from many backups of a device"\
+            "\n--------------------------------------------"\
+            "\nUsage: call_log_merge.py input [input ..] output_folder"\
+            "\nExample: call_log_merge.py  backup_2019_01.ab  backup_2019_06.ab  old_output\\  c:\\output_folder\\"\
+            "\n\nInputs can be com.android.calllogbackup.data files, Android backups (.ab),"\
+            "\nor callparser.py output files or folders. Calls with the same number,"\
+            "\ntimestamp, duration and type are written once, sorted by time, with the"\
+            "\ninputs they were found in, to merged_call_logs.<format>"\
+            "\nNote: All times in output are UTC"\
+            "\nSend bugs/comments to yogesh@swiftforensics.com"
+
+    parser = argparse.ArgumentParser(description=usage, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('inputs', nargs='+', help='Call log inputs')
+    parser.add_argument('output_folder', help='Folder to write output files to')
+    parser.add_argument('--formats', default='csv,json',
+                        help='Comma separated list of output formats from {} (default: csv,json)'.format(','.join(callparser.OUTPUT_FORMATS)))
+    parser.add_argument('--max-records', type=int, default=DEFAULT_MAX_RECORDS,
+                        help='Unique calls to merge in memory before merging on disk (default: {})'.format(DEFAULT_MAX_RECORDS))
+    parser.add_argument('--partitions', type=int, default=DEFAULT_PARTITIONS,
+                        help='Number of partitions when merging on disk (default: {})'.format(DEFAULT_PARTITIONS))
+    parser.add_argument('--temp-dir', help='Folder for the partition files (default: system temp folder)')
+    args = parser.parse_args()
+
+    formats = callparser.GetOutputFormats(args.formats)
+    if formats is None:
+        return
+    if args.max_records < 1 or args.partitions < 1:
+        print("Error: --max-records and --partitions must be 1 or more")
+        return
+    for input_path in args.inputs:
+        if not os.path.exists(input_path):
+            print("Error: Failed to find file at specified path. Path was : " + input_path)
+            return
+    output_path = args.output_folder
+    if os.path.isfile(output_path):
+        print("Error: There is already a file existing by that name. Cannot create folder : " + output_path)
+        return
+    try:
+        os.makedirs(output_path, exist_ok=True)
+    except OSError as ex:
+        print("Error: Cannot create output folder : " + output_path + "\nError Details: " + str(ex))
+        return
+
+    merger = CallLogMerger(args.max_records, args.partitions, args.temp_dir)
+    try:
+        for input_path in args.inputs:
+            print("Reading " + input_path)
+            try:
+                count = merger.add_input(input_path)
+            except (OSError, ValueError, KeyError, struct.error, sqlite3.Error, tarfile.TarError, zlib.error,
+                    android_backup.BackupFormatError) as ex:
+                print("Error: Cannot read input : " + input_path + "\nError Details: " + str(ex))
+                return
+            print("Read {} calls".format(count))
+        count = WriteMergedCallLogs(merger.iter_merged(), output_path, formats)
+        if count is not None:
+            print("Merged {} calls from {} inputs into {} unique calls".format(merger.read_count, len(args.inputs), count))
+    except OSError as ex:
+        print("Error: " + str(ex))
+    finally:
+        merger.close()
+
+if __name__ == '__main__':
+    main()
@@ -15,12 +15,23 @@
     Send bugs/comments to yogesh@swiftforensics.com
 '''
 
-from construct import *
-import csv
+from backup_reader import BackupDataFile, PrintSkippedRegions, Align4
+from call_log_checkpoint import LoadCheckpoint, LoadSerialsFromOutput, SaveCheckpoint, DeleteCheckpoint, GetResumeOffset, IterNewEntities, \
+                                HashPrefix, SaveOutputState, RestoreOutputState
+from entity_index import GetIndex, IterIndexedEntities
+from result_cache import AddCacheArguments, GetResultCache
+from parse_stats import ParseStats, AddStatsArguments, StartProfiler, StopProfiler
+from pipeline import IterPipelinedEntities, ThreadSinks, StopSinks
+from output_sinks import CsvSink, JsonArraySink, NdjsonSink, SqliteSink, ArrowSink, OpenSqliteDatabase, OpenJsonArrayForAppend, OpenTextFile, \
+                         ParseOutputFormats, SQLITE_DB_NAME, ARROW_FORMATS
+import argparse
+import array
+import collections
 import datetime
-import json
 import os
-import sys
+import re
+import sqlite3
+import struct
 import time
 
 def ReadUnixMsTime(unix_time_ms): # Unix millisecond timestamp
@@ -81,47 +92,189 @@ def GetPresentationString(pr):
         ret = "UNKNOWN ({})".format(pr)
     return ret
 
-CallRecord = Struct(
-    "version" / Int32ub, #  1007 (0x03ef) or 1005 seen
-    "timestamp" / Int64sb,
-    "duration_in_sec" / Int64ub,
-    "is_num_present" / Int8ub,
-    "number" / If(this.is_num_present == 1, PascalString(Int16ub, 'utf8')),
-    "type" / Int32ub,
-    "presentation" / Int32ub,
-    "is_servicename_present" / Int8ub,
-    "servicename" / If(this.is_servicename_present == 1, PascalString(Int16ub, 'utf8')),
-    "is_iccid_present" / Int8ub,
-    "iccid" / If(this.is_iccid_present == 1, PascalString(Int16ub, 'utf8')),
-    "is_own_num_present" / Int8ub,
-    "own_number" / If(this.is_own_num_present == 1, PascalString(Int16ub, 'utf8')),
-    "unknown3" / Byte[12],
-    "oem" / PascalString(Int16ub, 'utf8'),
-    "unknown4" / Int32ub[2],
-    "unknown5" / If(this.version == 1007, Byte[10]),
-    "block_reason" / If(this.version == 1007, Int32ub)
-)
-
-DataHeader = Struct (
-    Const(b"Data"),
-    "size_key" / Int32ul,
-    "size_data" / Int32ul
-)
+_call_record_struct = None
+
+def GetCallRecordStruct():
+    '''
+        Returns the construct definition of a call log record. construct
+        is slow to import, so it is only imported (and the definition
+        built) the first time this is called.
+    '''
+    global _call_record_struct
+    if _call_record_struct is None:
+        from construct import Struct, Int8ub, Int32ub, Int64sb, Int64ub, If, PascalString, Int16ub, Byte, this
+        _call_record_struct = Struct(
+            "version" / Int32ub, #  1007 (0x03ef) or 1005 seen
+            "timestamp" / Int64sb,
+            "duration_in_sec" / Int64ub,
+            "is_num_present" / Int8ub,
+            "number" / If(this.is_num_present == 1, PascalString(Int16ub, 'utf8')),
+            "type" / Int32ub,
+            "presentation" / Int32ub,
+            "is_servicename_present" / Int8ub,
+            "servicename" / If(this.is_servicename_present == 1, PascalString(Int16ub, 'utf8')),
+            "is_iccid_present" / Int8ub,
+            "iccid" / If(this.is_iccid_present == 1, PascalString(Int16ub, 'utf8')),
+            "is_own_num_present" / Int8ub,
+            "own_number" / If(this.is_own_num_present == 1, PascalString(Int16ub, 'utf8')),
+            "unknown3" / Byte[12],
+            "oem" / PascalString(Int16ub, 'utf8'),
+            "unknown4" / Int32ub[2],
+            "unknown5" / If(this.version == 1007, Byte[10]),
+            "block_reason" / If(this.version == 1007, Int32ub)
+        )
+    return _call_record_struct
+
+def __getattr__(name):
+    '''Keeps callparser.CallRecord working, the struct is built when it is first used'''
+    if name == 'CallRecord':
+        return GetCallRecordStruct()
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+
+CallRecordFields = collections.namedtuple('CallRecordFields', [
+    'version', 'timestamp', 'duration_in_sec',
+    'is_num_present', 'number', 'type', 'presentation',
+    'is_servicename_present', 'servicename', 'is_iccid_present', 'iccid',
+    'is_own_num_present', 'own_number', 'unknown3', 'oem', 'unknown4',
+    'unknown5', 'block_reason'])
+
+_cr_start = struct.Struct('>IqQB')   # version, timestamp, duration_in_sec, is_num_present
+_cr_type = struct.Struct('>IIB')     # type, presentation, is_servicename_present
+_uint8 = struct.Struct('>B')
+_uint16 = struct.Struct('>H')
+_uint32 = struct.Struct('>I')
+_uint32x2 = struct.Struct('>II')
+
+def _ReadPascalString(data, pos):
+    '''Reads a utf8 string prefixed by a uint16 length, returns (string, new_pos)'''
+    str_len = _uint16.unpack_from(data, pos)[0]
+    pos += 2
+    end = pos + str_len
+    if end > len(data):
+        raise struct.error('string of length {} at offset {} runs past end of record'.format(str_len, pos))
+    return str(data[pos:end], 'utf8'), end
+
+def _ReadOptionalString(data, pos):
+    '''Reads a uint8 presence flag and, if it is 1, the string that follows. Returns (flag, string or None, new_pos)'''
+    is_present = _uint8.unpack_from(data, pos)[0]
+    pos += 1
+    if is_present == 1:
+        value, pos = _ReadPascalString(data, pos)
+        return is_present, value, pos
+    return is_present, None, pos
+
+def DecodeCallRecordWithEnd(data):
+    '''
+        Decodes a single call log record using fixed struct offsets. This
+        produces the same field values as the construct definition, but is much
+        faster. Raises struct.error on truncated data.
+
+        args:
+            data: bytes or memoryview holding one call log record
+        returns:
+            (CallRecordFields, offset just past the end of the record)
+    '''
+    version, timestamp, duration_in_sec, is_num_present = _cr_start.unpack_from(data, 0)
+    pos = 21
+    number = None
+    if is_num_present == 1:
+        number, pos = _ReadPascalString(data, pos)
+    call_type, presentation, is_servicename_present = _cr_type.unpack_from(data, pos)
+    pos += 9
+    servicename = None
+    if is_servicename_present == 1:
+        servicename, pos = _ReadPascalString(data, pos)
+    is_iccid_present, iccid, pos = _ReadOptionalString(data, pos)
+    is_own_num_present, own_number, pos = _ReadOptionalString(data, pos)
+    unknown3 = bytes(data[pos:pos + 12])
+    if len(unknown3) != 12:
+        raise struct.error('record truncated at offset {}'.format(pos))
+    oem, pos = _ReadPascalString(data, pos + 12)
+    unknown4 = _uint32x2.unpack_from(data, pos)
+    pos += 8
+    unknown5 = None
+    block_reason = None
+    if version == 1007:
+        unknown5 = bytes(data[pos:pos + 10])
+        if len(unknown5) != 10:
+            raise struct.error('record truncated at offset {}'.format(pos))
+        block_reason = _uint32.unpack_from(data, pos + 10)[0]
+        pos += 14
+    return CallRecordFields(version, timestamp, duration_in_sec,
+                            is_num_present, number, call_type, presentation,
+                            is_servicename_present, servicename, is_iccid_present, iccid,
+                            is_own_num_present, own_number, unknown3, oem, unknown4,
+                            unknown5, block_reason), pos
+
+def DecodeCallRecord(data):
+    '''Decodes a single call log record, see DecodeCallRecordWithEnd(). Returns CallRecordFields'''
+    return DecodeCallRecordWithEnd(data)[0]
+
+def DecodeCallRecordConstruct(data):
+    '''
+        Decodes a single call log record with the construct definition
+        (GetCallRecordStruct()). This is slower and is kept as the reference
+        implementation for DecodeCallRecord().
+    '''
+    return GetCallRecordStruct().parse(data)
+
+def DecodeCarvedCallRecord(data):
+    '''
+        Returns the CallRecordFields of a carved entity's data if it decodes
+        as a call log record with a believable version that ends where the
+        entity's data does (give or take the padding), else None
+    '''
+    try:
+        cr, end = DecodeCallRecordWithEnd(data)
+    except (struct.error, UnicodeDecodeError):
+        return None
+    if not 1000 <= cr.version < 2000 or Align4(end) != Align4(len(data)):
+        return None
+    return cr
+
+class CarvedCallRecords:
+    '''
+        Vets entities for carve_entities() with validate(), keeping the
+        record it decoded, which decode() then returns for that entity
+        instead of decoding it a second time
+    '''
+    def __init__(self):
+        self.data = None
+        self.record = None
+
+    def validate(self, key, data):
+        self.record = DecodeCarvedCallRecord(data)
+        self.data = data if self.record is not None else None
+        return self.record is not None
+
+    def decode(self, data):
+        if data is self.data:
+            return self.record
+        return DecodeCallRecord(data)
+
+CALL_RECORD_DECODERS = {
+    'native' : DecodeCallRecord,
+    'construct' : DecodeCallRecordConstruct
+}
 
 def GetDuration(duration_in_sec):
-    '''Convert call duration into HH:MM:SS format'''
-    return time.strftime('%H:%M:%S', time.gmtime(duration_in_sec))
+    '''Convert call duration into HH:MM:SS format, returns empty string if the value is out of range'''
+    try:
+        return time.strftime('%H:%M:%S', time.gmtime(duration_in_sec))
+    except (ValueError, OverflowError, OSError):
+        return ''
 
-def ParseCallLogData(key, data, call_logs):
+def GetCallLogRecord(key, data, decode=DecodeCallRecord):
     '''
         Reads the call log Data structure for a single call log record
+        and returns it as a dict ready for output
 
         args:
             key: utf8 string, which is the serial number
             data: buffer holding single call log data
-            call_logs: list to which this function will add a dict
+            decode: record decoder, one of CALL_RECORD_DECODERS
     '''
-    cr = CallRecord.parse(data)
+    cr = decode(data)
     #print(ReadUnixMsTime(cr.timestamp), GetDuration(cr.duration_in_sec), cr.number, cr.own_number, cr.iccid, GetCallTypeString(cr.type))
     cr_filtered = { 
                     "serial_number" : key,
@@ -135,7 +288,265 @@ def ParseCallLogData(key, data, call_logs):
                     "own_number" : cr.own_number if cr.is_own_num_present else '',
                     "block_reason" : GetBlockReasonString(cr.block_reason) if cr.version == 1007 else ''
                     }
-    call_logs.append(cr_filtered)
+    return cr_filtered
+
+def ParseCallLogData(key, data, call_logs, decode=DecodeCallRecord):
+    '''
+        Reads the call log Data structure for a single call log record
+
+        args:
+            key: utf8 string, which is the serial number
+            data: buffer holding single call log data
+            call_logs: list to which this function will add a dict
+            decode: record decoder, one of CALL_RECORD_DECODERS
+    '''
+    call_logs.append(GetCallLogRecord(key, data, decode))
+
+UNIX_EPOCH = datetime.datetime(1970, 1, 1)
+MS_PER_DAY = 86400000
+# Below this, ReadUnixMsTime's float seconds still round to the exact millisecond
+MAX_EXACT_UNIX_MS = 4 * 10**12
+# Above this, time.gmtime() in GetDuration is left to handle (or reject) the value
+MAX_FAST_DURATION = 2**40
+
+def FormatUnixMsTimes(timestamps):
+    '''
+        Returns list of str(ReadUnixMsTime(ts)) for every timestamp, computed
+        with integer arithmetic and a per-day cache of the date string
+    '''
+    day_cache = {}
+    formatted = []
+    append = formatted.append
+    for ms in timestamps:
+        if ms == 0:
+            append('')
+            continue
+        if not -MAX_EXACT_UNIX_MS < ms < MAX_EXACT_UNIX_MS:
+            append(str(ReadUnixMsTime(ms)))
+            continue
+        day, ms_of_day = divmod(ms, MS_PER_DAY)
+        date_str = day_cache.get(day)
+        if date_str is None:
+            date_str = str((UNIX_EPOCH + datetime.timedelta(days=day)).date())
+            day_cache[day] = date_str
+        seconds, ms_part = divmod(ms_of_day, 1000)
+        hours, seconds = divmod(seconds, 3600)
+        minutes, seconds = divmod(seconds, 60)
+        if ms_part:
+            append('%s %02d:%02d:%02d.%03d000' % (date_str, hours, minutes, seconds, ms_part))
+        else:
+            append('%s %02d:%02d:%02d' % (date_str, hours, minutes, seconds))
+    return formatted
+
+def FormatDurations(durations):
+    '''Returns list of GetDuration(d) for every duration, computed with integer arithmetic'''
+    formatted = []
+    append = formatted.append
+    for duration in durations:
+        if duration < MAX_FAST_DURATION:
+            minutes, seconds = divmod(duration, 60)
+            hours, minutes = divmod(minutes, 60)
+            append('%02d:%02d:%02d' % (hours % 24, minutes, seconds))
+        else:
+            append(GetDuration(duration))
+    return formatted
+
+def MapLabels(values, get_label):
+    '''Returns list of get_label(v) for every value, calling get_label once per distinct value'''
+    labels = { value : get_label(value) for value in set(values) }
+    return [labels[value] for value in values]
+
+class CallLogBatch:
+    '''
+        Column oriented batch of call log records. Raw fields are held in
+        compact typed arrays and only converted to output strings, one
+        column at a time, when tuples() or rows() is called. The rows are
+        identical to the dicts built by GetCallLogRecord(), but sinks that
+        support write_rows() are handed plain tuples and never see a dict.
+    '''
+    NO_BLOCK_REASON = -1
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.serial_numbers = []
+        self.versions = array.array('L')
+        self.timestamps = array.array('q')
+        self.durations = array.array('Q')
+        self.numbers = []
+        self.types = array.array('L')
+        self.presentations = array.array('L')
+        self.iccids = []
+        self.own_numbers = []
+        self.block_reasons = array.array('q')
+
+    def __len__(self):
+        return len(self.versions)
+
+    def append(self, key, cr):
+        '''Adds a decoded record (from one of CALL_RECORD_DECODERS) keyed by serial number'''
+        self.serial_numbers.append(key)
+        self.versions.append(cr.version)
+        self.timestamps.append(cr.timestamp)
+        self.durations.append(cr.duration_in_sec)
+        self.numbers.append(cr.number if cr.is_num_present else '')
+        self.types.append(cr.type)
+        self.presentations.append(cr.presentation)
+        self.iccids.append(cr.iccid if cr.is_iccid_present else '')
+        self.own_numbers.append(cr.own_number if cr.is_own_num_present else '')
+        self.block_reasons.append(cr.block_reason if cr.version == 1007 else self.NO_BLOCK_REASON)
+
+    def tuples(self):
+        '''Returns list of formatted row tuples (values in CALL_LOG_COLUMNS order), in the order records were added'''
+        timestamps = FormatUnixMsTimes(self.timestamps)
+        durations = FormatDurations(self.durations)
+        types = MapLabels(self.types, GetCallTypeString)
+        presentations = MapLabels(self.presentations, GetPresentationString)
+        block_reasons = MapLabels(self.block_reasons,
+                                  lambda reason: '' if reason == self.NO_BLOCK_REASON else GetBlockReasonString(reason))
+        return list(zip(self.serial_numbers, self.versions, timestamps, durations, self.numbers, types,
+                        presentations, self.iccids, self.own_numbers, block_reasons))
+
+    def rows(self):
+        '''Generator yielding one dict per record, as GetCallLogRecord() would return'''
+        for row in self.tuples():
+            yield dict(zip(CALL_LOG_COLUMNS, row))
+
+CALL_LOG_COLUMNS = ("serial_number", "version", "timestamp", "duration", "number", "type",
+                    "presentation", "iccid", "own_number", "block_reason")
+COLUMNAR_BATCH_SIZE = 16384
+
+CALL_LOG_SQLITE_COLUMNS = [(name, 'INTEGER' if name == 'version' else 'TEXT') for name in CALL_LOG_COLUMNS]
+CALL_LOG_SQLITE_INDEXES = ('timestamp', 'number', 'iccid', 'source')
+
+CALL_TYPE_NAMES = { GetCallTypeString(call_type).lower() : call_type for call_type in range(1, 8) }
+FILTER_TIME_FORMATS = ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d')
+
+_cr_timestamp = struct.Struct('>q')
+
+class CallLogFilter:
+    '''
+        Selects call log records by time range, call type and number. The
+        checks run on the raw record, before it is decoded: the timestamp
+        is read at its fixed offset, and the type and number are found by
+        stepping over the number's length prefix, so rejected records are
+        never decoded or formatted. The records kept are the same as those
+        a full parse followed by filtering the output would keep.
+
+        args:
+            start_ms, end_ms: keep start_ms <= timestamp < end_ms (unix ms)
+            call_types: set of call type codes to keep
+            number_pattern: regular expression searched for in the number
+    '''
+    def __init__(self, start_ms=None, end_ms=None, call_types=None, number_pattern=None):
+        self.start_ms = start_ms
+        self.end_ms = end_ms
+        self.call_types = call_types
+        self.number_regex = re.compile(number_pattern) if number_pattern is not None else None
+        self.is_empty = start_ms is None and end_ms is None and call_types is None and number_pattern is None
+
+    def accepts(self, data):
+        '''Returns False if the record in data is rejected. Records too short to check are kept, so decoding reports them'''
+        try:
+            timestamp = _cr_timestamp.unpack_from(data, 4)[0]
+            if self.start_ms is not None and timestamp < self.start_ms:
+                return False
+            if self.end_ms is not None and timestamp >= self.end_ms:
+                return False
+            if self.call_types is None and self.number_regex is None:
+                return True
+            pos = 21
+            number = ''
+            if data[20] == 1:
+                number_len = _uint16.unpack_from(data, pos)[0]
+                if self.number_regex is not None:
+                    number = str(data[pos + 2:pos + 2 + number_len], 'utf8')
+                pos += 2 + number_len
+            if self.call_types is not None and _uint32.unpack_from(data, pos)[0] not in self.call_types:
+                return False
+            if self.number_regex is not None and not self.number_regex.search(number):
+                return False
+        except (struct.error, IndexError, UnicodeDecodeError):
+            pass
+        return True
+
+def ParseFilterTime(text):
+    '''Converts a UTC date ('2019-05-01' or '2019-05-01 13:30:00') to unix milliseconds, returns None if not valid'''
+    for time_format in FILTER_TIME_FORMATS:
+        try:
+            dt = datetime.datetime.strptime(text.strip(), time_format)
+        except ValueError:
+            continue
+        return (dt - UNIX_EPOCH) // datetime.timedelta(milliseconds=1)
+    return None
+
+def AddFilterArguments(parser):
+    '''Adds the call log filter options to an argparse parser, see GetCallLogFilter()'''
+    parser.add_argument('--start', help="Only calls at or after this UTC time, e.g. '2019-05-01' or '2019-05-01 13:30:00'")
+    parser.add_argument('--end', help='Only calls before this UTC time')
+    parser.add_argument('--types', help='Comma separated call types to keep, names (e.g. missed,incoming) or numbers')
+    parser.add_argument('--number', help='Only calls whose number matches this regular expression')
+
+def GetCallLogFilter(args):
+    '''
+        Returns a CallLogFilter from options added by AddFilterArguments(),
+        None if no filter was given, or False (after printing an error) if
+        an option is invalid
+    '''
+    times = []
+    for option, value in (('start', args.start), ('end', args.end)):
+        ms = None
+        if value:
+            ms = ParseFilterTime(value)
+            if ms is None:
+                print("Error: Invalid {} time '{}', use YYYY-MM-DD or 'YYYY-MM-DD HH:MM:SS'".format(option, value))
+                return False
+        times.append(ms)
+    call_types = None
+    if args.types:
+        call_types = set()
+        for name in args.types.split(','):
+            name = name.strip().lower()
+            if name.isdigit():
+                call_types.add(int(name))
+            elif name in CALL_TYPE_NAMES:
+                call_types.add(CALL_TYPE_NAMES[name])
+            elif name:
+                print("Error: Unknown call type '{}', choose from {}".format(name, ','.join(CALL_TYPE_NAMES)))
+                return False
+    try:
+        call_filter = CallLogFilter(times[0], times[1], call_types, args.number)
+    except re.error as ex:
+        print("Error: Invalid number pattern '{}' : {}".format(args.number, ex))
+        return False
+    return None if call_filter.is_empty else call_filter
+
+# Bump when the decoded records change, so older cached results are not used
+RESULT_VERSION = 1
+
+OUTPUT_FORMATS = ('csv', 'json', 'ndjson', 'ndjson.gz', 'ndjson.zst', 'sqlite', 'parquet', 'arrow')
+DEFAULT_FORMATS = ('csv', 'json')
+# String columns stored dictionary encoded in parquet and arrow output
+CALL_LOG_DICTIONARY_COLUMNS = ('number', 'type', 'presentation', 'iccid', 'own_number', 'block_reason')
+
+def GetOutputFormats(formats_arg):
+    '''Returns list of call log formats from a comma separated string, or None (after printing an error), see ParseOutputFormats()'''
+    return ParseOutputFormats(formats_arg, OUTPUT_FORMATS)
+
+def CreateSink(output_format, out_file, resume=False):
+    '''
+        Returns the streaming sink for a text output_format (csv, json or
+        ndjson, compressed or not) writing to out_file. resume=True
+        continues a file that already holds records.
+    '''
+    if output_format == 'csv':
+        return CsvSink(out_file, header=not resume)
+    elif output_format == 'json':
+        return JsonArraySink(out_file, 'call_logs', resume)
+    elif output_format in ('ndjson', 'ndjson.gz', 'ndjson.zst'):
+        return NdjsonSink(out_file)
+    raise ValueError('Unknown output format ' + output_format)
 
 def WriteCsv(list_of_dicts, out_file_csv):
     '''
@@ -144,13 +555,10 @@ def WriteCsv(list_of_dicts, out_file_csv):
             list_of_dicts: [{}, {}, {}]
             out_file_csv: csv file
     '''
-    # Get column names from dictionary
-    d = list_of_dicts[0]
-    columns = [col for col in d]
-
-    writer = csv.DictWriter(out_file_csv, delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL, fieldnames=columns)
-    writer.writeheader()
-    writer.writerows(list_of_dicts)
+    sink = CsvSink(out_file_csv)
+    for d in list_of_dicts:
+        sink.write(d)
+    sink.finish()
 
 def WriteJson(list_of_dicts, out_file_json):
     '''
@@ -159,32 +567,433 @@ def WriteJson(list_of_dicts, out_file_json):
             list_of_dicts: [{}, {}, {}]
             out_file_json: json file
     '''
-    data = { 'call_logs' : list_of_dicts }
-    json.dump(data, out_file_json)
+    sink = JsonArraySink(out_file_json, 'call_logs')
+    for d in list_of_dicts:
+        sink.write(d)
+    sink.finish()
+
+
+def WriteBatch(batch, sinks):
+    '''Writes all records of a CallLogBatch to all sinks, returns number of records'''
+    rows = batch.tuples()
+    for sink in sinks:
+        sink.write_rows(CALL_LOG_COLUMNS, rows)
+    return len(rows)
+
+def WrapSinksForStats(stats, out_files, sinks):
+    '''Returns the output sinks wrapped to time their writes, named by their file names'''
+    return [stats.wrap_sink(sink, os.path.basename(path), path) for (path, _), sink in zip(out_files, sinks)]
+
+def RecordFormatTime(stats, loop_seconds, records, threaded_writes=False):
+    '''Books the time of the parse loop not spent in any other stage as format'''
+    other = sum(seconds for name, (seconds, _) in stats.stages.items()
+                if name in ('framing', 'decode', 'filter') or (name.startswith('write:') and not threaded_writes))
+    stats.add_time('format', max(0.0, loop_seconds - other), records)
+    stats.count('records', records)
+
+def OpenCallLogOutputs(output_path, formats, source='', append=False, threaded=False):
+    '''
+        Creates the sinks for the requested formats, see ParseCallLogs().
+        With append=True, existing output files are added to instead of
+        being replaced (parquet and arrow cannot be, AppendCallLogs() checks
+        that). threaded=True allows the sinks to be used from a
+        writer thread. Returns (out_files, sinks), where out_files is
+        [(path, file), ..], or None (after printing an error) if output
+        could not be created.
+    '''
+    out_files = []
+    sinks = []
+    try:
+        for fmt in formats:
+            if fmt == 'sqlite':
+                out_file_path = os.path.join(output_path, SQLITE_DB_NAME)
+                connection = OpenSqliteDatabase(out_file_path, 'call_logs', CALL_LOG_SQLITE_COLUMNS, not threaded)
+                out_files.append((out_file_path, connection))
+                sinks.append(SqliteSink(connection, 'call_logs', CALL_LOG_SQLITE_COLUMNS, CALL_LOG_SQLITE_INDEXES, source,
+                                        replace=not append))
+                continue
+            out_file_path = os.path.join(output_path, "call_logs." + fmt)
+            if fmt in ARROW_FORMATS:
+                sink = ArrowSink(out_file_path, CALL_LOG_SQLITE_COLUMNS, fmt, CALL_LOG_DICTIONARY_COLUMNS)
+                out_files.append((out_file_path, sink))
+                sinks.append(sink)
+                continue
+            resume = False
+            if append and os.path.exists(out_file_path) and os.path.getsize(out_file_path):
+                if fmt == 'json':
+                    out_file, resume = OpenJsonArrayForAppend(out_file_path)
+                else:
+                    out_file, resume = OpenTextFile(out_file_path, 'a'), True
+            else:
+                out_file = OpenTextFile(out_file_path, 'w')
+            out_files.append((out_file_path, out_file))
+            sinks.append(CreateSink(fmt, out_file, resume))
+    except (OSError, ValueError, sqlite3.Error) as ex:
+        print("Error: Could not create output file, error was: " + str(ex))
+        for _, out_file in out_files:
+            out_file.close()
+        return None
+    return out_files, sinks
+
+def FinishCallLogOutputs(out_files, sinks, count):
+    for sink in sinks:
+        sink.finish()
+    if count:
+        for out_file_path, _ in out_files:
+            print("Wrote out " + out_file_path)
+    else:
+        print("No items found in input file, nothing to write out!")
+
+def ParseCallLogs(entities, output_path, formats=DEFAULT_FORMATS, decode=DecodeCallRecord, columnar=False, source='', call_filter=None,
+                  extra_sinks=(), append=False, stats=None, pipeline=False):
+    '''
+        Parses all call log entities, streaming each record out to the
+        requested formats as call_logs.<format> in output_path, or the
+        call_logs table of SQLITE_DB_NAME in output_path for sqlite. With
+        columnar=True, records are collected in CallLogBatch batches and
+        converted a column at a time, which is faster for large files.
+
+        args:
+            entities: iterable of (key, data), e.g. BackupDataFile.entities()
+            output_path: existing folder to write output to
+            formats: list of output formats from OUTPUT_FORMATS
+            decode: record decoder, one of CALL_RECORD_DECODERS
+            columnar: decode into CallLogBatch batches
+            source: name of the input, stored with every row in sqlite
+            call_filter: optional CallLogFilter, rejected records are not decoded
+            extra_sinks: more sinks to write every record to, e.g. a result cache entry
+            append: add to existing output instead of replacing it
+            stats: optional ParseStats to collect stage timings and counters in
+            pipeline: write every output on its own writer thread while
+                      decoding (see pipeline.py), implies columnar
+        returns:
+            number of records written, or None if output files could not be created
+    '''
+    outputs = OpenCallLogOutputs(output_path, formats, source, append, pipeline)
+    if outputs is None:
+        return None
+    out_files, sinks = outputs
+    accepts = call_filter.accepts if call_filter is not None else None
+    if stats is not None:
+        sinks = WrapSinksForStats(stats, out_files, sinks)
+        entities = stats.iter_entities(entities)
+        decode = stats.timed(decode, 'decode')
+        if accepts:
+            accepts = stats.timed(accepts, 'filter')
+        loop_start = time.perf_counter()
+    sinks.extend(extra_sinks)
+    if pipeline:
+        sinks = ThreadSinks(sinks)
+        columnar = True # hand the writers whole batches
+    count = 0
+    try:
+        if accepts is not None:
+            entities = ((key, data) for key, data in entities if accepts(data))
+        if columnar:
+            batch = CallLogBatch()
+            for key, data in entities:
+                batch.append(key, decode(data))
+                if len(batch) >= COLUMNAR_BATCH_SIZE:
+                    count += WriteBatch(batch, sinks)
+                    batch.clear()
+            count += WriteBatch(batch, sinks)
+        else:
+            for key, data in entities:
+                record = GetCallLogRecord(key, data, decode)
+                for sink in sinks:
+                    sink.write(record)
+                count += 1
+        if stats is not None:
+            RecordFormatTime(stats, time.perf_counter() - loop_start, count, pipeline)
+        FinishCallLogOutputs(out_files, sinks, count)
+    finally:
+        StopSinks(sinks)
+        for _, out_file in out_files:
+            out_file.close()
+    return count
+
+def WriteCallLogRows(rows, output_path, formats=DEFAULT_FORMATS, source='', stats=None):
+    '''
+        Writes already formatted records (sequences of values in
+        CALL_LOG_COLUMNS order, e.g. from the result cache) to the same
+        outputs ParseCallLogs() would create. Returns number of records
+        written, or None if output files could not be created.
+    '''
+    outputs = OpenCallLogOutputs(output_path, formats, source)
+    if outputs is None:
+        return None
+    out_files, sinks = outputs
+    if stats is not None:
+        sinks = WrapSinksForStats(stats, out_files, sinks)
+    count = 0
+    try:
+        batch = []
+        for row in rows:
+            batch.append(tuple(row))
+            if len(batch) >= COLUMNAR_BATCH_SIZE:
+                for sink in sinks:
+                    sink.write_rows(CALL_LOG_COLUMNS, batch)
+                count += len(batch)
+                batch = []
+        for sink in sinks:
+            sink.write_rows(CALL_LOG_COLUMNS, batch)
+        count += len(batch)
+        FinishCallLogOutputs(out_files, sinks, count)
+    finally:
+        for _, out_file in out_files:
+            out_file.close()
+    return count
+
+PARALLEL_CHUNK_SIZE = 32768 # entities
+
+_chunk_files = {} # path : BackupDataFile, kept open in each worker process
+
+def DecodeCallLogChunk(input_path, start, end, decoder_name='native', call_filter=None):
+    '''
+        Decodes and formats the call log entities between offsets start and
+        end of input_path, run in a worker process by ParseCallLogsParallel().
+        Every worker maps the file once, the mapping shares the OS page
+        cache with all other workers. Returns list of row tuples (in
+        CALL_LOG_COLUMNS order).
+    '''
+    backup = _chunk_files.get(input_path)
+    if backup is None:
+        backup = BackupDataFile(input_path)
+        _chunk_files[input_path] = backup
+    decode = CALL_RECORD_DECODERS[decoder_name]
+    batch = CallLogBatch()
+    for key, data in backup.entities(start=start, end=end):
+        if call_filter is None or call_filter.accepts(data):
+            batch.append(key, decode(data))
+    return batch.tuples()
+
+def ParseCallLogsParallel(input_path, output_path, formats=DEFAULT_FORMATS, decoder_name='native', jobs=None, source='',
+                          call_filter=None, extra_sinks=(), chunk_size=PARALLEL_CHUNK_SIZE, stats=None, pipeline=False):
+    '''
+        Same output as ParseCallLogs() for the whole of input_path, but the
+        decoding and formatting is spread over a pool of 'jobs' processes
+        (default: number of cpus). A framing pass first splits the file into
+        chunks of chunk_size entities; chunk results are written out in file
+        order as they complete, with at most 2 x jobs chunks in flight.
+        With stats, the decode stage is the time spent waiting on workers.
+        With pipeline, every output is written on its own writer thread.
+
+        returns:
+            number of records written, or None if output files could not be created
+    '''
+    start_time = time.perf_counter()
+    with BackupDataFile(input_path) as backup:
+        chunks = backup.split(chunk_size)
+    if stats is not None:
+        stats.add_time('framing', time.perf_counter() - start_time)
+        stats.count('chunks', len(chunks))
+    outputs = OpenCallLogOutputs(output_path, formats, source, threaded=pipeline)
+    if outputs is None:
+        return None
+    out_files, sinks = outputs
+    if stats is not None:
+        sinks = WrapSinksForStats(stats, out_files, sinks)
+    sinks.extend(extra_sinks)
+    if pipeline:
+        sinks = ThreadSinks(sinks)
+    import concurrent.futures # only needed here, not imported at startup
+    count = 0
+    try:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as pool:
+            max_pending = 2 * (jobs or os.cpu_count() or 1)
+            pending = collections.deque()
+            chunks = iter(chunks)
+            while True:
+                for start, end in chunks:
+                    pending.append(pool.submit(DecodeCallLogChunk, input_path, start, end, decoder_name, call_filter))
+                    if len(pending) >= max_pending:
+                        break
+                if not pending:
+                    break
+                if stats is not None:
+                    wait_start = time.perf_counter()
+                    rows = pending.popleft().result()
+                    stats.add_time('decode', time.perf_counter() - wait_start)
+                else:
+                    rows = pending.popleft().result()
+                for sink in sinks:
+                    sink.write_rows(CALL_LOG_COLUMNS, rows)
+                count += len(rows)
+        if stats is not None:
+            stats.count('records', count)
+        FinishCallLogOutputs(out_files, sinks, count)
+    finally:
+        StopSinks(sinks)
+        for _, out_file in out_files:
+            out_file.close()
+    return count
+
+def AppendCallLogs(input_path, output_path, formats=DEFAULT_FORMATS, decode=DecodeCallRecord, columnar=False, stats=None,
+                   pipeline=False):
+    '''
+        Parses only the calls of input_path whose serial numbers are not yet
+        in the output in output_path, appending them to it, and saves a
+        checkpoint (see call_log_checkpoint.py) once every output is
+        finished. If the append fails part way, the outputs are put back
+        as they were. Returns number of records appended, or None if
+        output could not be written.
+    '''
+    for fmt in formats:
+        if fmt in ARROW_FORMATS: # checked before anything is read or written
+            print("Error: {} output cannot be appended to, choose another format for --append".format(fmt))
+            return None
+    checkpoint = LoadCheckpoint(output_path)
+    if checkpoint:
+        serials, last_input = checkpoint
+    else:
+        serials, last_input = LoadSerialsFromOutput(output_path), None
+    print("{} calls already in output".format(len(serials)))
+    with BackupDataFile(input_path) as backup:
+        start = GetResumeOffset(backup, last_input)
+        if start:
+            print("Skipping the first {} bytes of input, already covered by checkpoint".format(start))
+        progress = {}
+        output_state = SaveOutputState(output_path, formats)
+        try:
+            count = ParseCallLogs(IterNewEntities(backup, start, serials, progress), output_path, formats, decode, columnar,
+                                  input_path, append=True, stats=stats, pipeline=pipeline)
+        except BaseException: # including Ctrl+C
+            print("Error: Append failed, undoing it")
+            RestoreOutputState(output_state)
+            raise
+        if count is None:
+            RestoreOutputState(output_state)
+            return None
+        print("Appended {} new calls".format(count))
+        serials.update(progress['new_serials'])
+        try:
+            SaveCheckpoint(output_path, serials, backup.size, progress['covered'], HashPrefix(backup, progress['covered']))
+        except OSError as ex:
+            print("Error: Could not save checkpoint, error was: " + str(ex))
+            try: # an old checkpoint would miss the calls just appended
+                DeleteCheckpoint(output_path)
+            except OSError:
+                pass
+    return count
+
+def ReportInputProblems(skipped, missing, stats=None):
+    '''Prints the regions --recover skipped and the --serials that were not found, either list may be None'''
+    if skipped is not None:
+        PrintSkippedRegions(skipped)
+        if stats:
+            stats.count('skipped_bytes', sum(end - start for start, end in skipped))
+    if missing is not None:
+        for serial in missing:
+            print("Error: No call with serial number " + serial)
 
+def ProcessCallLogFile(args, input_path, output_path, formats, decode, call_filter, serials, stats=None):
+    '''Parses input_path as chosen by the command line options in args, used by main()'''
+    cache = GetResultCache(args)
+    cache_writer = None
+    if cache:
+        options = { name : getattr(args, name) for name in ('recover', 'serials', 'start', 'end', 'types', 'number') }
+        cache_key = cache.make_key(input_path, 'callparser', RESULT_VERSION, options)
+        cached_rows = cache.get(cache_key, input_path)
+        if cached_rows is not None:
+            WriteCallLogRows(cached_rows(), output_path, formats, input_path, stats)
+            ReportInputProblems(cached_rows.info.get('skipped'), cached_rows.info.get('missing'), stats)
+            return
+        cache_writer = cache.writer(cache_key)
+    if args.append:
+        AppendCallLogs(input_path, output_path, formats, decode, args.columnar, stats, args.pipeline)
+        return
+    if args.jobs != 1:
+        try:
+            ParseCallLogsParallel(input_path, output_path, formats, args.decoder, args.jobs or None, input_path,
+                                  call_filter, [cache_writer] if cache_writer else [], stats=stats, pipeline=args.pipeline)
+        finally:
+            if cache_writer:
+                cache_writer.abort()
+        return
+    skipped = None
+    missing = None
+    with BackupDataFile(input_path) as backup:
+        if args.recover:
+            skipped = []
+            carved = CarvedCallRecords()
+            entities = backup.carve_entities(carved.validate, skipped)
+            if decode is DecodeCallRecord:
+                decode = carved.decode
+        elif serials is not None:
+            missing = []
+            entities = IterIndexedEntities(backup, GetIndex(input_path), serials, missing)
+        elif args.pipeline:
+            entities = IterPipelinedEntities(backup)
+        else:
+            entities = backup.entities()
+        if cache_writer: # saved with the records, to be reported again on a cache hit
+            if skipped is not None:
+                cache_writer.info['skipped'] = skipped
+            if missing is not None:
+                cache_writer.info['missing'] = missing
+        try:
+            ParseCallLogs(entities, output_path, formats, decode, args.columnar, input_path, call_filter,
+                          [cache_writer] if cache_writer else [], stats=stats, pipeline=args.pipeline)
+        finally:
+            if cache_writer:
+                cache_writer.abort()
+        ReportInputProblems(skipped, missing, stats)
 
 def main():
     usage = "Parser for 'com.android.calllogbackup.data'"\
             "\n--------------------------------------------"\
             "\nUsage: callparser.py input_file output_folder"\
             "\nExample: callparser.py  com.android.calllogbackup.data  c:\output_folder\\"\
-            "\n\nOutput is in CSV and JSON formats"\
+            "\n\nOutput is in CSV and JSON formats (NDJSON, SQLite, Parquet and Arrow optional), written while parsing"\
             "\nNote: All times in output are UTC"\
             "\nSend bugs/comments to yogesh@swiftforensics.com"
 
-    argc = len(sys.argv)
-    if argc < 3:
-        print("Error: Insufficient arguments..")
-        print(usage)
-        return
+    parser = argparse.ArgumentParser(description=usage, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('input_file', help="Path to 'com.android.calllogbackup.data'")
+    parser.add_argument('output_folder', help='Folder to write output files to')
+    parser.add_argument('--decoder', choices=sorted(CALL_RECORD_DECODERS), default='native',
+                        help="Call record decoder, 'construct' is the slower reference implementation (default: native)")
+    parser.add_argument('--formats', default='csv,json',
+                        help='Comma separated list of output formats from {} (default: csv,json)'.format(','.join(OUTPUT_FORMATS)))
+    parser.add_argument('--columnar', action='store_true',
+                        help='Decode records into column batches and format them a column at a time (faster on large files)')
+    parser.add_argument('--recover', action='store_true',
+                        help='Recovery mode for damaged files or raw images, scan for every readable entity instead of stopping at the first bad one')
+    parser.add_argument('--serials',
+                        help='Comma separated serial numbers of the calls to parse, these are read directly using the offset index (input_file.idx)')
+    parser.add_argument('--append', action='store_true',
+                        help='Add only calls not already in output_folder to its existing output, and save a checkpoint for the next run')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='Decode the file in chunks on this many worker processes, 0 for one per cpu (default: 1)')
+    parser.add_argument('--pipeline', action='store_true',
+                        help='Read, decode and write on separate threads, so disk reads and writes overlap with decoding')
+    AddFilterArguments(parser)
+    AddCacheArguments(parser)
+    AddStatsArguments(parser)
+    args = parser.parse_args()
 
-    input_path = sys.argv[1]
-    output_path = sys.argv[2]
-    call_logs = []
-    out_file_path_csv = ""
-    out_file_path_json = ""
-    out_file_csv = None
-    out_file_json = None
+    input_path = args.input_file
+    output_path = args.output_folder
+    decode = CALL_RECORD_DECODERS[args.decoder]
+    formats = GetOutputFormats(args.formats)
+    if formats is None:
+        return
+    call_filter = GetCallLogFilter(args)
+    if call_filter is False:
+        return
+    serials = [serial.strip() for serial in args.serials.split(',') if serial.strip()] if args.serials else None
+    if serials is not None and args.recover:
+        print("Error: --serials cannot be used with --recover")
+        return
+    if args.append and (args.recover or serials is not None or call_filter or args.cache):
+        print("Error: --append cannot be used with --recover, --serials, --cache or filters")
+        return
+    if args.jobs < 0:
+        print("Error: jobs must be 0 or more")
+        return
+    if args.jobs != 1 and (args.recover or serials is not None or args.append):
+        print("Error: --jobs cannot be used with --recover, --serials or --append")
+        return
 
     try:
         if os.path.exists(input_path):
@@ -199,57 +1008,26 @@ def main():
                 except OSError as ex:
                     print("Error: Cannot create output file : " + output_path + "\nError Details: " + str(ex))
                     return
-            out_file_path_csv = os.path.join(output_path, "call_logs.csv")
-            out_file_path_json = os.path.join(output_path, "call_logs.json")
-            try:
-                out_file_csv = open(out_file_path_csv, 'w')
-                out_file_json = open(out_file_path_json, 'w')
-            except OSError as ex:
-                print("Error: Could not create output file, error was: " + str(ex))
-                return
 
             # Actual processing starts here
+            stats = ParseStats() if args.stats else None
+            if stats:
+                stats.info.update({ 'parser' : 'callparser', 'input' : input_path, 'input_bytes' : os.path.getsize(input_path) })
+            profiler = StartProfiler(args.profile)
             try:
                 print("Trying to read file " + input_path)
-                with open (input_path, "rb") as f:
-                    file_data = f.read(12)
-                    while file_data:
-                        if len(file_data) != 12:
-                            print('Error, read less than 12 bytes from file, expected full Data header!')
-                            break
-                        data_meta = DataHeader.parse(file_data)
-                        key = f.read(data_meta.size_key + 1).decode('utf8')
-                        if f.tell() % 4: f.seek(4 - (f.tell() % 4), 1) # Align to 4 byte boundary
-                        #print ("Reading Key =", key)
-                        if data_meta.size_data != 0xFFFFFFFF:
-                            data = f.read(data_meta.size_data)
-                            #print (data)
-                            ParseCallLogData(key, data, call_logs)
-                        
-                        if f.tell() % 4: f.seek(4 - (f.tell() % 4), 1) # Align to 4 byte boundary
-                        # Read next header
-                        file_data = f.read(12)
-                    # Done processing, now write it out
-                    if call_logs:
-                        WriteCsv(call_logs, out_file_csv)
-                        print("Wrote out " + out_file_path_csv)
-                        WriteJson(call_logs, out_file_json)
-                        print("Wrote out " + out_file_path_json)
-                    else:
-                        print("No items found in input file, nothing to write out!")
-
+                ProcessCallLogFile(args, input_path, output_path, formats, decode, call_filter, serials, stats)
             except OSError as ex:
                 print("Error: Cannot read input file : " + input_path + "\nError Details: " + str(ex))
                 return
+            finally:
+                StopProfiler(profiler, args.profile)
+                if stats:
+                    stats.save(args.stats)
         else:
             print("Error: Failed to find file at specified path. Path was : " + input_path)
     except OSError as ex:
         print("Error: Unknown exception, error details are: " + str(ex))    
-    
-    if out_file_csv:
-        out_file_csv.close()
-    if out_file_json:
-        out_file_json.close()
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,222 @@
+'''
+    (c) adb_backup_parser contributors 2026
+
+    License: MIT
+
+    Purpose: Sidecar offset index for backup data files, so one settings
+             key or one call serial number can be read without walking the
+             whole file. The index is saved next to the input as
+             <input>.idx and holds each entity's key, data offset and data
+             size. It is tagged with the size and modification time of the
+             input it was built from and is rebuilt when those change.
+
+             Index file layout (all little endian):
+
+               'ABEIDX01' | input size (uint64) | input mtime ns (uint64) | count (uint32)
+               data offsets  (count x uint64)
+               data sizes    (count x uint32)
+               keys          (utf8, NUL separated)
+
+    Requires: Python 3
+'''
+
+from backup_reader import BackupDataFile
+import argparse
+import array
+import os
+import struct
+import sys
+
+INDEX_MAGIC = b'ABEIDX01'
+INDEX_SUFFIX = '.idx'
+
+_index_header = struct.Struct('<8sQQI')
+
+def GetIndexPath(data_path):
+    return data_path + INDEX_SUFFIX
+
+def GetFileTag(data_path):
+    '''Returns (size, mtime in ns) of the file, used to tell if an index is stale'''
+    stat = os.stat(data_path)
+    return stat.st_size, stat.st_mtime_ns
+
+def _ToLittleEndian(values):
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
+
+class EntityIndex:
+    '''
+        Key to (data offset, data size) map of the entities in a data file.
+        Keys do not include the NUL terminator. If a key occurs more than
+        once, the last entity wins, as it would on restore.
+    '''
+    def __init__(self, keys, offsets, sizes, tag):
+        self.keys = keys
+        self.offsets = offsets
+        self.sizes = sizes
+        self.tag = tag
+        self._positions = { key : position for position, key in enumerate(keys) }
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, key):
+        return key in self._positions
+
+    def get(self, key):
+        '''Returns (data offset, data size) for key or None'''
+        position = self._positions.get(key)
+        if position is None:
+            return None
+        return self.offsets[position], self.sizes[position]
+
+    def save(self, index_path):
+        with open(index_path, 'wb') as f:
+            f.write(_index_header.pack(INDEX_MAGIC, self.tag[0], self.tag[1], len(self.keys)))
+            f.write(_ToLittleEndian(array.array('Q', self.offsets)).tobytes())
+            f.write(_ToLittleEndian(array.array('I', self.sizes)).tobytes())
+            f.write('\x00'.join(self.keys).encode('utf8'))
+
+def BuildIndex(data_path):
+    '''Walks the data file once and returns its EntityIndex'''
+    tag = GetFileTag(data_path)
+    keys = []
+    offsets = array.array('Q')
+    sizes = array.array('I')
+    with BackupDataFile(data_path) as backup:
+        for key, data_offset, size_data in backup.entity_locations():
+            keys.append(key)
+            offsets.append(data_offset)
+            sizes.append(size_data)
+    return EntityIndex(keys, offsets, sizes, tag)
+
+def LoadIndex(index_path, tag=None):
+    '''
+        Reads an index file. Returns None if it is missing, damaged, or
+        (when tag is given) was built from a different version of the input.
+    '''
+    try:
+        with open(index_path, 'rb') as f:
+            raw = f.read()
+    except OSError:
+        return None
+    if len(raw) < _index_header.size:
+        return None
+    magic, size, mtime_ns, count = _index_header.unpack_from(raw, 0)
+    if magic != INDEX_MAGIC or (tag is not None and (size, mtime_ns) != tuple(tag)):
+        return None
+    pos = _index_header.size
+    offsets = array.array('Q')
+    sizes = array.array('I')
+    offsets_end = pos + count * offsets.itemsize
+    sizes_end = offsets_end + count * sizes.itemsize
+    if sizes_end > len(raw):
+        return None
+    offsets.frombytes(raw[pos:offsets_end])
+    sizes.frombytes(raw[offsets_end:sizes_end])
+    try:
+        keys = str(raw[sizes_end:], 'utf8').split('\x00') if count else []
+    except UnicodeDecodeError:
+        return None
+    if len(keys) != count:
+        return None
+    return EntityIndex(keys, _ToLittleEndian(offsets), _ToLittleEndian(sizes), (size, mtime_ns))
+
+def GetIndex(data_path, index_path=None, save=True):
+    '''
+        Returns the EntityIndex for data_path, loading the sidecar index
+        if it is current, else building it (and saving it unless save is
+        False). A failure to save is reported but the index is still returned.
+    '''
+    index_path = index_path or GetIndexPath(data_path)
+    index = LoadIndex(index_path, GetFileTag(data_path))
+    if index is None:
+        index = BuildIndex(data_path)
+        if save:
+            try:
+                index.save(index_path)
+            except OSError as ex:
+                print("Error: Could not save index to " + index_path + " : " + str(ex))
+    return index
+
+def IterIndexedEntities(backup, index, keys, missing=None):
+    '''
+        Generator yielding (key, memoryview) for each of keys found in the
+        index, reading only those entities from the open BackupDataFile.
+        Keys are yielded with their NUL terminator, as entities() does.
+
+        args:
+            missing: optional list, gets the keys that are not in the index
+    '''
+    for key in keys:
+        location = index.get(key)
+        data = None if location is None else backup.read_at(*location)
+        if data is None:
+            if missing is not None:
+                missing.append(key)
+            continue
+        yield key + '\x00', data
+
+def LookupEntity(data_path, key, index_path=None):
+    '''Returns the data (bytes) of the entity with key in data_path, or None if not present'''
+    index = GetIndex(data_path, index_path)
+    with BackupDataFile(data_path) as backup:
+        for _, data in IterIndexedEntities(backup, index, [key]):
+            return bytes(data)
+    return None
+
+def main():
+    usage = "Offset index for backup data files"\
+            "\n--------------------------------------------"\
+            "\nUsage: entity_index.py build input_file [--index path]"\
+            "\n       entity_index.py lookup input_file key [key ..] [--dump folder]"\
+            "\nExample: entity_index.py  lookup  com.android.providers.settings.data  secure  global"\
+            "\n\nThe index is saved as <input_file>.idx unless --index is given, and is"\
+            "\nrebuilt automatically if the input file has changed since."\
+            "\nSend bugs/comments to yogesh@swiftforensics.com"
+
+    parser = argparse.ArgumentParser(description=usage, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', choices=('build', 'lookup'))
+    parser.add_argument('input_file', help='Backup data file')
+    parser.add_argument('keys', nargs='*', help='Keys to look up')
+    parser.add_argument('--index', help='Index path (default: input_file.idx)')
+    parser.add_argument('--dump', help='Folder to write the data of looked up entities to')
+    args = parser.parse_args()
+
+    input_path = args.input_file
+    index_path = args.index or GetIndexPath(input_path)
+    if not os.path.isfile(input_path):
+        print("Error: Failed to find file at specified path. Path was : " + input_path)
+        return
+
+    try:
+        if args.command == 'build':
+            index = BuildIndex(input_path)
+            index.save(index_path)
+            print("Indexed {} entities, index written to {}".format(len(index), index_path))
+            return
+
+        if not args.keys:
+            print("Error: No keys given to look up")
+            return
+        if args.dump:
+            os.makedirs(args.dump, exist_ok=True)
+        index = GetIndex(input_path, index_path)
+        missing = []
+        with BackupDataFile(input_path) as backup:
+            for key, data in IterIndexedEntities(backup, index, args.keys, missing):
+                key = key.rstrip('\x00')
+                offset, size = index.get(key)
+                print("{}\toffset={}\tsize={}".format(key, offset, size))
+                if args.dump:
+                    dump_name = ''.join(c if c.isalnum() or c in '._-' else '_' for c in key)
+                    with open(os.path.join(args.dump, dump_name + '.bin'), 'wb') as f:
+                        f.write(data)
+        for key in missing:
+            print("Error: Key '{}' not found".format(key))
+    except OSError as ex:
+        print("Error: " + str(ex))
+
+if __name__ == '__main__':
+    main()
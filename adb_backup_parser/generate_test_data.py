@@ -0,0 +1,252 @@
+'''
+    (c) adb_backup_parser contributors 2026
+
+    License: MIT
+
+    Purpose: Generate synthetic, but structurally valid, backup data files
+             for testing and benchmarking the parsers:
+
+               com.android.calllogbackup.data      (versions 1005 and 1007,
+                                                    optional fields varied)
+               com.android.providers.settings.data (system, secure, global,
+                                                    locale, lock_settings,
+                                                    softap_config, wifi_new_config)
+
+             Size is controlled with a record count or a target file size.
+             Output is deterministic for a given seed.
+
+    Requires: Python 3
+'''
+
+import argparse
+import random
+import struct
+from xml.sax.saxutils import escape
+
+CALL_TYPES = (1, 2, 3, 4, 5, 6, 7)
+PRESENTATIONS = (1, 2, 3, 4)
+BLOCK_REASONS = (0, 1, 2, 3, 4, 5, 6, 7)
+NAME_PARTS = ('screen', 'brightness', 'volume', 'ring', 'wifi', 'bluetooth', 'airplane',
+              'mode', 'timeout', 'enabled', 'sound', 'haptic', 'location', 'font', 'scale')
+
+def BuildPascalString(s):
+    '''uint16 big endian length followed by utf8 bytes'''
+    b = s.encode('utf8')
+    return struct.pack('>H', len(b)) + b
+
+def BuildOptionalString(s):
+    '''uint8 presence flag followed by the string if not None'''
+    if s is None:
+        return b'\x00'
+    return b'\x01' + BuildPascalString(s)
+
+def BuildCallRecord(version, timestamp, duration_in_sec, number, call_type, presentation,
+                    servicename=None, iccid=None, own_number=None, oem='', block_reason=0):
+    '''Returns the serialized call log record (versions 1005 and 1007)'''
+    data = struct.pack('>IqQ', version, timestamp, duration_in_sec)
+    data += BuildOptionalString(number)
+    data += struct.pack('>II', call_type, presentation)
+    data += BuildOptionalString(servicename)
+    data += BuildOptionalString(iccid)
+    data += BuildOptionalString(own_number)
+    data += bytes(12)
+    data += BuildPascalString(oem)
+    data += struct.pack('>II', 0, 0)
+    if version == 1007:
+        data += bytes(10) + struct.pack('>I', block_reason)
+    return data
+
+def BuildEntity(key, data):
+    '''Returns a 'Data' entity with key and data padded to 4 byte boundaries, data=None writes a deleted entity'''
+    key_bytes = key.encode('utf8')
+    size_data = 0xFFFFFFFF if data is None else len(data)
+    entity = b'Data' + struct.pack('<II', len(key_bytes), size_data) + key_bytes + b'\x00'
+    entity += bytes(-len(entity) % 4)
+    if data is not None:
+        entity += data + bytes(-len(data) % 4)
+    return entity
+
+def BuildNameValues(items, len_size=4):
+    '''Serializes (name, value) pairs with uint32 (len_size=4) or uint16 (len_size=2) lengths, value None is null'''
+    len_format = '>I' if len_size == 4 else '>H'
+    null_len = 0xFFFFFFFF if len_size == 4 else 0xFFFF
+    parts = []
+    for name, value in items:
+        name_bytes = name.encode('utf8')
+        parts.append(struct.pack(len_format, len(name_bytes)))
+        parts.append(name_bytes)
+        if value is None:
+            parts.append(struct.pack(len_format, null_len))
+        else:
+            value_bytes = value.encode('utf8')
+            parts.append(struct.pack(len_format, len(value_bytes)))
+            parts.append(value_bytes)
+    return b''.join(parts)
+
+def BuildSoftapConfig(version=3, ssid='AndroidAP', ap_band=0, ap_channel=6, psk='password', allowed_key_mgmt=4, is_hidden_ssid=0):
+    data = struct.pack('>I', version) + BuildOptionalString(ssid)
+    data += struct.pack('>II', ap_band, ap_channel) + BuildOptionalString(psk)
+    data += struct.pack('>I', allowed_key_mgmt)
+    if version >= 3:
+        data += struct.pack('>B', is_hidden_ssid)
+    return data
+
+def BuildWifiConfigXml(networks):
+    '''
+        Returns WifiConfigStoreData xml (bytes) for a list of dicts having
+        ssid, security, psk (None for open networks) and hidden
+    '''
+    lines = ["<?xml version='1.0' encoding='utf-8' standalone='yes' ?>",
+             '<WifiConfigStoreData>', '<int name="Version" value="1" />', '<NetworkList>']
+    for net in networks:
+        quoted_ssid = escape('"{}"'.format(net['ssid']), {'"': '&quot;'})
+        lines.append('<Network>')
+        lines.append('<WifiConfiguration>')
+        lines.append('<string name="ConfigKey">{}{}</string>'.format(quoted_ssid, net['security']))
+        lines.append('<string name="SSID">{}</string>'.format(quoted_ssid))
+        if net['psk'] is None:
+            lines.append('<null name="PreSharedKey" />')
+        else:
+            lines.append('<string name="PreSharedKey">{}</string>'.format(escape('"{}"'.format(net['psk']), {'"': '&quot;'})))
+        lines.append('<boolean name="HiddenSSID" value="{}" />'.format('true' if net['hidden'] else 'false'))
+        lines.append('<int name="Status" value="2" />')
+        lines.append('<string name="CreatorName">android.uid.system:1000</string>')
+        lines.append('</WifiConfiguration>')
+        lines.append('<NetworkStatus><string name="SelectionStatus">NETWORK_SELECTION_ENABLED</string></NetworkStatus>')
+        lines.append('<IpConfiguration>')
+        lines.append('<string name="IpAssignment">DHCP</string>')
+        lines.append('<string name="ProxySettings">NONE</string>')
+        lines.append('</IpConfiguration>')
+        lines.append('</Network>')
+    lines.extend(['</NetworkList>', '</WifiConfigStoreData>'])
+    return '\n'.join(lines).encode('utf8')
+
+def RandomPhoneNumber(rng):
+    return '+1{}{:07d}'.format(rng.randint(200, 999), rng.randint(0, 9999999))
+
+def RandomCallRecord(rng):
+    '''Returns a random call record, mixing versions and which optional fields are present'''
+    version = rng.choice((1005, 1007))
+    return BuildCallRecord(version,
+                           timestamp=rng.randint(1262304000000, 1767225600000), # 2010 - 2026
+                           duration_in_sec=rng.choice((0, rng.randint(1, 600), rng.randint(600, 20000))),
+                           number=RandomPhoneNumber(rng) if rng.random() < 0.95 else None,
+                           call_type=rng.choice(CALL_TYPES),
+                           presentation=rng.choice(PRESENTATIONS),
+                           servicename=rng.choice((None, None, 'com.android.phone/TelephonyConnectionService')),
+                           iccid='8901{:015d}'.format(rng.randint(0, 10**15)) if rng.random() < 0.7 else None,
+                           own_number=RandomPhoneNumber(rng) if rng.random() < 0.3 else None,
+                           oem='',
+                           block_reason=rng.choice(BLOCK_REASONS) if rng.random() < 0.1 else 0)
+
+def WriteCallLogData(path, records=None, size=None, seed=0):
+    '''
+        Writes a call log data file with 'records' entities, or as many as
+        fit in 'size' bytes. Returns (records, bytes) written.
+    '''
+    rng = random.Random(seed)
+    count = 0
+    written = 0
+    with open(path, 'wb') as f:
+        while (records is None or count < records) and (size is None or written < size):
+            entity = BuildEntity(str(count + 1), RandomCallRecord(rng))
+            f.write(entity)
+            written += len(entity)
+            count += 1
+    return count, written
+
+def RandomSettings(rng, prefix, count, null_ratio=0.05):
+    items = []
+    for i in range(count):
+        name = '{}_{}_{}_{}'.format(prefix, rng.choice(NAME_PARTS), rng.choice(NAME_PARTS), i)
+        r = rng.random()
+        if r < null_ratio:
+            value = None
+        elif r < 0.5:
+            value = str(rng.randint(0, 1000))
+        else:
+            value = 'value_{}'.format(rng.getrandbits(32))
+        items.append((name, value))
+    return items
+
+def RandomNetworks(rng, count):
+    networks = []
+    for i in range(count):
+        security = rng.choice(('WPA_PSK', 'WPA_PSK', 'NONE', 'WPA_EAP'))
+        networks.append({ 'ssid' : 'Network_{}_{}'.format(i, rng.getrandbits(16)),
+                          'security' : security,
+                          'psk' : 'pw{}'.format(rng.getrandbits(32)) if security == 'WPA_PSK' else None,
+                          'hidden' : rng.random() < 0.1 })
+    return networks
+
+def BuildSettingsData(records, seed=0):
+    '''
+        Returns settings data bytes with 'records' settings in each of system,
+        secure and global, records/10 lock settings and records/10 wifi networks
+    '''
+    rng = random.Random(seed)
+    minor_count = max(1, records // 10)
+    entities = [
+        BuildEntity('system', BuildNameValues(RandomSettings(rng, 'system', records), 4)),
+        BuildEntity('secure', BuildNameValues(RandomSettings(rng, 'secure', records), 4)),
+        BuildEntity('global', BuildNameValues(RandomSettings(rng, 'global', records), 4)),
+        BuildEntity('locale', b'en-US'),
+        BuildEntity('lock_settings', BuildNameValues(RandomSettings(rng, 'lock', minor_count), 2)),
+        BuildEntity('softap_config', BuildSoftapConfig()),
+        BuildEntity('wifi_new_config', BuildWifiConfigXml(RandomNetworks(rng, minor_count)))
+    ]
+    return b''.join(entities)
+
+def WriteSettingsData(path, records=None, size=None, seed=0):
+    '''
+        Writes a settings data file with 'records' settings per table (see
+        BuildSettingsData), or scaled to approximately 'size' bytes.
+        Returns (records, bytes) written.
+    '''
+    if records is None:
+        sample_records = 1000
+        sample_size = len(BuildSettingsData(sample_records, seed))
+        records = max(1, int(sample_records * (size or sample_size) / sample_size))
+    data = BuildSettingsData(records, seed)
+    with open(path, 'wb') as f:
+        f.write(data)
+    return records, len(data)
+
+def ParseSize(text):
+    '''Converts sizes like 500000, 200KB, 64MB, 2GB to bytes'''
+    text = text.strip().upper()
+    for suffix, multiplier in (('GB', 1024**3), ('MB', 1024**2), ('KB', 1024), ('B', 1)):
+        if text.endswith(suffix):
+            return int(float(text[:-len(suffix)]) * multiplier)
+    return int(text)
+
+def main():
+    usage = "Generator for synthetic backup data files"\
+            "\n--------------------------------------------"\
+            "\nUsage: generate_test_data.py (calllog|settings) output_file [--records N | --size SIZE]"\
+            "\nExample: generate_test_data.py  calllog  com.android.calllogbackup.data  --size 200MB"\
+            "\n\nFor calllog, records is the number of calls. For settings, records is"\
+            "\nthe number of settings in each of system/secure/global."\
+            "\nSend bugs/comments to yogesh@swiftforensics.com"
+
+    parser = argparse.ArgumentParser(description=usage, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('data_type', choices=('calllog', 'settings'))
+    parser.add_argument('output_file')
+    parser.add_argument('--records', type=int, help='Number of records to generate (default: 10000)')
+    parser.add_argument('--size', help='Target file size, e.g. 64MB (instead of --records)')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed (default: 0)')
+    args = parser.parse_args()
+
+    records = args.records
+    size = ParseSize(args.size) if args.size else None
+    if records is None and size is None:
+        records = 10000
+
+    if args.data_type == 'calllog':
+        count, written = WriteCallLogData(args.output_file, records, size, args.seed)
+    else:
+        count, written = WriteSettingsData(args.output_file, records, size, args.seed)
+    print('Wrote {} records ({} bytes) to {}'.format(count, written, args.output_file))
+
+if __name__ == '__main__':
+    main()
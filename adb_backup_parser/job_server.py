@@ -0,0 +1,197 @@
+'''
+    (c) adb_backup_parser contributors 2026
+
+    License: MIT
+
+    Purpose: Long running worker that parses one backup file per job, so
+             callers running the parsers many times over do not pay for
+             interpreter startup and module imports on every file. Jobs
+             are read as JSON lines from stdin, or from connections to a
+             local Unix socket, and one JSON result line is written back
+             per job, in order.
+
+             Job:    { "id" : 7, "input" : "/cases/1/com.android.calllogbackup.data",
+                       "output" : "/out/1", "parser" : "calllog", "formats" : "csv,json" }
+
+                     parser is one of auto (default), backup, calllog or
+                     settings; formats defaults to the server's --formats.
+                     { "command" : "shutdown" } stops the server.
+
+             Result: the job's id plus the same fields as a batch_parser.py
+                     summary entry (input, type, output, status, error,
+                     warnings, seconds). Everything the parser prints goes
+                     to parse_log.txt in the job's output folder.
+
+    Requires: Python 3 and construct
+              Construct can be installed via 'pip install construct' on Windows
+              or 'pip3 install construct' on Linux
+'''
+
+from output_sinks import CheckOutputFormats
+import argparse
+import contextlib
+import json
+import os
+import socket
+import sys
+
+import batch_parser
+import callparser
+import providers_settings_parser
+
+JOB_PARSERS = { 'auto' : None,
+                'backup' : batch_parser.INPUT_BACKUP,
+                'calllog' : batch_parser.INPUT_CALLLOG,
+                'settings' : batch_parser.INPUT_SETTINGS }
+
+def Preload():
+    '''Imports and builds everything the parsers otherwise load on first use, so the first job is not slower'''
+    callparser.GetCallRecordStruct()
+    providers_settings_parser.GetSoftapConfigStruct()
+    import xml.etree.ElementTree
+
+def GetJobFormats(formats):
+    '''Returns list of formats from a job's comma separated string or list, raises ValueError if any is unknown or not installed'''
+    if isinstance(formats, str):
+        formats = formats.split(',')
+    if not isinstance(formats, list):
+        raise ValueError('formats must be a string or list')
+    formats = [str(fmt).strip().lower() for fmt in formats if str(fmt).strip()]
+    error = CheckOutputFormats(formats, callparser.OUTPUT_FORMATS)
+    if error:
+        raise ValueError(error)
+    return formats
+
+def RunJob(job, default_formats):
+    '''
+        Runs one job (dict) and returns its result dict. Never raises, a
+        bad job gets a result with status 'failed' and the reason in error.
+    '''
+    job_id = job.get('id') if isinstance(job, dict) else None
+    result = { 'id' : job_id, 'input' : '', 'type' : None, 'output' : '',
+               'status' : 'failed', 'error' : '', 'warnings' : 0, 'seconds' : 0 }
+    if not isinstance(job, dict):
+        result['error'] = 'Job must be a JSON object'
+        return result
+    input_path = job.get('input')
+    output_path = job.get('output')
+    parser_name = job.get('parser', 'auto')
+    result['input'] = input_path or ''
+    result['output'] = output_path or ''
+    if not isinstance(input_path, str) or not isinstance(output_path, str) or not input_path or not output_path:
+        result['error'] = "Job needs 'input' and 'output' paths"
+        return result
+    if parser_name not in JOB_PARSERS:
+        result['error'] = "Unknown parser '{}', choose from {}".format(parser_name, ','.join(JOB_PARSERS))
+        return result
+    formats = default_formats
+    if 'formats' in job:
+        try:
+            formats = GetJobFormats(job['formats'])
+        except ValueError as ex:
+            result['error'] = str(ex)
+            return result
+    input_type = JOB_PARSERS[parser_name]
+    if input_type is None:
+        try:
+            input_type = batch_parser.DetectInputType(input_path)
+        except OSError as ex:
+            result['error'] = str(ex)
+            return result
+        if input_type is None:
+            result['status'] = 'skipped'
+            result['error'] = 'Unrecognised file type'
+            return result
+    result.update(batch_parser.ProcessInput(input_type, input_path, output_path, formats))
+    return result
+
+def ServeStream(in_file, out_file, default_formats):
+    '''
+        Runs jobs read as JSON lines from in_file until it ends, writing a
+        result line to out_file after each one. Returns False if a shutdown
+        command was received, else True.
+    '''
+    for line in in_file:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            job = json.loads(line)
+        except ValueError as ex:
+            job = None
+            result = { 'id' : None, 'status' : 'failed', 'error' : 'Invalid JSON : ' + str(ex) }
+        if isinstance(job, dict) and job.get('command') == 'shutdown':
+            out_file.write(json.dumps({ 'id' : job.get('id'), 'status' : 'shutdown' }) + '\n')
+            out_file.flush()
+            return False
+        if job is not None:
+            result = RunJob(job, default_formats)
+        out_file.write(json.dumps(result) + '\n')
+        out_file.flush()
+    return True
+
+def ServeSocket(socket_path, default_formats):
+    '''
+        Listens on a Unix socket at socket_path, serving one connection at
+        a time with ServeStream() until a shutdown command is received
+    '''
+    if os.path.exists(socket_path):
+        os.remove(socket_path) # left over from an earlier run
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        server.bind(socket_path)
+        server.listen(1)
+        print("Listening on " + socket_path)
+        while True:
+            connection, _ = server.accept()
+            with connection:
+                with connection.makefile('r', encoding='utf8') as in_file, \
+                     connection.makefile('w', encoding='utf8') as out_file:
+                    try:
+                        if not ServeStream(in_file, out_file, default_formats):
+                            return
+                    except OSError as ex: # client went away
+                        print("Error: Connection failed : " + str(ex))
+    finally:
+        server.close()
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+
+def main():
+    usage = "Job server, parses backup files as requested over stdin or a Unix socket"\
+            "\n--------------------------------------------"\
+            "\nUsage: job_server.py [--socket path] [--formats csv,json]"\
+            "\nExample: echo {\"input\": \"Backup.ab\", \"output\": \"out1\"} | job_server.py"\
+            "\n\nEach job is one line of JSON with input, output and optionally"\
+            "\nparser (auto, backup, calllog, settings) and formats. One line of"\
+            "\nJSON with the result is written back for every job."\
+            "\nNote: All times in output are UTC"\
+            "\nSend bugs/comments to yogesh@swiftforensics.com"
+
+    parser = argparse.ArgumentParser(description=usage, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--socket', help='Listen on this Unix socket path instead of reading jobs from stdin')
+    parser.add_argument('--formats', default='csv,json',
+                        help='Default call log output formats from {} (default: csv,json)'.format(','.join(callparser.OUTPUT_FORMATS)))
+    args = parser.parse_args()
+
+    default_formats = callparser.GetOutputFormats(args.formats)
+    if default_formats is None:
+        return
+    if args.socket and not hasattr(socket, 'AF_UNIX'):
+        print("Error: Unix sockets are not available on this platform, read jobs from stdin instead")
+        return
+    Preload()
+    try:
+        if args.socket:
+            ServeSocket(args.socket, default_formats)
+        else:
+            # stdout carries the results, anything else printed goes to stderr
+            with contextlib.redirect_stdout(sys.stderr):
+                ServeStream(sys.stdin, sys.__stdout__, default_formats)
+    except KeyboardInterrupt:
+        pass
+    except OSError as ex:
+        print("Error: " + str(ex))
+
+if __name__ == '__main__':
+    main()
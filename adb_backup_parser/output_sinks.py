@@ -0,0 +1,409 @@
+'''
+    (c) adb_backup_parser contributors 2026
+
+    License: MIT
+
+    Purpose: Streaming output writers shared by the parsers. Each sink is
+             handed one record (dict) at a time as it is decoded, so memory
+             use stays constant and output appears while parsing.
+
+             Output is identical to writing the whole list at the end with
+             csv.DictWriter.writerows() or json.dump({name: list}).
+
+             SqliteSink inserts the records into a table of a sqlite
+             database in batched transactions instead.
+
+             Compressed text output (.gz, .zst) is written through
+             OpenTextFile(), and ArrowSink writes Parquet or Arrow IPC files
+             with a fixed schema and dictionary encoded string columns.
+
+    Requires: Python 3
+              Optional: zstandard for .zst output, pyarrow for Parquet/Arrow
+'''
+
+import csv
+import gzip
+import importlib
+import importlib.util
+import io
+import json
+import os
+import sqlite3
+
+class CsvSink:
+    '''
+        Writes records as csv rows, the header is taken from the first
+        record. Use header=False when appending to an existing csv file.
+    '''
+    def __init__(self, out_file, header=True):
+        self.out_file = out_file
+        self.header = header
+        self.writer = None
+        self.row_writer = None
+        self.count = 0
+
+    def _start(self, columns):
+        self.writer = csv.DictWriter(self.out_file, delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL, fieldnames=columns)
+        self.row_writer = csv.writer(self.out_file, delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL)
+        if self.header:
+            self.writer.writeheader()
+
+    def write(self, record):
+        if self.writer is None:
+            self._start([col for col in record])
+        self.writer.writerow(record)
+        self.count += 1
+
+    def write_rows(self, columns, rows):
+        '''Writes a list of tuples holding values in the order of columns'''
+        if self.writer is None:
+            self._start(list(columns))
+        self.row_writer.writerows(rows)
+        self.count += len(rows)
+
+    def finish(self):
+        pass
+
+class JsonArraySink:
+    '''
+        Writes records as elements of a json array, i.e. { dataset_name : [ {}, {}, .. ] }
+        With resume=True, out_file is positioned inside an array that
+        already has elements (see OpenJsonArrayForAppend).
+    '''
+    def __init__(self, out_file, dataset_name, resume=False):
+        self.out_file = out_file
+        self.dataset_name = dataset_name
+        self.in_array = resume
+        self.count = 0
+
+    def write(self, record):
+        if self.in_array:
+            self.out_file.write(', ')
+        else:
+            self.out_file.write('{' + json.dumps(self.dataset_name) + ': [')
+            self.in_array = True
+        self.out_file.write(json.dumps(record))
+        self.count += 1
+
+    def write_rows(self, columns, rows):
+        '''Writes a list of tuples holding values in the order of columns'''
+        for row in rows:
+            self.write(dict(zip(columns, row)))
+
+    def finish(self):
+        if self.in_array:
+            self.out_file.write(']}')
+
+def OpenJsonArrayForAppend(path):
+    '''
+        Opens a json file written by JsonArraySink so more elements can be
+        added. The closing ']}' is removed and the file is returned opened
+        for appending, along with whether the array already has elements.
+        Raises ValueError if the file does not end like a JsonArraySink file.
+    '''
+    size = os.path.getsize(path)
+    if size == 0: # JsonArraySink writes nothing when there are no records
+        return open(path, 'a'), False
+    with open(path, 'rb') as f:
+        f.seek(max(0, size - 2))
+        if f.read() != b']}':
+            raise ValueError('{} does not end with a json array'.format(path))
+    os.truncate(path, size - 2)
+    return open(path, 'a'), True
+
+class NdjsonSink:
+    '''Writes one json object per line (newline delimited json)'''
+    def __init__(self, out_file):
+        self.out_file = out_file
+        self.count = 0
+
+    def write(self, record):
+        self.out_file.write(json.dumps(record))
+        self.out_file.write('\n')
+        self.count += 1
+
+    def write_rows(self, columns, rows):
+        '''Writes a list of tuples holding values in the order of columns'''
+        for row in rows:
+            self.write(dict(zip(columns, row)))
+
+    def finish(self):
+        pass
+
+SQLITE_DB_NAME = 'android_backup.sqlite'
+SQLITE_BATCH_SIZE = 10000
+
+def OpenSqliteDatabase(path, table, columns, check_same_thread=True):
+    '''
+        Opens (creating if needed) the sqlite database at path and makes
+        sure 'table' exists with the given columns and a 'source' column.
+
+        args:
+            columns: [(name, sqlite type), ..]
+            check_same_thread: False if the connection will be used by a
+                               writer thread (see pipeline.py)
+    '''
+    connection = sqlite3.connect(path, check_same_thread=check_same_thread)
+    columns_sql = ', '.join('"{}" {}'.format(name, col_type) for name, col_type in columns)
+    connection.execute('CREATE TABLE IF NOT EXISTS "{}" ({}, "source" TEXT)'.format(table, columns_sql))
+    connection.commit()
+    return connection
+
+class SqliteSink:
+    '''
+        Inserts records into a sqlite table in batches, each batch in its
+        own transaction. Rows previously written for the same source are
+        replaced (unless replace=False, for appending), so re-parsing an
+        input does not duplicate it. They are only deleted by finish(), in
+        the same transaction as the last batch, so a parse that fails part
+        way leaves the earlier rows in place. Every row gets a 'source'
+        column, so output of many inputs can share one database.
+    '''
+    def __init__(self, connection, table, columns, indexes=(), source='', batch_size=SQLITE_BATCH_SIZE, replace=True):
+        self.connection = connection
+        self.table = table
+        self.columns = [name for name, _ in columns]
+        self.indexes = indexes
+        self.source = source
+        self.batch_size = batch_size
+        self.pending = []
+        self.count = 0
+        self.insert_sql = 'INSERT INTO "{}" ({}, "source") VALUES ({}, ?)'.format(
+                            table, ', '.join('"{}"'.format(name) for name in self.columns), ', '.join('?' * len(self.columns)))
+        # Rows up to this rowid were there before, the ones of source among them are replaced in finish()
+        self.replace_rowid = None
+        if replace:
+            self.replace_rowid = self.connection.execute('SELECT MAX(rowid) FROM "{}"'.format(table)).fetchone()[0]
+
+    def write(self, record):
+        self.pending.append(tuple(record.get(name) for name in self.columns) + (self.source,))
+        self.count += 1
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def write_rows(self, columns, rows):
+        '''Writes a list of tuples holding values in the order of columns'''
+        source = (self.source,)
+        if list(columns) == self.columns:
+            self.pending.extend(row + source for row in rows)
+        else:
+            positions = [list(columns).index(name) for name in self.columns]
+            self.pending.extend(tuple(row[pos] for pos in positions) + source for row in rows)
+        self.count += len(rows)
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            with self.connection: # one transaction per batch
+                self.connection.executemany(self.insert_sql, self.pending)
+            self.pending = []
+
+    def finish(self):
+        with self.connection:
+            if self.pending:
+                self.connection.executemany(self.insert_sql, self.pending)
+                self.pending = []
+            if self.replace_rowid is not None:
+                self.connection.execute('DELETE FROM "{}" WHERE "source" = ? AND rowid <= ?'.format(self.table),
+                                        (self.source, self.replace_rowid))
+            for index in self.indexes:
+                index_columns = index if isinstance(index, tuple) else (index,)
+                self.connection.execute('CREATE INDEX IF NOT EXISTS "idx_{}_{}" ON "{}" ({})'.format(
+                                        self.table, '_'.join(index_columns), self.table,
+                                        ', '.join('"{}"'.format(col) for col in index_columns)))
+
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+ARROW_FORMATS = ('parquet', 'arrow')
+ARROW_BATCH_SIZE = 65536
+PARQUET_COMPRESSION = 'zstd'
+ARROW_COMPRESSION = 'zstd' # of the record batch buffers, readable by any Arrow IPC reader
+# Output formats that need a package not in the standard library
+OPTIONAL_MODULES = { 'ndjson.zst' : 'zstandard', 'parquet' : 'pyarrow', 'arrow' : 'pyarrow' }
+
+def GetMissingModule(output_format):
+    '''Returns the name of the package output_format needs if it is not installed, else None'''
+    module_name = OPTIONAL_MODULES.get(output_format)
+    if module_name is None or importlib.util.find_spec(module_name) is not None:
+        return None
+    return module_name
+
+def CheckOutputFormats(formats, known_formats):
+    '''
+        Returns an error message for the first of formats that is not in
+        known_formats or needs a package that is not installed, else None
+    '''
+    for fmt in formats:
+        if fmt not in known_formats:
+            return "Unknown output format '{}', choose from {}".format(fmt, ','.join(known_formats))
+        missing = GetMissingModule(fmt)
+        if missing:
+            return "Output format '{0}' needs the {1} package, install it with 'pip install {1}'".format(fmt, missing)
+    return None
+
+def ParseOutputFormats(formats_arg, known_formats):
+    '''
+        Returns list of formats from a comma separated string, or None
+        (after printing an error) if any is unknown or not installed
+    '''
+    formats = [fmt.strip().lower() for fmt in formats_arg.split(',') if fmt.strip()]
+    error = CheckOutputFormats(formats, known_formats)
+    if error:
+        print("Error: " + error)
+        return None
+    return formats
+
+def ImportOptional(module_name):
+    '''Imports an optional module, raises ValueError saying what to install if it is missing'''
+    try:
+        return importlib.import_module(module_name)
+    except ImportError:
+        package = module_name.split('.')[0]
+        raise ValueError("This output format needs the {0} package, install it with 'pip install {0}'".format(package))
+
+def OpenTextFile(path, mode='r'):
+    '''
+        Opens a text file for reading ('r'), writing ('w') or appending
+        ('a'), gzip or zstd compressed if path ends in .gz or .zst.
+        Appending to a compressed file adds a new gzip member or zstd
+        frame, which readers decompress as one stream.
+    '''
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf8', compresslevel=GZIP_LEVEL)
+    if path.endswith('.zst'):
+        zstandard = ImportOptional('zstandard')
+        raw_file = open(path, mode + 'b')
+        if mode == 'r':
+            stream = zstandard.ZstdDecompressor().stream_reader(raw_file)
+        else:
+            stream = zstandard.ZstdCompressor(level=ZSTD_LEVEL).stream_writer(raw_file)
+        return io.TextIOWrapper(stream, encoding='utf8')
+    return open(path, mode)
+
+class _DictionaryEncoder:
+    '''
+        Dictionary encodes one string column over a whole file. The
+        dictionary only ever grows, so every batch's dictionary begins
+        with the previous one and can be written as a delta.
+    '''
+    def __init__(self, pa):
+        self.pa = pa
+        self.positions = {}
+        self.values = []
+
+    def encode(self, column):
+        positions = self.positions
+        values = self.values
+        indices = []
+        for value in column:
+            position = positions.get(value)
+            if position is None:
+                position = positions[value] = len(values)
+                values.append(value)
+            indices.append(position)
+        pa = self.pa
+        return pa.DictionaryArray.from_arrays(pa.array(indices, pa.int32()), pa.array(values, pa.string()))
+
+class ArrowSink:
+    '''
+        Writes records to a Parquet or Arrow IPC file in batches of
+        batch_size rows. The schema comes from the same (name, sqlite
+        type) columns SqliteSink takes: INTEGER columns are int64, the
+        rest strings, dictionary encoded if listed in dictionary_columns.
+        Needs pyarrow, which is only imported when a sink is created.
+    '''
+    def __init__(self, path, columns, file_format='parquet', dictionary_columns=(), batch_size=ARROW_BATCH_SIZE):
+        if file_format not in ARROW_FORMATS:
+            raise ValueError('Unknown arrow file format ' + file_format)
+        self.pa = pa = ImportOptional('pyarrow')
+        if file_format == 'parquet':
+            self.pq = ImportOptional('pyarrow.parquet')
+        self.path = path
+        self.file_format = file_format
+        self.names = [name for name, _ in columns]
+        self.integer_columns = [col_type == 'INTEGER' for _, col_type in columns]
+        self.encoders = [_DictionaryEncoder(pa) if name in dictionary_columns else None for name in self.names]
+        fields = []
+        for name, is_integer, encoder in zip(self.names, self.integer_columns, self.encoders):
+            if is_integer:
+                fields.append(pa.field(name, pa.int64()))
+            elif encoder is not None:
+                fields.append(pa.field(name, pa.dictionary(pa.int32(), pa.string())))
+            else:
+                fields.append(pa.field(name, pa.string()))
+        self.schema = pa.schema(fields)
+        self.batch_size = batch_size
+        self.pending = [[] for _ in self.names]
+        self.writer = None
+        self.count = 0
+
+    def write(self, record):
+        for name, column in zip(self.names, self.pending):
+            column.append(record.get(name))
+        self.count += 1
+        if len(self.pending[0]) >= self.batch_size:
+            self._flush()
+
+    def write_rows(self, columns, rows):
+        '''Writes a list of tuples holding values in the order of columns'''
+        if not rows:
+            return
+        values = list(zip(*rows))
+        if list(columns) != self.names:
+            positions = [list(columns).index(name) for name in self.names]
+            values = [values[pos] for pos in positions]
+        for column, column_values in zip(self.pending, values):
+            column.extend(column_values)
+        self.count += len(rows)
+        if len(self.pending[0]) >= self.batch_size:
+            self._flush()
+
+    def _open(self):
+        pa = self.pa
+        if self.file_format == 'parquet':
+            self.writer = self.pq.ParquetWriter(self.path, self.schema, compression=PARQUET_COMPRESSION)
+        else:
+            self.writer = pa.ipc.new_file(self.path, self.schema,
+                                          options=pa.ipc.IpcWriteOptions(compression=ARROW_COMPRESSION,
+                                                                         emit_dictionary_deltas=True))
+
+    def _flush(self):
+        pa = self.pa
+        arrays = []
+        for column, is_integer, encoder in zip(self.pending, self.integer_columns, self.encoders):
+            if is_integer:
+                arrays.append(pa.array([None if value == '' else value for value in column], pa.int64()))
+            elif encoder is not None:
+                arrays.append(encoder.encode(column))
+            else:
+                arrays.append(pa.array(column, pa.string()))
+        batch = pa.RecordBatch.from_arrays(arrays, schema=self.schema)
+        if self.writer is None:
+            self._open()
+        if self.file_format == 'parquet':
+            self.writer.write_table(pa.Table.from_batches([batch]))
+        else:
+            self.writer.write_batch(batch)
+        self.pending = [[] for _ in self.names]
+
+    def finish(self):
+        if self.pending[0] or self.writer is None: # an empty file still gets the schema
+            self._flush()
+        self.close()
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+def IterArrowRows(path, columns):
+    '''Generator yielding tuples of the named columns for every row of a Parquet or Arrow IPC file'''
+    pa = ImportOptional('pyarrow')
+    if path.lower().endswith('.parquet'):
+        batches = ImportOptional('pyarrow.parquet').ParquetFile(path).iter_batches(columns=list(columns))
+    else:
+        reader = pa.ipc.open_file(path)
+        batches = (reader.get_batch(i).select(list(columns)) for i in range(reader.num_record_batches))
+    for batch in batches:
+        yield from zip(*(column.to_pylist() for column in batch.columns))
@@ -0,0 +1,185 @@
+'''
+    (c) adb_backup_parser contributors 2026
+
+    License: MIT
+
+    Purpose: Per stage timers and counters for the parsers (--stats), and
+             an optional cProfile dump (--profile). A ParseStats object is
+             passed to ParseCallLogs()/ParseSettings(), which then wrap
+             their entity iterator, decoder and output sinks with timed
+             versions. Without one nothing is wrapped, so there is no cost
+             when stats are off.
+
+             Stages (seconds and calls):
+               framing        walking the entity headers (mmap reads)
+               decode         decoding records / settings blobs
+               format         rest of the parse loop (formatting values)
+               write:<name>   writing to one output
+
+             Counters include entities, entity_bytes, decode_failures,
+             records per settings key and bytes_written:<name>.
+
+    Requires: Python 3
+'''
+
+import cProfile
+import json
+import os
+import time
+
+class ParseStats:
+    '''Collects stage timings and counters, see save() for the report'''
+    def __init__(self):
+        self.stages = {}   # name : [seconds, calls]
+        self.counters = {}
+        self.info = {}
+        self.start_time = time.perf_counter()
+
+    def add_time(self, stage, seconds, calls=1):
+        entry = self.stages.setdefault(stage, [0.0, 0])
+        entry[0] += seconds
+        entry[1] += calls
+
+    def count(self, counter, n=1):
+        self.counters[counter] = self.counters.get(counter, 0) + n
+
+    def iter_entities(self, entities, stage='framing'):
+        '''Wraps an iterable of (key, data), timing how long each entity takes to produce and counting them'''
+        perf_counter = time.perf_counter
+        iterator = iter(entities)
+        seconds = 0.0
+        count = 0
+        size = 0
+        try:
+            while True:
+                start = perf_counter()
+                try:
+                    key, data = next(iterator)
+                except StopIteration:
+                    break
+                finally:
+                    seconds += perf_counter() - start
+                count += 1
+                size += len(data)
+                yield key, data
+        finally:
+            self.add_time(stage, seconds, count)
+            self.count('entities', count)
+            self.count('entity_bytes', size)
+
+    def timed(self, function, stage):
+        '''Returns function wrapped to add its run time to stage, exceptions are counted as decode_failures'''
+        perf_counter = time.perf_counter
+        entry = self.stages.setdefault(stage, [0.0, 0])
+        def TimedFunction(*args):
+            start = perf_counter()
+            try:
+                return function(*args)
+            except Exception:
+                self.count('decode_failures')
+                raise
+            finally:
+                entry[0] += perf_counter() - start
+                entry[1] += 1
+        return TimedFunction
+
+    def timed_writer(self, function, name, path):
+        '''
+            Returns function, which writes one output file at path, wrapped
+            to time it as write:<name> and record the file's size as
+            bytes_written:<name>, like wrap_sink() for outputs not written
+            through a sink
+        '''
+        def TimedWriter(*args):
+            start = time.perf_counter()
+            try:
+                return function(*args)
+            finally:
+                self.add_time('write:' + name, time.perf_counter() - start)
+                try:
+                    self.count('bytes_written:' + name, os.path.getsize(path))
+                except OSError: # nothing written
+                    pass
+        return TimedWriter
+
+    def wrap_sink(self, sink, name, path=None):
+        '''Returns sink wrapped to time its writes as write:<name>, and record the size of path when finished'''
+        return TimedSink(self, sink, name, path)
+
+    def report(self):
+        return { 'info' : self.info,
+                 'total_seconds' : round(time.perf_counter() - self.start_time, 6),
+                 'stages' : { name : { 'seconds' : round(seconds, 6), 'calls' : calls }
+                              for name, (seconds, calls) in self.stages.items() },
+                 'counters' : self.counters }
+
+    def save(self, path):
+        '''Writes the report as json to path'''
+        try:
+            with open(path, 'w') as f:
+                json.dump(self.report(), f, indent=2)
+            print("Stats written to " + path)
+        except OSError as ex:
+            print("Error: Could not write stats to " + path + " : " + str(ex))
+
+class TimedSink:
+    '''Output sink wrapper used by ParseStats.wrap_sink()'''
+    def __init__(self, stats, sink, name, path=None):
+        self.stats = stats
+        self.sink = sink
+        self.stage = 'write:' + name
+        self.name = name
+        self.path = path
+        self.entry = stats.stages.setdefault(self.stage, [0.0, 0])
+
+    @property
+    def count(self):
+        return self.sink.count
+
+    def _timed(self, method, *args):
+        start = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            self.entry[0] += time.perf_counter() - start
+            self.entry[1] += 1
+
+    def write(self, record):
+        self._timed(self.sink.write, record)
+
+    def write_rows(self, columns, rows):
+        self._timed(self.sink.write_rows, columns, rows)
+
+    def finish(self):
+        self._timed(self.sink.finish)
+        if self.path:
+            out_file = getattr(self.sink, 'out_file', None)
+            if out_file is not None:
+                out_file.flush()
+            try:
+                self.stats.count('bytes_written:' + self.name, os.path.getsize(self.path))
+            except OSError:
+                pass
+
+def AddStatsArguments(parser):
+    '''Adds --stats and --profile options to an argparse parser'''
+    parser.add_argument('--stats', metavar='REPORT.json', help='Write per stage timings and counters to this json file')
+    parser.add_argument('--profile', metavar='PROFILE.prof', help='Run under cProfile and save the profile here (view with pstats or snakeviz)')
+
+def StartProfiler(profile_path):
+    '''Returns an enabled cProfile.Profile if profile_path is set, else None'''
+    if not profile_path:
+        return None
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+def StopProfiler(profiler, profile_path):
+    if profiler is None:
+        return
+    profiler.disable()
+    try:
+        profiler.dump_stats(profile_path)
+        print("Profile written to " + profile_path)
+    except OSError as ex:
+        print("Error: Could not write profile to " + profile_path + " : " + str(ex))
@@ -0,0 +1,162 @@
+'''
+    (c) adb_backup_parser contributors 2026
+
+    License: MIT
+
+    Purpose: Threads for the pipelined mode of the parsers (--pipeline),
+             which overlaps reading the input, decoding, and writing the
+             outputs instead of running them one after another:
+
+               reader thread  -> entity batches -> decoder (caller's thread)
+               decoder        -> record batches -> one writer thread per output
+
+             Stages are joined by bounded queues, so a slow stage holds the
+             others back instead of letting batches pile up in memory.
+
+             The reader thread walks the entity headers of the memory-mapped
+             file, but first reads the file ahead of the walk with ordinary
+             reads. Those release the GIL while waiting on the disk, so on
+             slow evidence storage the decoder keeps running, and the mapped
+             pages are already in the page cache when they are used.
+
+    Requires: Python 3
+'''
+
+import queue
+import threading
+
+PIPELINE_QUEUE_SIZE = 8   # batches in flight between two stages
+ENTITY_BATCH_SIZE = 8192
+READ_AHEAD_SIZE = 4 * 1024 * 1024
+
+_END = object()  # queue marker, no more items
+_STOP = object() # queue marker for a writer, stop without finishing the sink
+
+def _Put(item_queue, item, stop):
+    '''Puts item on a bounded queue, giving up (returns False) once stop is set'''
+    while not stop.is_set():
+        try:
+            item_queue.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+def _ReadEntities(backup, entity_queue, stop, batch_size):
+    '''Reader thread of IterPipelinedEntities()'''
+    try:
+        with open(backup.path, 'rb') as f:
+            buffer = bytearray(READ_AHEAD_SIZE)
+            read_end = 0
+            batch = []
+            for key, data_offset, size_data in backup.entity_locations():
+                while read_end < data_offset + size_data + READ_AHEAD_SIZE:
+                    read = f.readinto(buffer)
+                    if not read:
+                        break
+                    read_end += read
+                batch.append((key + '\x00', backup.read_at(data_offset, size_data)))
+                if len(batch) >= batch_size:
+                    if not _Put(entity_queue, batch, stop):
+                        return
+                    batch = []
+            if batch and not _Put(entity_queue, batch, stop):
+                return
+        _Put(entity_queue, _END, stop)
+    except Exception as ex:
+        _Put(entity_queue, ex, stop)
+
+def IterPipelinedEntities(backup, batch_size=ENTITY_BATCH_SIZE, queue_size=PIPELINE_QUEUE_SIZE):
+    '''
+        Generator yielding (key, memoryview) for every entity of the
+        BackupDataFile, like backup.entities(), but read and framed on a
+        reader thread ahead of the caller. Errors on the reader thread are
+        raised here. The thread is stopped when the generator is closed.
+    '''
+    entity_queue = queue.Queue(queue_size)
+    stop = threading.Event()
+    reader = threading.Thread(target=_ReadEntities, args=(backup, entity_queue, stop, batch_size),
+                              name='entity reader', daemon=True)
+    reader.start()
+    try:
+        while True:
+            batch = entity_queue.get()
+            if batch is _END:
+                return
+            if isinstance(batch, Exception):
+                raise batch
+            yield from batch
+    finally:
+        stop.set()
+        reader.join()
+
+class ThreadedSink:
+    '''
+        Output sink that hands write() and write_rows() calls to a writer
+        thread over a bounded queue, and runs them there against the
+        wrapped sink. finish() waits for the writer to finish the sink.
+        An error on the writer thread is raised by the next call made to
+        this sink. Call stop() to end the thread without finishing the
+        sink, e.g. when parsing failed; it does nothing after finish().
+    '''
+    def __init__(self, sink, queue_size=PIPELINE_QUEUE_SIZE):
+        self.sink = sink
+        self.queue = queue.Queue(queue_size)
+        self.error = None
+        self.thread = threading.Thread(target=self._run, name='writer', daemon=True)
+        self.thread.start()
+
+    @property
+    def count(self):
+        return self.sink.count
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is _STOP:
+                return
+            if item is _END:
+                break
+            if self.error is None: # after an error, just drain the queue so the decoder never blocks
+                method, args = item
+                try:
+                    method(*args)
+                except Exception as ex:
+                    self.error = ex
+        if self.error is None:
+            try:
+                self.sink.finish()
+            except Exception as ex:
+                self.error = ex
+
+    def _put(self, item):
+        if self.error is not None:
+            raise self.error
+        self.queue.put(item)
+
+    def write(self, record):
+        self._put((self.sink.write, (record,)))
+
+    def write_rows(self, columns, rows):
+        self._put((self.sink.write_rows, (columns, rows)))
+
+    def finish(self):
+        self._put(_END)
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+
+    def stop(self):
+        if self.thread.is_alive():
+            self.queue.put(_STOP)
+            self.thread.join()
+
+def ThreadSinks(sinks, queue_size=PIPELINE_QUEUE_SIZE):
+    '''Returns list of every sink wrapped in a ThreadedSink'''
+    return [ThreadedSink(sink, queue_size) for sink in sinks]
+
+def StopSinks(sinks):
+    '''Stops the writer threads of any ThreadedSink in sinks that is still running'''
+    for sink in sinks:
+        if isinstance(sink, ThreadedSink):
+            sink.stop()
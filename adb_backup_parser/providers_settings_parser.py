@@ -15,74 +15,121 @@
     Send bugs/comments to yogesh@swiftforensics.com
 '''
 
-from construct import *
+from backup_reader import BackupDataFile, PrintSkippedRegions, Align4
+from entity_index import GetIndex, IterIndexedEntities
+from result_cache import AddCacheArguments, GetResultCache
+from parse_stats import ParseStats, AddStatsArguments, StartProfiler, StopProfiler
+from pipeline import IterPipelinedEntities
+from output_sinks import SqliteSink, NdjsonSink, ArrowSink, OpenSqliteDatabase, OpenTextFile, ParseOutputFormats, SQLITE_DB_NAME, \
+                         ARROW_FORMATS
+import argparse
 import csv
+import io
 import json
 import os
-import sys
+import sqlite3
+import struct
 import time
-import xml.etree.ElementTree as ET 
-
-NameValue = Struct (
-    "name_len" / Int32ub,
-    "name" / String(this.name_len, 'utf8'),
-    "value_len" / Int32ub,
-    "value" / If(this.value_len != 0xFFFFFFFF, String(this.value_len, 'utf8'))
-)
-
-NameValue2 = Struct (
-    "name_len" / Int16ub,
-    "name" / String(this.name_len, 'utf8'),
-    "value_len" / Int16ub,
-    "value" / If(this.value_len != 0xFFFF, String(this.value_len, 'utf8'))
-)
-
-SoftapConfig = Struct (
-    "version" / Int32ub,
-    "is_ssid_present" / Int8ub,
-    "ssid" / If(this.is_ssid_present == 1, PascalString(Int16ub, 'utf8')),
-    "ap_band" / Int32ub,
-    "ap_channel" / Int32ub,
-    "is_psk_present" / Int8ub,
-    "psk" / If(this.is_psk_present == 1, PascalString(Int16ub, 'utf8')),
-    "allowed_key_mgmt" / Int32ub,
-    "is_hidden_ssid" / If(this.version >= 3, Int8ub)
-)
+
+_softap_config_struct = None
+
+def GetSoftapConfigStruct():
+    '''Returns the construct definition of softap_config, construct is only imported on first use as it is slow to import'''
+    global _softap_config_struct
+    if _softap_config_struct is None:
+        from construct import Struct, Int8ub, Int16ub, Int32ub, If, PascalString, this
+        _softap_config_struct = Struct (
+            "version" / Int32ub,
+            "is_ssid_present" / Int8ub,
+            "ssid" / If(this.is_ssid_present == 1, PascalString(Int16ub, 'utf8')),
+            "ap_band" / Int32ub,
+            "ap_channel" / Int32ub,
+            "is_psk_present" / Int8ub,
+            "psk" / If(this.is_psk_present == 1, PascalString(Int16ub, 'utf8')),
+            "allowed_key_mgmt" / Int32ub,
+            "is_hidden_ssid" / If(this.version >= 3, Int8ub)
+        )
+    return _softap_config_struct
+
+def __getattr__(name):
+    '''Keeps providers_settings_parser.SoftapConfig working, the struct is built when it is first used'''
+    if name == 'SoftapConfig':
+        return GetSoftapConfigStruct()
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
 
 #TODO: Network Policy, and old wifi config?
 
-DataHeader = Struct (
-    Const(b"Data"),
-    "size_key" / Int32ul,
-    "size_data" / Int32ul
-)
+_uint16 = struct.Struct('>H')
+_uint32 = struct.Struct('>I')
+
+def IterNameValues(data, len_struct=_uint32, null_len=0xFFFFFFFF, progress=None):
+    '''
+        Generator yielding (name, value) from a buffer of length prefixed
+        name/value pairs. Strings are decoded straight from a memoryview at
+        running offsets, so the buffer is never copied. A value length of
+        null_len denotes a null value (no value bytes follow), which is
+        returned as ''. A truncated trailing pair ends iteration.
 
-def ReadNameValuePairs(data, logs):
+        args:
+            data: bytes or memoryview
+            len_struct: struct.Struct for the length fields (uint32 or uint16 big endian)
+            null_len: value length that marks a null value
+            progress: optional dict, gets 'end', the offset just past the
+                      last complete pair
+    '''
+    view = memoryview(data)
+    size = len(view)
+    len_size = len_struct.size
+    unpack_from = len_struct.unpack_from
     pos = 0
-    size = len(data)
-    items = {}
-    if size < 4: return
-    while pos < (size - 4):
-        nv = NameValue.parse(data[pos:])
-        items[nv.name] = (nv.value if nv.value_len != 0xFFFFFFFF else '')
-        pos += nv.name_len + nv.value_len + 8
+    if progress is not None:
+        progress['end'] = 0
+    while pos < size:
+        pair_start = pos
+        if pos + 2 * len_size > size:
+            print('Error, truncated name/value pair at offset {}, {} trailing bytes ignored'.format(pair_start, size - pair_start))
+            return
+        name_len = unpack_from(view, pos)[0]
+        name_start = pos + len_size
+        name_end = name_start + name_len
+        if name_end + len_size > size:
+            print('Error, truncated name/value pair at offset {}, {} trailing bytes ignored'.format(pair_start, size - pair_start))
+            return
+        value_len = unpack_from(view, name_end)[0]
+        pos = name_end + len_size
+        if value_len == null_len:
+            value = ''
+        else:
+            value_end = pos + value_len
+            if value_end > size:
+                print('Error, truncated name/value pair at offset {}, {} trailing bytes ignored'.format(pair_start, size - pair_start))
+                return
+            value = str(view[pos:value_end], 'utf8')
+            pos = value_end
+        yield str(view[name_start:name_end], 'utf8'), value
+        if progress is not None:
+            progress['end'] = pos
+
+def ReadNameValuePairs(data, logs, progress=None):
+    '''Reads name/value pairs having uint32 lengths (system, secure, global)'''
+    if len(data) < 4: return
+    items = dict(IterNameValues(data, _uint32, 0xFFFFFFFF, progress))
     if items:
         logs.append(items)
 
-def ReadNameValue2Pairs(data, logs):
-    pos = 0
-    size = len(data)
-    items = {}
-    if size < 2: return
-    while pos < (size - 4):
-        nv = NameValue2.parse(data[pos:])
-        items[nv.name] = (nv.value if nv.value_len != 0xFFFF else '')
-        pos += nv.name_len + nv.value_len + 4
+def ReadNameValue2Pairs(data, logs, progress=None):
+    '''Reads name/value pairs having uint16 lengths (lock_settings)'''
+    if len(data) < 2: return
+    items = dict(IterNameValues(data, _uint16, 0xFFFF, progress))
     if items:
         logs.append(items)
 
-def ReadSoftapConfig(data, logs):
-    sc = SoftapConfig.parse(data)
+def ReadSoftapConfig(data, logs, progress=None):
+    '''Reads softap_config, progress (optional dict) gets 'end', the offset just past it'''
+    stream = io.BytesIO(data)
+    sc = GetSoftapConfigStruct().parse_stream(stream)
+    if progress is not None:
+        progress['end'] = stream.tell()
     sc_filtered = {
                     "version" : sc.version,
                     "ssid" : sc.ssid if sc.is_ssid_present else "",
@@ -94,46 +141,140 @@ def ReadSoftapConfig(data, logs):
         sc_filtered["is_hidden_ssid"] = sc.is_hidden_ssid
     logs.append(sc_filtered)
 
+def ReadWifiNetwork(network):
+    '''Returns dict of the settings of one <Network> element of the wifi settings xml'''
+    wifi = {}
+    for config in network:
+        if config.tag == 'WifiConfiguration':
+            for string in config.findall('string'):
+                name = string.attrib.get('name', None)
+                if name == 'ConfigKey':
+                    parts = string.text[1:].split('"')
+                    if len(parts) != 2:
+                        print('Problem parsing configKey = {}'.format(string.text))
+                        wifi['config_key'] = string.text
+                        continue
+                    ssid_part = parts[0]
+                    security = parts[1]
+                    wifi['config_key_ssid'] = ssid_part
+                    wifi['config_key_security'] = security
+                elif name in ('PreSharedKey', 'SSID'):
+                    val = string.text[1:-1]
+                    wifi[name] = val
+                else:
+                    wifi[name] = string.text
+            for boolean in config.findall('boolean'):
+                name = boolean.attrib.get('name', 'NONAME')
+                value = boolean.attrib.get('value', '')
+                wifi[name] = value
+        elif config.tag == 'IpConfiguration':
+            for string in config.findall('string'):
+                name = string.attrib.get('name', None)
+                if name:
+                    wifi[name] = string.text
+    return wifi
+
+WIFI_XML_READ_SIZE = 64 * 1024
+
+def IterWifiNetworks(data):
+    '''
+        Generator yielding the settings dict (see ReadWifiNetwork) of every
+        network in the wifi settings xml as soon as its </Network> is read.
+        The xml bytes are fed to the parser in pieces and every network is
+        dropped from the tree once read, so memory use does not grow with
+        the number of networks.
+    '''
+    import xml.etree.ElementTree as ET # only needed for wifi settings, not imported at startup
+    parser = ET.XMLPullParser(events=('start', 'end'))
+    path = []     # tags from the root down to the current element
+    elements = [] # the elements on path
+    def ReadEvents():
+        for event, elem in parser.read_events():
+            if event == 'start':
+                path.append(elem.tag)
+                elements.append(elem)
+                continue
+            path.pop()
+            elements.pop()
+            if len(path) == 2 and path[1] == 'NetworkList' and elem.tag == 'Network':
+                yield ReadWifiNetwork(elem)
+                elements[-1].remove(elem)
+            elif len(path) == 1: # done with another top level section
+                elements[-1].remove(elem)
+    for pos in range(0, len(data), WIFI_XML_READ_SIZE):
+        parser.feed(bytes(data[pos:pos + WIFI_XML_READ_SIZE]))
+        yield from ReadEvents()
+    parser.close()
+    yield from ReadEvents()
+
 def ReadWifiNewConfig(data, logs):
     '''
         Reads the wifi settings xml data
         args:
-            data: 
-            logs: 
+            data: bytes or memoryview holding the xml
+            logs: list to which a dict is added for every network
     '''
-    tree = ET.fromstring(data.decode('utf8'))
-    for network in tree.findall('./NetworkList/Network'): 
-        wifi = {}
-        for config in network:
-            if config.tag == 'WifiConfiguration':
-                for string in config.findall('string'):
-                    name = string.attrib.get('name', None)
-                    if name == 'ConfigKey':
-                        parts = string.text[1:].split('"')
-                        if len(parts) != 2:
-                            print('Problem parsing configKey = {}'.format(string.text))
-                            wifi['config_key'] = string.text
-                            continue
-                        ssid_part = parts[0]
-                        security = parts[1]
-                        wifi['config_key_ssid'] = ssid_part
-                        wifi['config_key_security'] = security
-                    elif name in ('PreSharedKey', 'SSID'):
-                        val = string.text[1:-1]
-                        wifi[name] = val
-                    else:
-                        wifi[name] = string.text
-                for boolean in config.findall('boolean'):
-                    name = boolean.attrib.get('name', 'NONAME')
-                    value = boolean.attrib.get('value', '')
-                    wifi[name] = value
-            elif config.tag == 'IpConfiguration':
-                for string in config.findall('string'):
-                    name = string.attrib.get('name', None)
-                    if name:
-                        wifi[name] = string.text
-        logs.append(wifi)
-        
+    logs.extend(IterWifiNetworks(data))
+
+SETTINGS_READERS = {
+    'system' : ReadNameValuePairs,
+    'secure' : ReadNameValuePairs,
+    'global' : ReadNameValuePairs,
+    'lock_settings' : ReadNameValue2Pairs,
+    'softap_config' : ReadSoftapConfig,
+    'wifi_new_config' : ReadWifiNewConfig
+}
+
+def DecodeCarvedSettingsEntity(key, data):
+    '''
+        Decodes a carved entity's data as the settings its key names.
+        Returns the locale string, or the list of dicts that its reader
+        (SETTINGS_READERS) adds, or None if the key is not one that can be
+        checked or the data does not decode completely. Name/value pairs
+        and softap_config must end where the entity's data does (give or
+        take the padding), the wifi xml must parse to its end.
+    '''
+    key = key.rstrip('\x00')
+    try:
+        if key == 'locale':
+            locale = str(data, 'utf8')
+            return locale if locale.isprintable() else None
+        read = SETTINGS_READERS.get(key)
+        if read is None: # network_policies is not decoded, so it cannot be checked either
+            return None
+        items = []
+        if key == 'wifi_new_config':
+            read(data, items)
+            return items
+        progress = {}
+        read(data, items, progress)
+        if Align4(progress.get('end', 0)) != Align4(len(data)):
+            return None
+        return items
+    except Exception: # bad utf8, truncated struct, construct or xml error, any of these means a bad candidate
+        return None
+
+class CarvedSettingsEntities:
+    '''
+        Vets entities for carve_entities() with validate(), keeping what it
+        decoded, which decoded() then returns for that entity instead of
+        decoding it a second time
+    '''
+    def __init__(self):
+        self.data = None
+        self.items = None
+
+    def validate(self, key, data):
+        self.items = DecodeCarvedSettingsEntity(key, data)
+        self.data = data if self.items is not None else None
+        return self.items is not None
+
+    def decoded(self, data):
+        '''Returns what validate() decoded from data, or None if data was not the last entity it accepted'''
+        if data is self.data:
+            return self.items
+        return None
+
 
 def WriteCsv(path, list_of_dicts):
     '''
@@ -176,30 +317,296 @@ def OpenFileForWriting(path, mode='w'):
 
 def WriteOutput(data_type, data, output_folder):
     if data:
-        out_file_path_json = os.path.join(output_folder, data_type.replace(' ', '_') + ".json")
+        out_file_path_json = os.path.join(output_folder, GetSettingsFileName(data_type, 'json'))
         WriteJson(out_file_path_json, data, data_type)
         print("Wrote {} items to ".format(len(data)) + out_file_path_json)
     else:
         print("No {} found".format(data_type))
 
+OUTPUT_FORMATS = ('json', 'ndjson', 'ndjson.gz', 'ndjson.zst', 'sqlite', 'parquet', 'arrow')
+NDJSON_FORMATS = ('ndjson', 'ndjson.gz', 'ndjson.zst')
+DEFAULT_FORMATS = ('json',)
+# Bump when the parsed settings change, so older cached results are not used
+RESULT_VERSION = 2
+# Writer threads for --pipeline, one per output file written at the same time
+SETTINGS_WRITER_THREADS = 4
+
+SETTINGS_SQLITE_COLUMNS = [('category', 'TEXT'), ('item', 'INTEGER'), ('name', 'TEXT'), ('value', 'TEXT')]
+SETTINGS_SQLITE_INDEXES = ('name', ('category', 'name'), 'source')
+# Name/value settings tables written to parquet and arrow files, with a fixed schema
+SETTINGS_TABLE_TYPES = ('system settings', 'secure settings', 'global settings')
+SETTINGS_TABLE_COLUMNS = [('item', 'INTEGER'), ('name', 'TEXT'), ('value', 'TEXT')]
+SETTINGS_DICTIONARY_COLUMNS = ('name', 'value')
+
+def WriteNdjson(data_type, data, output_folder, output_format):
+    '''
+        Writes data (list of dicts) as one json object per line, one
+        {item, name, value} object per setting like the rows of
+        WriteSettingsTable(), gzip or zstd compressed for ndjson.gz and ndjson.zst
+    '''
+    if not data:
+        return
+    path = os.path.join(output_folder, GetSettingsFileName(data_type, output_format))
+    try:
+        with OpenTextFile(path, 'w') as out_file:
+            sink = NdjsonSink(out_file)
+            columns = [name for name, _ in SETTINGS_TABLE_COLUMNS]
+            for item, items in enumerate(data):
+                sink.write_rows(columns, [(item, name, value) for name, value in items.items()])
+            sink.finish()
+        print("Wrote {} settings to ".format(sink.count) + path)
+    except (OSError, ValueError) as ex:
+        print("Error: Could not write '{}', error was: ".format(path) + str(ex))
+
+def WriteSettingsTable(data_type, data, output_folder, output_format):
+    '''
+        Writes system, secure or global settings to a parquet or arrow
+        file, as one (item, name, value) row per setting
+    '''
+    if not data:
+        return
+    path = os.path.join(output_folder, GetSettingsFileName(data_type, output_format))
+    sink = None
+    try:
+        sink = ArrowSink(path, SETTINGS_TABLE_COLUMNS, output_format, SETTINGS_DICTIONARY_COLUMNS)
+        columns = [name for name, _ in SETTINGS_TABLE_COLUMNS]
+        for item, items in enumerate(data):
+            sink.write_rows(columns, [(item, name, value) for name, value in items.items()])
+        sink.finish()
+        print("Wrote {} settings to ".format(sink.count) + path)
+    except (OSError, ValueError) as ex:
+        print("Error: Could not write '{}', error was: ".format(path) + str(ex))
+    finally:
+        if sink:
+            sink.close()
+
+def WriteSqlite(settings, locale, output_folder, source=''):
+    '''
+        Writes all settings to the 'settings' table of SQLITE_DB_NAME in
+        output_folder, as one (category, item, name, value) row per setting.
+        item is the index of the dict within its category (e.g. the wifi network).
+    '''
+    db_path = os.path.join(output_folder, SQLITE_DB_NAME)
+    connection = None
+    try:
+        connection = OpenSqliteDatabase(db_path, 'settings', SETTINGS_SQLITE_COLUMNS)
+        sink = SqliteSink(connection, 'settings', SETTINGS_SQLITE_COLUMNS, SETTINGS_SQLITE_INDEXES, source)
+        columns = [name for name, _ in SETTINGS_SQLITE_COLUMNS]
+        if locale:
+            sink.write_rows(columns, [('locale', 0, 'locale', locale)])
+        for data_type, data in settings.items():
+            category = data_type.replace(' settings', '')
+            for item, items in enumerate(data):
+                sink.write_rows(columns, [(category, item, name, value) for name, value in items.items()])
+        sink.finish()
+        print("Wrote {} settings to ".format(sink.count) + db_path)
+    except sqlite3.Error as ex:
+        print("Error: Could not write settings to '{}', error was: ".format(db_path) + str(ex))
+    finally:
+        if connection:
+            connection.close()
+
+def ExportWifiXml(data, output_path):
+    '''Writes the wifi_new_config xml data as is to output_path'''
+    xml_path = os.path.join(output_path, 'wifi_new_config.xml')
+    print('Exporting embedded XML file as is to {}'.format(xml_path))
+    xml_file = OpenFileForWriting(xml_path, 'wb')
+    if xml_file:
+        xml_file.write(data)
+        xml_file.close()
+
+def GetSettingsFileName(data_type, extension):
+    return data_type.replace(' ', '_') + '.' + extension
+
+def WriteSettings(settings, locale, output_path, formats=DEFAULT_FORMATS, source='', writers=None, stats=None):
+    '''
+        Writes parsed settings (see ParseSettings) out to output_path. If
+        writers (a ThreadPoolExecutor) is given, the output files are
+        written at the same time on its threads. stats (ParseStats) gets
+        write:<file> timings and bytes_written:<file> sizes.
+    '''
+    if locale:
+        print('Locale is ' + locale)
+    jobs = [] # (output file name, function, args..)
+    if 'json' in formats:
+        jobs.extend((GetSettingsFileName(data_type, 'json'), WriteOutput, data_type, data, output_path)
+                    for data_type, data in settings.items())
+    for fmt in formats:
+        if fmt in NDJSON_FORMATS:
+            jobs.extend((GetSettingsFileName(data_type, fmt), WriteNdjson, data_type, data, output_path, fmt)
+                        for data_type, data in settings.items())
+        elif fmt in ARROW_FORMATS:
+            jobs.extend((GetSettingsFileName(data_type, fmt), WriteSettingsTable, data_type, settings[data_type], output_path, fmt)
+                        for data_type in SETTINGS_TABLE_TYPES if data_type in settings)
+    if 'sqlite' in formats:
+        jobs.append((SQLITE_DB_NAME, WriteSqlite, settings, locale, output_path, source))
+    if stats is not None:
+        jobs = [(name, stats.timed_writer(function, name, os.path.join(output_path, name)), *args)
+                for name, function, *args in jobs]
+    if writers is None:
+        for _, function, *args in jobs:
+            function(*args)
+    else:
+        for future in [writers.submit(*job[1:]) for job in jobs]:
+            future.result()
+
+def WriteCachedSettings(record, output_path, formats=DEFAULT_FORMATS, source=''):
+    '''Writes out settings from a record saved by ParseSettings() to a result cache'''
+    settings, locale, wifi_xml = record
+    if wifi_xml is not None:
+        ExportWifiXml(wifi_xml, output_path)
+    WriteSettings(settings, locale, output_path, formats, source)
+
+def ParseSettings(entities, output_path, formats=DEFAULT_FORMATS, source='', keys=None, extra_sinks=(), stats=None,
+                  pipeline=False, carved=None):
+    '''
+        Parses all settings entities and writes them out to output_path
+
+        args:
+            entities: iterable of (key, data), e.g. BackupDataFile.entities()
+            output_path: existing folder to write output to
+            formats: list of output formats from OUTPUT_FORMATS
+            source: name of the input, stored with every row in sqlite
+            keys: optional set of settings keys to parse, others are skipped
+                  without looking at their data
+            extra_sinks: sinks that get one record [settings, locale, wifi
+                         xml bytes], e.g. a result cache entry
+            stats: optional ParseStats, gets decode:<key> timings and
+                   records:<key> counts of the settings (name/value pairs)
+                   per settings key, and the write timings and sizes of
+                   every output file
+            pipeline: write the raw wifi xml as soon as it is read, and the
+                      outputs at the same time, on writer threads
+            carved: the CarvedSettingsEntities that vetted entities (for
+                    --recover), their settings are not decoded again
+        returns:
+            dict of { data_type : [{}, ..] } for every settings type
+    '''
+    system_settings = []
+    secure_settings = []
+    global_settings = []
+    locale = ''
+    lock_settings = []
+    softap_config = []
+    network_policies = []
+    wifi_settings = []
+    wifi_xml = None
+    writers = None
+    wifi_export = None
+    settings_lists = {
+        'system' : system_settings,
+        'secure' : secure_settings,
+        'global' : global_settings,
+        'lock_settings' : lock_settings,
+        'softap_config' : softap_config,
+        'wifi_new_config' : wifi_settings
+    }
+    if pipeline:
+        import concurrent.futures # only needed here, not imported at startup
+        writers = concurrent.futures.ThreadPoolExecutor(max_workers=SETTINGS_WRITER_THREADS)
+    try:
+        if stats is not None:
+            entities = stats.iter_entities(entities)
+        for key, data in entities:
+            key = key.rstrip('\x00')
+            if keys is not None and key not in keys:
+                continue
+            #print ("Reading Key =", key)
+            if stats is not None:
+                start_time = time.perf_counter()
+            try:
+                decoded = carved.decoded(data) if carved is not None else None
+                if key == 'locale': locale = str(data, 'utf8') if decoded is None else decoded
+                elif key == 'network_policies': pass
+                elif key in settings_lists:
+                    if key == 'wifi_new_config':
+                        wifi_xml = bytes(data)
+                        if writers is None:
+                            ExportWifiXml(data, output_path)
+                        else:
+                            wifi_export = writers.submit(ExportWifiXml, wifi_xml, output_path)
+                    if decoded is None:
+                        SETTINGS_READERS[key](data, settings_lists[key])
+                    else:
+                        settings_lists[key].extend(decoded)
+            except Exception:
+                if stats is not None:
+                    stats.count('decode_failures')
+                raise
+            finally:
+                if stats is not None:
+                    stats.add_time('decode:' + key, time.perf_counter() - start_time)
+        # Done processing, now write it out
+
+        settings = {
+            'system settings' : system_settings,
+            'secure settings' : secure_settings,
+            'global settings' : global_settings,
+            'lock settings' : lock_settings,
+            'softap settings' : softap_config,
+            'wifi settings' : wifi_settings
+        }
+        if stats is not None:
+            for name, items in settings.items():
+                stats.count('records:' + name.split(' ')[0], sum(len(item) for item in items))
+            start_time = time.perf_counter()
+        WriteSettings(settings, locale, output_path, formats, source, writers, stats)
+        if wifi_export is not None:
+            wifi_export.result()
+    finally:
+        if writers is not None: # also when decoding or writing failed, so its threads do not linger
+            writers.shutdown()
+    if stats is not None:
+        stats.add_time('write', time.perf_counter() - start_time)
+    for sink in extra_sinks:
+        sink.write([settings, locale, wifi_xml])
+        sink.finish()
+    return settings
+
+def ReportInputProblems(skipped, missing, stats=None):
+    '''Prints the regions --recover skipped and the --keys that were not found, either list may be None'''
+    if skipped is not None:
+        PrintSkippedRegions(skipped)
+        if stats:
+            stats.count('skipped_bytes', sum(end - start for start, end in skipped))
+    if missing is not None:
+        for key in missing:
+            print("Error: Key '{}' not found".format(key))
+
 def main():
     usage = "Parser for 'com.android.providers.settings.data' "\
             "which includes wifi settings with passwords"\
             "\n--------------------------------------------"\
             "\nUsage: providers_settings_parser.py input_file output_folder"\
             "\nExample: providers_settings_parser.py  com.android.providers.settings.data  c:\output_folder\\"\
-            "\n\nOutput is in CSV and JSON formats"\
+            "\n\nOutput is in JSON format (NDJSON, SQLite, Parquet and Arrow optional)"\
             "\nNote: All times in output are UTC"\
             "\nSend bugs/comments to yogesh@swiftforensics.com"
 
-    argc = len(sys.argv)
-    if argc < 3:
-        print("Error: Insufficient arguments..")
-        print(usage)
-        return
+    parser = argparse.ArgumentParser(description=usage, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('input_file', help="Path to 'com.android.providers.settings.data'")
+    parser.add_argument('output_folder', help='Folder to write output files to')
+    parser.add_argument('--formats', default='json',
+                        help='Comma separated list of output formats from {} (default: json)'.format(','.join(OUTPUT_FORMATS)))
+    parser.add_argument('--recover', action='store_true',
+                        help='Recovery mode for damaged files or raw images, scan for every readable entity instead of stopping at the first bad one')
+    parser.add_argument('--keys',
+                        help='Comma separated settings keys to parse (eg: secure,wifi_new_config), these are read directly using the offset index (input_file.idx)')
+    parser.add_argument('--pipeline', action='store_true',
+                        help='Read, decode and write on separate threads, writing the output files at the same time')
+    AddCacheArguments(parser)
+    AddStatsArguments(parser)
+    args = parser.parse_args()
 
-    input_path = sys.argv[1]
-    output_path = sys.argv[2]
+    input_path = args.input_file
+    output_path = args.output_folder
+    formats = ParseOutputFormats(args.formats, OUTPUT_FORMATS)
+    if formats is None:
+        return
+    keys = [key.strip() for key in args.keys.split(',') if key.strip()] if args.keys else None
+    if keys is not None and args.recover:
+        print("Error: --keys cannot be used with --recover")
+        return
 
     try:
         if os.path.exists(input_path):
@@ -215,62 +622,61 @@ def main():
                     print("Error: Cannot create output file : " + output_path + "\nError Details: " + str(ex))
                     return
             # Actual processing starts here
+            stats = ParseStats() if args.stats else None
+            if stats:
+                stats.info.update({ 'parser' : 'providers_settings_parser', 'input' : input_path,
+                                    'input_bytes' : os.path.getsize(input_path) })
+            profiler = StartProfiler(args.profile)
             try:
-                system_settings = []
-                secure_settings = []
-                global_settings = []
-                locale = ''
-                lock_settings = []
-                softap_config = []
-                network_policies = []
-                wifi_settings = []
                 print("Trying to read file " + input_path)
-                with open (input_path, "rb") as f:
-                    file_data = f.read(12)
-                    while file_data:
-                        if len(file_data) != 12:
-                            print('Error, read less than 12 bytes from file, expected full Data header!')
-                            break
-                        data_meta = DataHeader.parse(file_data)
-                        key = f.read(data_meta.size_key + 1).decode('utf8').rstrip('\x00')
-                        if f.tell() % 4: f.seek(4 - (f.tell() % 4), 1) # Align to 4 byte boundary
-                        #print ("Reading Key =", key)
-                        if data_meta.size_data != 0xFFFFFFFF:
-                            data = f.read(data_meta.size_data)
-                            #print (data)
-                            if key == 'system': ReadNameValuePairs(data, system_settings)
-                            elif key == 'secure': ReadNameValuePairs(data, secure_settings)
-                            elif key == 'global': ReadNameValuePairs(data, global_settings)
-                            elif key == 'locale': locale = data.decode('utf8')
-                            elif key == 'lock_settings': ReadNameValue2Pairs(data, lock_settings)
-                            elif key == 'softap_config': ReadSoftapConfig(data, softap_config)
-                            elif key == 'network_policies': pass
-                            elif key == 'wifi_new_config': 
-                                ReadWifiNewConfig(data, wifi_settings)
-                                xml_path = os.path.join(output_path, 'wifi_new_config.xml')
-                                print('Exporting embedded XML file as is to {}'.format(xml_path))
-                                xml_file = OpenFileForWriting(xml_path, 'wb')
-                                if xml_file:
-                                    xml_file.write(data)
-                                    xml_file.close()
-                        
-                        if f.tell() % 4: f.seek(4 - (f.tell() % 4), 1) # Align to 4 byte boundary
-                        # Read next header
-                        file_data = f.read(12)
-                    # Done processing, now write it out
-
-                    if locale:
-                        print('Locale is ' + locale)
-                    WriteOutput('system settings', system_settings, output_path)
-                    WriteOutput('secure settings', secure_settings, output_path)
-                    WriteOutput('global settings', global_settings, output_path)
-                    WriteOutput('lock settings', lock_settings, output_path)
-                    WriteOutput('softap settings', softap_config, output_path)
-                    WriteOutput('wifi settings', wifi_settings, output_path)
+                cache = GetResultCache(args)
+                cache_writer = None
+                if cache:
+                    cache_key = cache.make_key(input_path, 'providers_settings_parser', RESULT_VERSION,
+                                               { 'recover' : args.recover, 'keys' : args.keys })
+                    cached_records = cache.get(cache_key, input_path)
+                    if cached_records is not None:
+                        for record in cached_records():
+                            WriteCachedSettings(record, output_path, formats, input_path)
+                        ReportInputProblems(cached_records.info.get('skipped'), cached_records.info.get('missing'), stats)
+                        return
+                    cache_writer = cache.writer(cache_key)
+                skipped = None
+                missing = None
+                carved = None
+                with BackupDataFile(input_path) as backup:
+                    if args.recover:
+                        skipped = []
+                        carved = CarvedSettingsEntities()
+                        entities = backup.carve_entities(carved.validate, skipped)
+                    elif keys is not None:
+                        missing = []
+                        entities = IterIndexedEntities(backup, GetIndex(input_path), keys, missing)
+                    elif args.pipeline:
+                        entities = IterPipelinedEntities(backup)
+                    else:
+                        entities = backup.entities()
+                    if cache_writer: # saved with the settings, to be reported again on a cache hit
+                        if skipped is not None:
+                            cache_writer.info['skipped'] = skipped
+                        if missing is not None:
+                            cache_writer.info['missing'] = missing
+                    try:
+                        ParseSettings(entities, output_path, formats, input_path,
+                                      extra_sinks=[cache_writer] if cache_writer else [], stats=stats,
+                                      pipeline=args.pipeline, carved=carved)
+                    finally:
+                        if cache_writer:
+                            cache_writer.abort()
+                    ReportInputProblems(skipped, missing, stats)
 
             except OSError as ex:
                 print("Error: Cannot read input file : " + input_path + "\nError Details: " + str(ex))
                 return
+            finally:
+                StopProfiler(profiler, args.profile)
+                if stats:
+                    stats.save(args.stats)
         else:
             print("Error: Failed to find file at specified path. Path was : " + input_path)
     except OSError as ex:
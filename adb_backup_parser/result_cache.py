@@ -0,0 +1,265 @@
+'''
+    (c) adb_backup_parser contributors 2026
+
+    License: MIT
+
+    Purpose: Opt-in cache of decoded parser results, so re-running a parser
+             over an unchanged input skips decoding. Entries are keyed by
+             the SHA-256 of the input's contents, the parser's name and
+             result version, and the options that change what is decoded
+             (output formats are not part of the key, every format is
+             written from the same cached records).
+
+             Records are stored in zlib compressed chunks of marshalled
+             tuples, each chunk prefixed by its compressed size and record
+             count, and ended by an empty chunk. That is followed by the
+             entry's info, a marshalled dict of what the parser reported
+             about the input besides its records (e.g. skipped regions),
+             so it can be reported again on a hit. An entry is checked end
+             to end (zlib checksums, record count) before it is used, a
+             damaged one is deleted and the input parsed afresh. The
+             Python version is part of the key, as marshal's format may
+             change between versions.
+
+             The cache folder is kept under a size limit by deleting the
+             least recently used entries.
+
+    Requires: Python 3
+'''
+
+import argparse
+import hashlib
+import json
+import marshal
+import os
+import struct
+import sys
+import zlib
+
+CACHE_MAGIC = b'ABRC'
+CACHE_FORMAT_VERSION = 2
+CACHE_SUFFIX = '.cache'
+DEFAULT_CACHE_SIZE = 1024 * 1024 * 1024
+HASH_CHUNK_SIZE = 1024 * 1024
+RECORDS_PER_CHUNK = 16384
+
+_chunk_header = struct.Struct('<II') # compressed size, records
+_info_header = struct.Struct('<I')    # size of the marshalled info
+
+def HashFile(path):
+    '''Returns hex SHA-256 of the file's contents'''
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+class CacheEntryWriter:
+    '''
+        Output sink that writes records to a new cache entry. The entry
+        only becomes visible when finish() is called; abort() (or never
+        calling finish) leaves the cache unchanged. Anything put in the
+        info dict before finish() is saved with the entry.
+    '''
+    def __init__(self, cache, key):
+        self.cache = cache
+        self.key = key
+        self.temp_path = cache.get_path(key) + '.tmp{}'.format(os.getpid())
+        self.out_file = open(self.temp_path, 'wb')
+        self.out_file.write(CACHE_MAGIC + bytes.fromhex(key))
+        self.pending = []
+        self.count = 0
+        self.info = {}
+
+    def _flush(self):
+        if self.pending:
+            chunk = zlib.compress(marshal.dumps(self.pending), 1)
+            self.out_file.write(_chunk_header.pack(len(chunk), len(self.pending)))
+            self.out_file.write(chunk)
+            self.pending = []
+
+    def write(self, record):
+        '''Writes one record, a dict is stored as the tuple of its values'''
+        self.pending.append(tuple(record.values()) if isinstance(record, dict) else record)
+        self.count += 1
+        if len(self.pending) >= RECORDS_PER_CHUNK:
+            self._flush()
+
+    def write_rows(self, columns, rows):
+        '''Writes a list of tuples holding values in the order of columns'''
+        self.pending.extend(rows)
+        self.count += len(rows)
+        if len(self.pending) >= RECORDS_PER_CHUNK:
+            self._flush()
+
+    def finish(self):
+        self._flush()
+        self.out_file.write(_chunk_header.pack(0, self.count))
+        info = marshal.dumps(self.info)
+        self.out_file.write(_info_header.pack(len(info)))
+        self.out_file.write(info)
+        self.out_file.close()
+        os.replace(self.temp_path, self.cache.get_path(self.key))
+        self.cache.evict()
+
+    def abort(self):
+        if not self.out_file.closed:
+            self.out_file.close()
+        if os.path.exists(self.temp_path):
+            os.remove(self.temp_path)
+
+def _IterChunks(f):
+    '''Yields (records, decompressed chunk) of a cache entry, then (total records, None) for the end marker'''
+    while True:
+        header = f.read(_chunk_header.size)
+        if len(header) != _chunk_header.size:
+            raise EOFError('cache entry is truncated')
+        size, records = _chunk_header.unpack(header)
+        if size == 0:
+            yield records, None
+            return
+        chunk = f.read(size)
+        if len(chunk) != size:
+            raise EOFError('cache entry is truncated')
+        yield records, zlib.decompress(chunk)
+
+class CachedResult:
+    '''
+        A cache hit, returned by ResultCache.get(). Each call returns an
+        iterator over the cached records (lists), info is the dict the
+        writer saved with them.
+    '''
+    def __init__(self, cache, path, info):
+        self.cache = cache
+        self.path = path
+        self.info = info
+
+    def __call__(self):
+        return self.cache._iter_records(self.path)
+
+class ResultCache:
+    '''
+        Folder of cached parser results. Use get() to find an entry, and
+        if it returns None, write the freshly decoded records to the sink
+        returned by writer().
+    '''
+    def __init__(self, folder, max_size=DEFAULT_CACHE_SIZE):
+        self.folder = folder
+        self.max_size = max_size
+        os.makedirs(folder, exist_ok=True)
+
+    def make_key(self, input_path, parser_name, result_version, options):
+        '''
+            Returns the cache key for parsing input_path with the given
+            parser, result version and options (a dict of json values)
+        '''
+        key_data = json.dumps([CACHE_FORMAT_VERSION, sys.version_info[:2], marshal.version, parser_name, result_version,
+                               options, HashFile(input_path)], sort_keys=True)
+        return hashlib.sha256(key_data.encode('utf8')).hexdigest()
+
+    def get_path(self, key):
+        return os.path.join(self.folder, key + CACHE_SUFFIX)
+
+    def _check(self, path, key):
+        '''Reads the entry once, returns its info dict if it is complete and belongs to key, else None'''
+        try:
+            with open(path, 'rb') as f:
+                if f.read(4 + 32) != CACHE_MAGIC + bytes.fromhex(key):
+                    return None
+                count = 0
+                for records, chunk in _IterChunks(f):
+                    if chunk is None:
+                        break
+                    count += records
+                header = f.read(_info_header.size)
+                if records != count or len(header) != _info_header.size:
+                    return None
+                size = _info_header.unpack(header)[0]
+                raw_info = f.read(size)
+                if len(raw_info) != size or f.read(1) != b'':
+                    return None
+                info = marshal.loads(raw_info)
+                return info if isinstance(info, dict) else None
+        except (OSError, EOFError, ValueError, zlib.error):
+            pass
+        return None
+
+    def _iter_records(self, path):
+        with open(path, 'rb') as f:
+            f.seek(4 + 32)
+            for _, chunk in _IterChunks(f):
+                if chunk is not None:
+                    yield from marshal.loads(chunk)
+
+    def get(self, key, description=''):
+        '''
+            Returns a CachedResult, which each time it is called returns
+            an iterator over the cached records (lists), or None on a miss.
+            A damaged entry is deleted and counts as a miss.
+        '''
+        path = self.get_path(key)
+        if os.path.exists(path):
+            info = self._check(path, key)
+            if info is not None:
+                os.utime(path) # mark as recently used
+                print('Cache hit for {}'.format(description or key))
+                return CachedResult(self, path, info)
+            print('Error: Cache entry {} is damaged, it will be deleted and the input parsed again'.format(path))
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        print('Cache miss for {}'.format(description or key))
+        return None
+
+    def writer(self, key):
+        '''Returns a CacheEntryWriter sink for a new entry under key'''
+        return CacheEntryWriter(self, key)
+
+    def evict(self):
+        '''Deletes least recently used entries until the cache fits in max_size'''
+        entries = []
+        for name in os.listdir(self.folder):
+            if name.endswith(CACHE_SUFFIX):
+                path = os.path.join(self.folder, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+def CacheSizeArgument(text):
+    '''argparse type of --cache-size, a number of MB of 1 or more'''
+    try:
+        size = int(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError("invalid size '{}', give a whole number of MB".format(text))
+    if size < 1:
+        raise argparse.ArgumentTypeError('must be 1 MB or more')
+    return size
+
+def AddCacheArguments(parser):
+    '''Adds the result cache options to an argparse parser, see GetResultCache()'''
+    parser.add_argument('--cache', metavar='FOLDER', help='Cache decoded results in this folder and reuse them for unchanged inputs')
+    parser.add_argument('--cache-size', type=CacheSizeArgument, default=DEFAULT_CACHE_SIZE // (1024 * 1024),
+                        help='Cache size limit in MB, least recently used results are removed (default: {})'.format(
+                             DEFAULT_CACHE_SIZE // (1024 * 1024)))
+
+def GetResultCache(args):
+    '''Returns a ResultCache from options added by AddCacheArguments(), None if not used or (after printing an error) not usable'''
+    if not args.cache:
+        return None
+    try:
+        return ResultCache(args.cache, args.cache_size * 1024 * 1024)
+    except OSError as ex:
+        print("Error: Cannot use cache folder " + args.cache + " : " + str(ex))
+        return None
@@ -0,0 +1,28 @@
+'''
+    pytest setup, the parsers are flat scripts that import each other by
+    name, so their folder is put on sys.path. Fixtures write small
+    generated data files to a temporary folder.
+'''
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from generate_test_data import WriteCallLogData, WriteSettingsData
+
+@pytest.fixture
+def call_log_path(tmp_path):
+    '''Path of a generated call log data file with 500 records'''
+    path = str(tmp_path / 'com.android.calllogbackup.data')
+    WriteCallLogData(path, records=500, seed=1)
+    return path
+
+@pytest.fixture
+def settings_path(tmp_path):
+    '''Path of a generated settings data file with 200 settings per table'''
+    path = str(tmp_path / 'com.android.providers.settings.data')
+    WriteSettingsData(path, records=200, seed=1)
+    return path
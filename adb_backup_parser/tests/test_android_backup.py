@@ -0,0 +1,90 @@
+'''
+    Tests of reading call logs and settings straight from an Android
+    backup (.ab) file, android_backup.py
+'''
+
+import io
+import os
+import tarfile
+import zlib
+
+import pytest
+
+import android_backup
+import callparser
+import providers_settings_parser
+from backup_reader import BackupDataFile
+
+def ReadFile(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+def BuildBackup(members, compressed=True, encryption='none'):
+    '''Returns the bytes of an Android backup holding the tar members ({name : data})'''
+    tar_file = io.BytesIO()
+    with tarfile.open(fileobj=tar_file, mode='w') as tar:
+        for name, data in members.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+    tar_data = tar_file.getvalue()
+    header = b'ANDROID BACKUP\n5\n' + (b'1' if compressed else b'0') + b'\n' + encryption.encode('utf8') + b'\n'
+    return header + (zlib.compress(tar_data) if compressed else tar_data)
+
+@pytest.fixture
+def members(call_log_path, settings_path):
+    return {
+        'apps/com.example/_manifest' : b'manifest',
+        'apps/com.android.calllogbackup/_manifest' : b'manifest',
+        'apps/com.android.calllogbackup/k/com.android.calllogbackup.data' : ReadFile(call_log_path),
+        'apps/com.example/k/com.android.calllogbackup.data' : b'not the call log package',
+        'apps/com.android.providers.settings/k/com.android.providers.settings.data' : ReadFile(settings_path),
+        'apps/com.android.providers.settings/f/other' : b'x' * 5000,
+    }
+
+def ParsePlain(call_log_path, settings_path, output_path):
+    os.makedirs(output_path)
+    with BackupDataFile(call_log_path) as backup:
+        callparser.ParseCallLogs(backup.entities(), output_path, ['csv', 'json'])
+    with BackupDataFile(settings_path) as backup:
+        providers_settings_parser.ParseSettings(backup.entities(), output_path, ['json'])
+    return { name : ReadFile(os.path.join(output_path, name)) for name in os.listdir(output_path) }
+
+@pytest.mark.parametrize('compressed', [True, False])
+def test_backup_matches_data_files(call_log_path, settings_path, members, tmp_path, monkeypatch, compressed):
+    monkeypatch.setattr(android_backup, 'READ_CHUNK_SIZE', 1000) # inflate in many small pieces
+    backup_path = str(tmp_path / 'backup.ab')
+    with open(backup_path, 'wb') as f:
+        f.write(BuildBackup(members, compressed))
+    output_path = str(tmp_path / 'from_backup')
+    os.makedirs(output_path)
+    parsed = android_backup.ParseBackup(backup_path, output_path, ['csv', 'json'])
+    assert parsed == [android_backup.CALLLOG_PACKAGE, android_backup.SETTINGS_PACKAGE]
+    expected = ParsePlain(call_log_path, settings_path, str(tmp_path / 'plain'))
+    assert 'call_logs.csv' in expected and 'wifi_new_config.xml' in expected
+    assert { name : ReadFile(os.path.join(output_path, name)) for name in os.listdir(output_path) } == expected
+
+def test_header():
+    f = io.BytesIO(b'ANDROID BACKUP\n5\n1\nAES-256\nrest')
+    assert android_backup.ReadBackupHeader(f) == (5, True, 'AES-256')
+    assert f.read() == b'rest'
+
+def test_encrypted_backup_rejected(members):
+    with pytest.raises(android_backup.BackupFormatError, match='Encrypted'):
+        list(android_backup.IterBackupDataFiles(io.BytesIO(BuildBackup(members, encryption='AES-256'))))
+
+@pytest.mark.parametrize('data', [b'', b'PK\x03\x04 not a backup', b'ANDROID BACKUP\nfive\n1\nnone\n'])
+def test_not_a_backup(data):
+    with pytest.raises(android_backup.BackupFormatError):
+        list(android_backup.IterBackupDataFiles(io.BytesIO(data)))
+
+def test_finds_only_wanted_members(members):
+    found = [(package, name) for package, name, _ in android_backup.IterBackupDataFiles(io.BytesIO(BuildBackup(members)))]
+    assert found == [(android_backup.CALLLOG_PACKAGE, 'apps/com.android.calllogbackup/k/com.android.calllogbackup.data'),
+                     (android_backup.SETTINGS_PACKAGE, 'apps/com.android.providers.settings/k/com.android.providers.settings.data')]
+
+def test_truncated_backup(members, capsys):
+    data = BuildBackup(members)
+    with pytest.raises(tarfile.TarError):
+        list(android_backup.IterBackupDataFiles(io.BytesIO(data[:len(data) // 2])))
+    assert 'ended prematurely' in capsys.readouterr().out
@@ -0,0 +1,45 @@
+'''
+    Tests of the entity stream walk (backup_reader.IterEntityLocations and IterEntities)
+'''
+
+import pytest
+
+from backup_reader import IterEntities, IterEntityLocations, SplitEntities
+from generate_test_data import BuildEntity
+
+ENTITIES = [('system', b'abc'), ('deleted', None), ('é', b''), ('global', b'12345678'), ('x' * 5, b'\x00' * 7)]
+
+def BuildStream(entities=ENTITIES):
+    return b''.join(BuildEntity(key, data) for key, data in entities)
+
+def test_entities():
+    buf = BuildStream()
+    assert [(key, bytes(data)) for key, data in IterEntities(buf)] == \
+           [(key + '\x00', data) for key, data in ENTITIES if data is not None]
+    locations = list(IterEntityLocations(buf))
+    assert [key for key, _, _ in locations] == [key for key, data in ENTITIES if data is not None]
+    assert [bytes(buf[offset:offset + size]) for _, offset, size in locations] == [data for _, data in ENTITIES if data is not None]
+
+def test_keys_and_start():
+    buf = BuildStream()
+    assert [key for key, _ in IterEntities(buf, keys={ 'global', 'deleted', 'missing' })] == ['global\x00']
+    start = len(BuildStream(ENTITIES[:3]))
+    assert [key for key, _ in IterEntities(buf, start)] == ['global\x00', 'xxxxx\x00']
+
+@pytest.mark.parametrize('cut', [2, 4, 13, 20])
+def test_truncated_stream(cut, capsys):
+    buf = BuildStream()[:-cut]
+    assert [key for key, _ in IterEntities(buf)] == ['system\x00', 'é\x00', 'global\x00']
+    assert capsys.readouterr().out.startswith('Error, ')
+
+def test_bad_header(capsys):
+    buf = BuildStream(ENTITIES[:1]) + b'Date' + BuildStream(ENTITIES[3:])[4:]
+    assert [key for key, _ in IterEntities(buf)] == ['system\x00']
+    assert 'invalid Data header at offset 24' in capsys.readouterr().out
+
+def test_split():
+    buf = BuildStream()
+    chunks = SplitEntities(buf, 2)
+    assert len(chunks) == 2
+    keys = [key for start, end in chunks for key, _ in IterEntities(memoryview(buf)[:end], start)]
+    assert keys == [key for key, _ in IterEntities(buf)]
@@ -0,0 +1,149 @@
+'''
+    Round-trip tests of the streaming output sinks (output_sinks.py) and
+    of appending to call log output (callparser.AppendCallLogs)
+'''
+
+import csv
+import io
+import json
+import os
+import sqlite3
+import struct
+
+import pytest
+
+import callparser
+from backup_reader import BackupDataFile
+from generate_test_data import WriteCallLogData
+from output_sinks import CsvSink, JsonArraySink, NdjsonSink, OpenJsonArrayForAppend
+
+FORMATS = ['csv', 'json', 'ndjson', 'ndjson.gz', 'sqlite']
+RECORDS = [{ 'a' : '1', 'b' : 'x,"y"' }, { 'a' : '2', 'b' : '' }, { 'a' : '3', 'b' : 'é\n' }]
+
+def ReadOutput(output_path):
+    '''Returns the serial numbers (without their NUL terminator) in each call_logs output of output_path, in order'''
+    serials = {}
+    with open(os.path.join(output_path, 'call_logs.csv'), newline='') as f:
+        serials['csv'] = [row['serial_number'] for row in csv.DictReader(f)]
+    with open(os.path.join(output_path, 'call_logs.json')) as f:
+        serials['json'] = [record['serial_number'] for record in json.load(f)['call_logs']]
+    with open(os.path.join(output_path, 'call_logs.ndjson')) as f:
+        serials['ndjson'] = [json.loads(line)['serial_number'] for line in f]
+    with callparser.OpenTextFile(os.path.join(output_path, 'call_logs.ndjson.gz')) as f:
+        serials['ndjson.gz'] = [json.loads(line)['serial_number'] for line in f]
+    connection = sqlite3.connect(os.path.join(output_path, 'android_backup.sqlite'))
+    serials['sqlite'] = [row[0] for row in connection.execute('SELECT serial_number FROM call_logs ORDER BY rowid')]
+    connection.close()
+    return { fmt : [serial.rstrip('\x00') for serial in values] for fmt, values in serials.items() }
+
+def ReadFiles(output_path):
+    files = {}
+    for name in sorted(os.listdir(output_path)):
+        with open(os.path.join(output_path, name), 'rb') as f:
+            files[name] = f.read()
+    return files
+
+def test_sinks_round_trip():
+    for resume in (False, True):
+        out_file = io.StringIO()
+        sink = CsvSink(out_file, header=not resume)
+        sink.write(RECORDS[0])
+        sink.write_rows(('a', 'b'), [tuple(record.values()) for record in RECORDS[1:]])
+        sink.finish()
+        rows = list(csv.DictReader(io.StringIO(out_file.getvalue()), fieldnames=None if not resume else ['a', 'b']))
+        assert rows == RECORDS
+    out_file = io.StringIO()
+    sink = JsonArraySink(out_file, 'items')
+    for record in RECORDS:
+        sink.write(record)
+    sink.finish()
+    assert json.loads(out_file.getvalue()) == { 'items' : RECORDS }
+    out_file = io.StringIO()
+    sink = NdjsonSink(out_file)
+    sink.write_rows(('a', 'b'), [tuple(record.values()) for record in RECORDS])
+    assert [json.loads(line) for line in out_file.getvalue().splitlines()] == RECORDS
+    assert sink.count == 3
+
+def test_json_array_append(tmp_path):
+    path = str(tmp_path / 'out.json')
+    with open(path, 'w') as f:
+        sink = JsonArraySink(f, 'items')
+        sink.write(RECORDS[0])
+        sink.finish()
+    out_file, resume = OpenJsonArrayForAppend(path)
+    with out_file:
+        sink = JsonArraySink(out_file, 'items', resume)
+        sink.write_rows(('a', 'b'), [tuple(record.values()) for record in RECORDS[1:]])
+        sink.finish()
+    with open(path) as f:
+        assert json.load(f) == { 'items' : RECORDS }
+    with open(path, 'a') as f:
+        f.write(' ')
+    with pytest.raises(ValueError):
+        OpenJsonArrayForAppend(path)
+
+@pytest.fixture
+def inputs(tmp_path):
+    '''Paths of two call log data files, the second a newer backup holding the first's 300 calls and 200 more'''
+    old_path = str(tmp_path / 'old.data')
+    new_path = str(tmp_path / 'new.data')
+    WriteCallLogData(old_path, records=300, seed=5)
+    WriteCallLogData(new_path, records=500, seed=5)
+    return old_path, new_path
+
+def test_append_adds_only_new_calls(tmp_path, inputs):
+    old_path, new_path = inputs
+    output_path = str(tmp_path / 'out')
+    os.makedirs(output_path)
+    assert callparser.AppendCallLogs(old_path, output_path, FORMATS) == 300
+    assert callparser.AppendCallLogs(new_path, output_path, FORMATS) == 200
+    assert callparser.AppendCallLogs(new_path, output_path, FORMATS) == 0
+    expected = [str(n) for n in range(1, 501)]
+    assert ReadOutput(output_path) == { fmt : expected for fmt in FORMATS }
+    full_path = str(tmp_path / 'full')
+    os.makedirs(full_path)
+    with BackupDataFile(new_path) as backup:
+        callparser.ParseCallLogs(backup.entities(), full_path, ['csv'])
+    with open(os.path.join(output_path, 'call_logs.csv'), 'rb') as appended, \
+         open(os.path.join(full_path, 'call_logs.csv'), 'rb') as full:
+        assert appended.read() == full.read()
+
+def test_failed_append_is_undone(tmp_path, inputs):
+    old_path, new_path = inputs
+    output_path = str(tmp_path / 'out')
+    os.makedirs(output_path)
+    callparser.AppendCallLogs(old_path, output_path, FORMATS)
+    before = ReadFiles(output_path)
+    decoded = []
+    def FailingDecode(data):
+        if len(decoded) == 150:
+            raise struct.error('damaged record')
+        decoded.append(data)
+        return callparser.DecodeCallRecord(data)
+    with pytest.raises(struct.error):
+        callparser.AppendCallLogs(new_path, output_path, FORMATS, decode=FailingDecode)
+    after = ReadFiles(output_path)
+    assert after.keys() == before.keys()
+    for name in before:
+        if name != 'android_backup.sqlite': # same rows, see ReadOutput, but not the same bytes
+            assert after[name] == before[name], name
+    assert ReadOutput(output_path) == { fmt : [str(n) for n in range(1, 301)] for fmt in FORMATS }
+    assert callparser.AppendCallLogs(new_path, output_path, FORMATS) == 200
+    assert ReadOutput(output_path) == { fmt : [str(n) for n in range(1, 501)] for fmt in FORMATS }
+
+def test_append_to_new_files_is_undone(tmp_path, inputs):
+    old_path, _ = inputs
+    output_path = str(tmp_path / 'out')
+    os.makedirs(output_path)
+    def FailingDecode(data):
+        raise struct.error('damaged record')
+    with pytest.raises(struct.error):
+        callparser.AppendCallLogs(old_path, output_path, ['csv', 'json'], decode=FailingDecode)
+    assert os.listdir(output_path) == []
+
+def test_append_rejects_arrow_formats(call_log_path, tmp_path, capsys):
+    output_path = str(tmp_path / 'out')
+    os.makedirs(output_path)
+    assert callparser.AppendCallLogs(call_log_path, output_path, ['csv', 'parquet']) is None
+    assert 'cannot be appended to' in capsys.readouterr().out
+    assert os.listdir(output_path) == []
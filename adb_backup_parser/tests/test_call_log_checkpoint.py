@@ -0,0 +1,77 @@
+'''
+    Round-trip tests of the --append checkpoint (call_log_checkpoint.py)
+'''
+
+import json
+import os
+
+import pytest
+
+import callparser
+from backup_reader import BackupDataFile
+from call_log_checkpoint import (SerialSet, SaveCheckpoint, LoadCheckpoint, GetCheckpointPath, GetResumeOffset, HashPrefix,
+                                 IterNewEntities, LoadSerialsFromOutput)
+from generate_test_data import WriteCallLogData
+
+def test_serial_set():
+    serials = SerialSet()
+    serials.update(['3', '1', '2', '10', '7', 'abc', '007', '8'])
+    assert serials.ranges() == [[1, 3], [7, 8], [10, 10]]
+    assert serials.others == { 'abc', '007' }
+    assert len(serials) == 8
+    assert '2' in serials and '9' not in serials and '007' in serials and '7' in serials and '07' not in serials
+    copy = SerialSet(serials.ranges(), serials.others)
+    copy.update(['9', '4', '5', '6'])
+    assert copy.ranges() == [[1, 10]]
+
+def test_checkpoint_round_trip(tmp_path):
+    output_path = str(tmp_path)
+    serials = SerialSet()
+    serials.update([str(n) for n in range(1, 1001)] + ['x'])
+    SaveCheckpoint(output_path, serials, 5000, 4000, 'ab' * 32)
+    loaded, last_input = LoadCheckpoint(output_path)
+    assert loaded.ranges() == [[1, 1000]] and loaded.others == { 'x' }
+    assert last_input == { 'size' : 5000, 'covered' : 4000, 'covered_sha256' : 'ab' * 32 }
+    with open(GetCheckpointPath(output_path), 'w') as f:
+        f.write('{"version": 1, "serials"')
+    assert LoadCheckpoint(output_path) is None
+    with open(GetCheckpointPath(output_path), 'w') as f:
+        json.dump({ 'version' : 999 }, f)
+    assert LoadCheckpoint(output_path) is None
+
+def test_resume_offset(tmp_path):
+    path = str(tmp_path / 'calls.data')
+    WriteCallLogData(path, records=100, seed=2)
+    with BackupDataFile(path) as backup:
+        progress = {}
+        keys = [key for key, _ in IterNewEntities(backup, 0, SerialSet(), progress)]
+        assert len(keys) == 100 and progress['covered'] == backup.size
+        last_input = { 'size' : backup.size, 'covered' : 1000, 'covered_sha256' : HashPrefix(backup, 1000) }
+        assert GetResumeOffset(backup, last_input) == 1000
+        assert GetResumeOffset(backup, dict(last_input, covered=backup.size + 4)) == 0
+        assert GetResumeOffset(backup, None) == 0
+    with open(path, 'r+b') as f:
+        f.seek(500)
+        f.write(b'\xff')
+    with BackupDataFile(path) as backup:
+        assert GetResumeOffset(backup, last_input) == 0
+
+def test_new_entities_skip_known_serials(tmp_path):
+    path = str(tmp_path / 'calls.data')
+    WriteCallLogData(path, records=50, seed=2)
+    known = SerialSet()
+    known.update([str(n) for n in range(1, 41)])
+    with BackupDataFile(path) as backup:
+        progress = {}
+        keys = [key.rstrip('\x00') for key, _ in IterNewEntities(backup, 0, known, progress)]
+    assert keys == [str(n) for n in range(41, 51)]
+    assert progress['new_serials'] == keys
+
+@pytest.mark.parametrize('fmt', ['csv', 'ndjson', 'ndjson.gz', 'json', 'sqlite'])
+def test_serials_from_output(tmp_path, call_log_path, fmt):
+    output_path = str(tmp_path / fmt)
+    os.makedirs(output_path)
+    assert len(LoadSerialsFromOutput(output_path)) == 0
+    with BackupDataFile(call_log_path) as backup:
+        callparser.ParseCallLogs(backup.entities(), output_path, [fmt])
+    assert LoadSerialsFromOutput(output_path).ranges() == [[1, 500]]
@@ -0,0 +1,79 @@
+'''
+    Tests that filtering call records before decoding (callparser.CallLogFilter,
+    --start/--end/--types/--number) keeps the same rows as a full parse
+    filtered afterwards
+'''
+
+import argparse
+import csv
+import os
+import re
+
+import pytest
+
+import callparser
+from backup_reader import BackupDataFile
+
+def Parse(input_path, output_path, call_filter=None, columnar=False):
+    '''Returns the csv rows (lists of strings) of parsing input_path'''
+    os.makedirs(output_path)
+    with BackupDataFile(input_path) as backup:
+        callparser.ParseCallLogs(backup.entities(), output_path, ['csv'], columnar=columnar, call_filter=call_filter)
+    with open(os.path.join(output_path, 'call_logs.csv'), newline='', encoding='utf8') as f:
+        return list(csv.DictReader(f))
+
+def GetFilter(start=None, end=None, types=None, number=None):
+    args = argparse.Namespace(start=start, end=end, types=types, number=number)
+    return callparser.GetCallLogFilter(args)
+
+def Keep(row, start=None, end=None, types=None, number=None):
+    '''The filter, applied to a row of the full parse output'''
+    if start is not None and row['timestamp'] < start:
+        return False
+    if end is not None and row['timestamp'] >= end:
+        return False
+    if types is not None:
+        names = [name.strip().lower() for name in types.split(',')]
+        if row['type'].lower() not in names:
+            return False
+    if number is not None and not re.search(number, row['number']):
+        return False
+    return True
+
+@pytest.fixture
+def full_rows(call_log_path, tmp_path):
+    return Parse(call_log_path, str(tmp_path / 'full'))
+
+def GetTimes(rows):
+    '''Returns three UTC times ('YYYY-MM-DD HH:MM:SS') spread over the timestamps in rows'''
+    timestamps = sorted(row['timestamp'] for row in rows if row['timestamp'])
+    return [timestamps[len(timestamps) * n // 4][:19] for n in (1, 2, 3)]
+
+@pytest.mark.parametrize('columnar', [False, True])
+@pytest.mark.parametrize('options', [
+    { 'start' : 0 },
+    { 'end' : 1 },
+    { 'start' : 0, 'end' : 2 },
+    { 'types' : 'missed,incoming' },
+    { 'types' : 'outgoing', 'end' : 2 },
+    { 'number' : '^\\+1555' },
+    { 'number' : '99' },
+    { 'number' : '7$', 'types' : 'incoming,missed,outgoing,rejected' },
+    { 'start' : 0, 'end' : 2, 'types' : 'incoming', 'number' : '[0-9]' },
+])
+def test_filter_matches_filtered_full_parse(call_log_path, tmp_path, full_rows, options, columnar):
+    times = GetTimes(full_rows)
+    options = { name : times[value] if name in ('start', 'end') else value for name, value in options.items() }
+    expected = [row for row in full_rows if Keep(row, **options)]
+    assert 0 < len(expected) < len(full_rows)
+    rows = Parse(call_log_path, str(tmp_path / 'filtered'), GetFilter(**options), columnar)
+    assert rows == expected
+
+def test_no_options_is_no_filter():
+    assert GetFilter() is None
+
+def test_bad_options(capsys):
+    assert GetFilter(start='May 2019') is False
+    assert GetFilter(types='dropped') is False
+    assert GetFilter(number='(') is False
+    assert capsys.readouterr().out.count('Error: ') == 3
@@ -0,0 +1,103 @@
+'''
+    Round-trip tests of merging call logs (call_log_merge.py), in memory
+    and spilled to partition files, from raw data files and from earlier
+    callparser.py output
+'''
+
+import csv
+import json
+import os
+import sqlite3
+
+import pytest
+
+import callparser
+from backup_reader import BackupDataFile
+from call_log_merge import CallLogMerger, GetCallKey, GetSortKey, IterCallLogInput, WriteMergedCallLogs, \
+                           MERGED_COLUMNS, SOURCES_SEPARATOR
+from generate_test_data import WriteCallLogData
+
+OUTPUT_FORMATS = ['csv', 'json', 'ndjson', 'ndjson.gz', 'sqlite']
+
+@pytest.fixture
+def inputs(tmp_path):
+    '''Paths of three call log data files, the second holding the first 300 calls of the first'''
+    paths = [str(tmp_path / name) for name in ('a.data', 'b.data', 'c.data')]
+    WriteCallLogData(paths[0], records=500, seed=1)
+    WriteCallLogData(paths[1], records=300, seed=1)
+    WriteCallLogData(paths[2], records=100, seed=2)
+    return paths
+
+def Merge(paths, **kwargs):
+    '''Returns list of (record, sources) merged from the inputs'''
+    merger = CallLogMerger(**kwargs)
+    try:
+        for path in paths:
+            merger.add_input(path)
+        return list(merger.iter_merged())
+    finally:
+        merger.close()
+
+def test_merge_deduplicates(inputs):
+    merged = Merge(inputs)
+    records = { path : [record for record, _ in IterCallLogInput(path)] for path in inputs }
+    keys = set(GetCallKey(record) for path_records in records.values() for record in path_records)
+    assert len(merged) == len(keys)
+    assert [GetSortKey(record) for record, _ in merged] == sorted(GetSortKey(record) for record, _ in merged)
+    in_b = set(GetCallKey(record) for record in records[inputs[1]])
+    first_seen = {}
+    for path in inputs:
+        for record in records[path]:
+            first_seen.setdefault(GetCallKey(record), record)
+    for record, sources in merged:
+        key = GetCallKey(record)
+        assert record == first_seen[key]
+        assert (inputs[1] in sources) == (key in in_b)
+        assert len(sources) == len(set(sources))
+
+def test_spill_matches_memory(inputs, tmp_path):
+    in_memory = Merge(inputs)
+    spilled = Merge(inputs, max_records=50, partitions=4, temp_dir=str(tmp_path))
+    assert [GetCallKey(record) for record, _ in spilled] == [GetCallKey(record) for record, _ in in_memory]
+    assert sorted(spilled) == sorted(in_memory)
+    assert [name for name in os.listdir(str(tmp_path)) if name.startswith('call_log_merge_')] == []
+
+@pytest.mark.parametrize('fmt', OUTPUT_FORMATS)
+def test_callparser_output_as_input(inputs, tmp_path, fmt):
+    output_path = str(tmp_path / 'parsed')
+    os.makedirs(output_path)
+    with BackupDataFile(inputs[0]) as backup:
+        callparser.ParseCallLogs(backup.entities(), output_path, [fmt])
+    from_output = [(record, len(sources)) for record, sources in Merge([output_path, inputs[0]])]
+    from_data = [(record, 1) for record, _ in Merge([inputs[0]])]
+    assert [(GetCallKey(record), count) for record, count in from_output] == \
+           [(GetCallKey(record), 2) for record, _ in from_data]
+
+def ReadMergedOutput(output_path, fmt):
+    '''Returns the merged records as lists of strings, in output order'''
+    path = os.path.join(output_path, 'merged_call_logs.' + fmt)
+    if fmt == 'csv':
+        with open(path, newline='', encoding='utf8') as f:
+            rows = [[row[name] for name in MERGED_COLUMNS] for row in csv.DictReader(f)]
+    elif fmt == 'json':
+        with open(path, encoding='utf8') as f:
+            rows = [[record[name] for name in MERGED_COLUMNS] for record in json.load(f)['merged_call_logs']]
+    elif fmt == 'sqlite':
+        connection = sqlite3.connect(os.path.join(output_path, 'android_backup.sqlite'))
+        columns = ', '.join('"{}"'.format(name) for name in MERGED_COLUMNS)
+        rows = [list(row) for row in connection.execute('SELECT {} FROM merged_call_logs ORDER BY rowid'.format(columns))]
+        connection.close()
+    else:
+        with callparser.OpenTextFile(path) as f:
+            rows = [[json.loads(line)[name] for name in MERGED_COLUMNS] for line in f]
+    return [['' if value is None else str(value) for value in row] for row in rows]
+
+def test_merged_output_round_trip(inputs, tmp_path):
+    merged = Merge(inputs)
+    output_path = str(tmp_path / 'merged')
+    os.makedirs(output_path)
+    assert WriteMergedCallLogs(iter(merged), output_path, OUTPUT_FORMATS) == len(merged)
+    expected = [[str(value) for value in record + (SOURCES_SEPARATOR.join(sources), len(sources))]
+                for record, sources in merged]
+    for fmt in OUTPUT_FORMATS:
+        assert ReadMergedOutput(output_path, fmt) == expected, fmt
@@ -0,0 +1,75 @@
+'''
+    Regression test of the call log csv and json output: the streaming
+    sinks, row by row and with --columnar (CallLogBatch), must write the
+    same bytes as the original writers (csv.DictWriter and json.dump over
+    a list of record dicts decoded with construct)
+'''
+
+import csv
+import json
+import os
+import random
+
+import pytest
+
+import callparser
+from backup_reader import BackupDataFile
+from generate_test_data import BuildCallRecord, BuildEntity, RandomCallRecord
+
+EDGE_RECORDS = [
+    # version, timestamp, duration_in_sec, number, call_type, presentation, extra
+    (1007, 0, 0, None, 1, 1, {}),
+    (1007, -1, 1, '', 2, 2, { 'block_reason' : 99 }),
+    (1005, -62135596800001, 59, 'ünï', 3, 3, { 'iccid' : '', 'own_number' : '+15550000000' }),
+    (1007, 1, 86399, '+1,"555"', 99, 9, { 'block_reason' : 7 }),
+    (1007, 1546300799999, 86400, '555\n1', 7, 4, { 'servicename' : 'com.android.phone', 'iccid' : '8901' }),
+    (1005, 4 * 10**12, 2**40, '5', 4, 1, {}),
+    (1007, 4 * 10**12 + 1, 2**40 + 1, '5', 5, 1, {}),
+    (1007, 2**63 - 1, 2**64 - 1, '5', 6, 2, { 'block_reason' : 3 }),
+    (1007, -2**63, 2**63, '5', 0, 0, {}),
+]
+
+@pytest.fixture
+def input_path(tmp_path):
+    rng = random.Random(5)
+    entities = [BuildEntity(str(n), RandomCallRecord(rng)) for n in range(1, 301)]
+    for n, (version, timestamp, duration, number, call_type, presentation, extra) in enumerate(EDGE_RECORDS):
+        entities.append(BuildEntity('edge{}'.format(n), BuildCallRecord(version, timestamp, duration, number, call_type,
+                                                                         presentation, **extra)))
+    path = str(tmp_path / 'com.android.calllogbackup.data')
+    with open(path, 'wb') as f:
+        f.write(b''.join(entities))
+    return path
+
+def WriteReference(input_path, output_path):
+    '''The original output: a list of dicts from the construct decoder, written with csv.DictWriter and json.dump'''
+    call_logs = []
+    with BackupDataFile(input_path) as backup:
+        for key, data in backup.entities():
+            callparser.ParseCallLogData(key, data, call_logs, callparser.DecodeCallRecordConstruct)
+    with open(os.path.join(output_path, 'call_logs.csv'), 'w') as out_file_csv:
+        columns = [col for col in call_logs[0]]
+        writer = csv.DictWriter(out_file_csv, delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(call_logs)
+    with open(os.path.join(output_path, 'call_logs.json'), 'w') as out_file_json:
+        json.dump({ 'call_logs' : call_logs }, out_file_json)
+
+def ReadFile(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+@pytest.mark.parametrize('columnar', [False, True])
+@pytest.mark.parametrize('decoder_name', ['native', 'construct'])
+def test_output_matches_original_writers(input_path, tmp_path, columnar, decoder_name):
+    reference_path = str(tmp_path / 'reference')
+    output_path = str(tmp_path / 'output')
+    os.makedirs(reference_path)
+    os.makedirs(output_path)
+    WriteReference(input_path, reference_path)
+    with BackupDataFile(input_path) as backup:
+        count = callparser.ParseCallLogs(backup.entities(), output_path, ['csv', 'json'],
+                                         callparser.CALL_RECORD_DECODERS[decoder_name], columnar)
+    assert count == 300 + len(EDGE_RECORDS)
+    for name in ('call_logs.csv', 'call_logs.json'):
+        assert ReadFile(os.path.join(output_path, name)) == ReadFile(os.path.join(reference_path, name)), name
@@ -0,0 +1,61 @@
+'''
+    Tests that the parallel call log parse (callparser.ParseCallLogsParallel, -j)
+    writes the same output, in input order, as the single process parse
+'''
+
+import os
+import sqlite3
+
+import pytest
+
+import callparser
+from backup_reader import BackupDataFile
+from parse_stats import ParseStats
+
+FORMATS = ['csv', 'json', 'ndjson', 'sqlite']
+
+def ReadFiles(output_path):
+    files = {}
+    for name in sorted(os.listdir(output_path)):
+        path = os.path.join(output_path, name)
+        if name.endswith('.sqlite'):
+            connection = sqlite3.connect(path)
+            files[name] = connection.execute('SELECT * FROM call_logs ORDER BY rowid').fetchall()
+            connection.close()
+        else:
+            with open(path, 'rb') as f:
+                files[name] = f.read()
+    return files
+
+@pytest.mark.parametrize('decoder_name', ['native', 'construct'])
+@pytest.mark.parametrize('pipeline', [False, True])
+def test_parallel_matches_single(call_log_path, tmp_path, decoder_name, pipeline):
+    single_path = str(tmp_path / 'single')
+    parallel_path = str(tmp_path / 'parallel')
+    os.makedirs(single_path)
+    os.makedirs(parallel_path)
+    with BackupDataFile(call_log_path) as backup:
+        assert callparser.ParseCallLogs(backup.entities(), single_path, FORMATS, callparser.CALL_RECORD_DECODERS[decoder_name],
+                                        source=call_log_path) == 500
+    stats = ParseStats()
+    assert callparser.ParseCallLogsParallel(call_log_path, parallel_path, FORMATS, decoder_name, jobs=3, source=call_log_path,
+                                            chunk_size=37, stats=stats, pipeline=pipeline) == 500
+    assert stats.counters['chunks'] == 14
+    single = ReadFiles(single_path)
+    assert ReadFiles(parallel_path) == single
+    serials = [row[0].rstrip('\x00') for row in single['android_backup.sqlite']]
+    with BackupDataFile(call_log_path) as backup:
+        assert serials == [key.rstrip('\x00') for key, _ in backup.entities()]
+
+def test_parallel_filter(call_log_path, tmp_path):
+    call_filter = callparser.CallLogFilter(call_types={ 1, 3 })
+    single_path = str(tmp_path / 'single')
+    parallel_path = str(tmp_path / 'parallel')
+    os.makedirs(single_path)
+    os.makedirs(parallel_path)
+    with BackupDataFile(call_log_path) as backup:
+        count = callparser.ParseCallLogs(backup.entities(), single_path, ['csv'], call_filter=call_filter)
+    assert 0 < count < 500
+    assert callparser.ParseCallLogsParallel(call_log_path, parallel_path, ['csv'], jobs=2, call_filter=call_filter,
+                                            chunk_size=50) == count
+    assert ReadFiles(parallel_path) == ReadFiles(single_path)
@@ -0,0 +1,83 @@
+'''
+    Differential test of DecodeCallRecord() (struct offsets) against the
+    reference construct definition, DecodeCallRecordConstruct()
+'''
+
+import itertools
+import random
+
+import pytest
+
+import callparser
+from generate_test_data import BuildCallRecord
+
+OPTIONAL_STRINGS = ('number', 'servicename', 'iccid', 'own_number')
+BYTE_FIELDS = ('unknown3', 'unknown5')
+
+def DecodeConstruct(data):
+    '''Returns the construct result as CallRecordFields, with byte arrays as bytes like the native decoder'''
+    cr = callparser.DecodeCallRecordConstruct(data)
+    values = []
+    for name in callparser.CallRecordFields._fields:
+        value = getattr(cr, name)
+        if name in BYTE_FIELDS and value is not None:
+            value = bytes(value)
+        elif name == 'unknown4':
+            value = tuple(value)
+        values.append(value)
+    return callparser.CallRecordFields(*values)
+
+def Decode(decoder, data):
+    '''Returns ('ok', record) or ('error', None)'''
+    try:
+        return 'ok', decoder(data)
+    except Exception:
+        return 'error', None
+
+def AssertSameResult(data):
+    native = Decode(callparser.DecodeCallRecord, data)
+    reference = Decode(DecodeConstruct, data)
+    assert native[0] == reference[0], 'only one decoder failed on {}'.format(data.hex())
+    if native[0] == 'ok':
+        for name, native_value, reference_value in zip(callparser.CallRecordFields._fields, native[1], reference[1]):
+            assert native_value == reference_value, name
+
+def BuildRecords():
+    '''Yields records of both versions with every combination of the optional strings present or absent'''
+    values = { 'number' : '+15551234567', 'servicename' : 'carrier', 'iccid' : '8901260123456789012', 'own_number' : '5559876543' }
+    for version in (1005, 1007):
+        for present in itertools.product((False, True), repeat=len(OPTIONAL_STRINGS)):
+            strings = { name : values[name] if is_present else None for name, is_present in zip(OPTIONAL_STRINGS, present) }
+            yield BuildCallRecord(version, 1546300800000 + sum(present), 75, strings['number'], 2, 1,
+                                  strings['servicename'], strings['iccid'], strings['own_number'], 'oemé', 3)
+
+RECORDS = list(BuildRecords())
+
+@pytest.mark.parametrize('data', RECORDS)
+def test_records_decode_the_same(data):
+    AssertSameResult(data)
+    assert Decode(callparser.DecodeCallRecord, data)[0] == 'ok'
+
+@pytest.mark.parametrize('data', RECORDS)
+def test_truncated_records(data):
+    for size in range(len(data)):
+        AssertSameResult(data[:size])
+
+@pytest.mark.parametrize('data', RECORDS)
+def test_bit_flipped_records(data):
+    rng = random.Random(len(data))
+    for _ in range(200):
+        flipped = bytearray(data)
+        for _ in range(rng.randint(1, 4)):
+            flipped[rng.randrange(len(flipped))] ^= 1 << rng.randrange(8)
+        AssertSameResult(bytes(flipped))
+
+def test_edge_values():
+    AssertSameResult(BuildCallRecord(1007, -1, 2**64 - 1, '', 0, 0, '', '', '', '', 2**32 - 1))
+    AssertSameResult(BuildCallRecord(1005, 0, 0, None, 7, 4))
+
+def test_call_record_module_name():
+    assert callparser.CallRecord is callparser.GetCallRecordStruct()
+    assert callparser.CallRecord.parse(BuildCallRecord(1007, 1500000000000, 61, '555', 1, 1))['number'] == '555'
+    with pytest.raises(AttributeError):
+        callparser.NoSuchName
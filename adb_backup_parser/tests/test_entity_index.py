@@ -0,0 +1,63 @@
+'''
+    Round-trip tests of the sidecar entity index (entity_index.py)
+'''
+
+import os
+
+from backup_reader import BackupDataFile
+from entity_index import BuildIndex, LoadIndex, GetIndex, GetIndexPath, GetFileTag, IterIndexedEntities, LookupEntity
+from generate_test_data import BuildEntity
+
+def ReadAll(path):
+    with BackupDataFile(path) as backup:
+        return { key.rstrip('\x00') : bytes(data) for key, data in backup.entities() }
+
+def test_index_matches_entities(call_log_path):
+    index = BuildIndex(call_log_path)
+    entities = ReadAll(call_log_path)
+    assert len(index) == len(entities) == 500
+    with BackupDataFile(call_log_path) as backup:
+        for key, data in entities.items():
+            assert bytes(backup.read_at(*index.get(key))) == data
+    assert index.get('no such key') is None
+
+def test_save_and_load(call_log_path, tmp_path):
+    index = BuildIndex(call_log_path)
+    index_path = str(tmp_path / 'saved.idx')
+    index.save(index_path)
+    loaded = LoadIndex(index_path, GetFileTag(call_log_path))
+    assert loaded.keys == index.keys
+    assert list(loaded.offsets) == list(index.offsets)
+    assert list(loaded.sizes) == list(index.sizes)
+    assert loaded.tag == index.tag
+
+def test_stale_or_damaged_index_is_not_used(call_log_path):
+    index_path = GetIndexPath(call_log_path)
+    GetIndex(call_log_path)
+    assert os.path.exists(index_path)
+    size, mtime_ns = GetFileTag(call_log_path)
+    assert LoadIndex(index_path, (size + 1, mtime_ns)) is None
+    with open(index_path, 'rb') as f:
+        raw = f.read()
+    with open(index_path, 'wb') as f:
+        f.write(raw[:len(raw) // 2])
+    assert LoadIndex(index_path) is None
+    assert len(GetIndex(call_log_path)) == 500 # rebuilt
+    assert LoadIndex(index_path, GetFileTag(call_log_path)) is not None
+
+def test_indexed_entities(call_log_path):
+    entities = ReadAll(call_log_path)
+    missing = []
+    with BackupDataFile(call_log_path) as backup:
+        found = [(key, bytes(data)) for key, data in
+                 IterIndexedEntities(backup, GetIndex(call_log_path), ['7', 'x', '500'], missing)]
+    assert found == [('7\x00', entities['7']), ('500\x00', entities['500'])]
+    assert missing == ['x']
+    assert LookupEntity(call_log_path, '42') == entities['42']
+
+def test_last_duplicate_wins(tmp_path):
+    path = str(tmp_path / 'dup.data')
+    with open(path, 'wb') as f:
+        f.write(BuildEntity('a', b'first') + BuildEntity('b', b'other') + BuildEntity('a', b'second'))
+    assert LookupEntity(path, 'a') == b'second'
+    assert LookupEntity(path, 'b') == b'other'
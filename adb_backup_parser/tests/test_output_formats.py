@@ -0,0 +1,61 @@
+'''
+    Round-trip tests of the optional output formats (ndjson, compressed
+    ndjson, parquet and arrow) against the csv (call logs) and json
+    (settings) outputs. Formats whose package is not installed are skipped.
+'''
+
+import csv
+import json
+import os
+
+import pytest
+
+import callparser
+import providers_settings_parser
+from backup_reader import BackupDataFile
+from output_sinks import GetMissingModule, IterArrowRows, OpenTextFile
+
+FORMATS = ['ndjson', 'ndjson.gz', 'ndjson.zst', 'parquet', 'arrow']
+
+def RequireFormat(fmt):
+    missing = GetMissingModule(fmt)
+    if missing:
+        pytest.skip('{} output needs {}'.format(fmt, missing))
+
+def ReadRows(path, columns):
+    '''Returns the rows of an ndjson, parquet or arrow output as lists of values in columns order'''
+    if path.endswith(('.parquet', '.arrow')):
+        return [list(row) for row in IterArrowRows(path, columns)]
+    with OpenTextFile(path, 'r') as f:
+        return [[record[name] for name in columns] for record in map(json.loads, f)]
+
+@pytest.mark.parametrize('columnar', [False, True])
+@pytest.mark.parametrize('fmt', FORMATS)
+def test_call_logs_match_csv(call_log_path, tmp_path, fmt, columnar):
+    RequireFormat(fmt)
+    output_path = str(tmp_path)
+    with BackupDataFile(call_log_path) as backup:
+        assert callparser.ParseCallLogs(backup.entities(), output_path, ['csv', fmt], columnar=columnar) == 500
+    with open(os.path.join(output_path, 'call_logs.csv'), newline='', encoding='utf8') as f:
+        expected = [[row[name] for name in callparser.CALL_LOG_COLUMNS] for row in csv.DictReader(f)]
+    rows = ReadRows(os.path.join(output_path, 'call_logs.' + fmt), callparser.CALL_LOG_COLUMNS)
+    assert [['' if value is None else str(value) for value in row] for row in rows] == expected
+
+@pytest.mark.parametrize('fmt', FORMATS)
+def test_settings_match_json(settings_path, tmp_path, fmt):
+    RequireFormat(fmt)
+    output_path = str(tmp_path)
+    with BackupDataFile(settings_path) as backup:
+        providers_settings_parser.ParseSettings(backup.entities(), output_path, ['json', fmt])
+    data_types = ['system settings', 'secure settings', 'global settings']
+    if fmt not in providers_settings_parser.ARROW_FORMATS: # parquet and arrow only hold the name/value tables
+        data_types += ['lock settings', 'softap settings', 'wifi settings']
+    columns = [name for name, _ in providers_settings_parser.SETTINGS_TABLE_COLUMNS]
+    for data_type in data_types:
+        file_name = providers_settings_parser.GetSettingsFileName(data_type, 'json')
+        with open(os.path.join(output_path, file_name), encoding='utf8') as f:
+            items = json.load(f)[data_type]
+        expected = [[item, name, value] for item, settings in enumerate(items) for name, value in settings.items()]
+        assert expected
+        path = os.path.join(output_path, providers_settings_parser.GetSettingsFileName(data_type, fmt))
+        assert ReadRows(path, columns) == expected, data_type
@@ -0,0 +1,141 @@
+'''
+    Tests of --recover: carving entities (backup_reader.CarveEntities) out
+    of damaged call log and settings files, vetted by CarvedCallRecords and
+    CarvedSettingsEntities
+'''
+
+import csv
+import os
+import struct
+
+import pytest
+
+import callparser
+import providers_settings_parser
+from backup_reader import CarveEntities
+from generate_test_data import BuildCallRecord, BuildEntity, BuildNameValues, BuildSoftapConfig, BuildWifiConfigXml
+
+JUNK = b'\x07not an entity, Dat\x00\x01'
+
+def BuildFile(entities, prefix=b''):
+    '''Returns (file bytes, [(start, end) of every entity])'''
+    data = prefix
+    spans = []
+    for entity in entities:
+        spans.append((len(data), len(data) + len(entity)))
+        data += entity
+    return data, spans
+
+def CallEntities(count=5):
+    return [BuildEntity(str(n), BuildCallRecord(1007 if n % 2 else 1005, 1500000000000 + n * 60000, n, '555{:04}'.format(n), 1, 1,
+                                                oem='oem'))
+            for n in range(1, count + 1)]
+
+def SettingsEntities():
+    return [BuildEntity('system', BuildNameValues([('screen_brightness', '102'), ('font_scale', None)])),
+            BuildEntity('secure', BuildNameValues([('android_id', 'abcdef'), ('lock_screen', '1')])),
+            BuildEntity('global', BuildNameValues([('airplane_mode_on', '0')])),
+            BuildEntity('locale', b'en-US'),
+            BuildEntity('lock_settings', BuildNameValues([('lockscreen.password_type', '65536')], 2)),
+            BuildEntity('softap_config', BuildSoftapConfig()),
+            BuildEntity('wifi_new_config', BuildWifiConfigXml([{ 'ssid' : 'Home', 'security' : 'WPA_PSK', 'psk' : 'secret',
+                                                                 'hidden' : False }]))]
+
+def GrowSizeData(data, start, extra):
+    '''Returns data with the size_data of the entity at start made extra bytes larger'''
+    data = bytearray(data)
+    size_data = struct.unpack_from('<I', data, start + 8)[0]
+    struct.pack_into('<I', data, start + 8, size_data + extra)
+    return bytes(data)
+
+def Damage(data, start, end):
+    '''Returns data with the entity's data (past its 'Data' signature and key) overwritten with 0xFF'''
+    data = bytearray(data)
+    data[start + 20:end] = b'\xff' * (end - start - 20)
+    return bytes(data)
+
+def CarveCalls(data):
+    skipped = []
+    carved = callparser.CarvedCallRecords()
+    keys = [key.rstrip('\x00') for key, _ in CarveEntities(data, carved.validate, skipped)]
+    return keys, skipped
+
+def CarveSettings(data):
+    skipped = []
+    carved = providers_settings_parser.CarvedSettingsEntities()
+    keys = [key.rstrip('\x00') for key, _ in CarveEntities(data, carved.validate, skipped)]
+    return keys, skipped
+
+def test_calls_junk_prefix():
+    data, spans = BuildFile(CallEntities(), JUNK)
+    assert CarveCalls(data) == (['1', '2', '3', '4', '5'], [(0, len(JUNK))])
+
+def test_calls_damaged_middle_entity():
+    data, spans = BuildFile(CallEntities())
+    data = Damage(data, *spans[2])
+    assert CarveCalls(data) == (['1', '2', '4', '5'], [spans[2]])
+
+def test_calls_oversized_size_data():
+    data, spans = BuildFile(CallEntities())
+    data = GrowSizeData(data, spans[2][0], 40)
+    assert CarveCalls(data) == (['1', '2', '4', '5'], [spans[2]])
+    # Unvetted, the entity would swallow the next one
+    assert [key.rstrip('\x00') for key, _ in CarveEntities(data)] == ['1', '2', '3', '5']
+
+def test_calls_recover_output(tmp_path):
+    data, spans = BuildFile(CallEntities(), JUNK)
+    data = GrowSizeData(data, spans[1][0], 40)
+    carved = callparser.CarvedCallRecords()
+    skipped = []
+    output_path = str(tmp_path)
+    callparser.ParseCallLogs(CarveEntities(data, carved.validate, skipped), output_path, ['csv'], carved.decode)
+    with open(os.path.join(output_path, 'call_logs.csv'), newline='') as f:
+        rows = list(csv.DictReader(f))
+    assert [row['serial_number'].rstrip('\x00') for row in rows] == ['1', '3', '4', '5']
+    assert [row['number'] for row in rows] == ['5550001', '5550003', '5550004', '5550005']
+    assert skipped == [(0, len(JUNK)), spans[1]]
+
+def test_settings_junk_prefix():
+    data, spans = BuildFile(SettingsEntities(), JUNK)
+    keys, skipped = CarveSettings(data)
+    assert keys == ['system', 'secure', 'global', 'locale', 'lock_settings', 'softap_config', 'wifi_new_config']
+    assert skipped == [(0, len(JUNK))]
+
+@pytest.mark.parametrize('position', range(7))
+def test_settings_damaged_entity(position):
+    data, spans = BuildFile(SettingsEntities())
+    data = Damage(data, *spans[position])
+    keys, skipped = CarveSettings(data)
+    expected = ['system', 'secure', 'global', 'locale', 'lock_settings', 'softap_config', 'wifi_new_config']
+    del expected[position]
+    assert keys == expected
+    assert skipped == [spans[position]]
+
+@pytest.mark.parametrize('position', range(6))
+def test_settings_oversized_size_data(position):
+    data, spans = BuildFile(SettingsEntities())
+    data = GrowSizeData(data, spans[position][0], 16)
+    keys, skipped = CarveSettings(data)
+    expected = ['system', 'secure', 'global', 'locale', 'lock_settings', 'softap_config', 'wifi_new_config']
+    del expected[position]
+    assert keys == expected
+    assert skipped == [spans[position]]
+
+def test_settings_unknown_key_skipped():
+    data, spans = BuildFile([BuildEntity('network_policies', b'\x00\x01\x02\x03')] + SettingsEntities()[:2])
+    assert CarveSettings(data) == (['system', 'secure'], [spans[0]])
+
+def test_settings_recover_output(tmp_path):
+    entities = SettingsEntities()
+    data, spans = BuildFile(entities, JUNK)
+    data = GrowSizeData(data, spans[0][0], 16)
+    carved = providers_settings_parser.CarvedSettingsEntities()
+    skipped = []
+    settings = providers_settings_parser.ParseSettings(CarveEntities(data, carved.validate, skipped), str(tmp_path), ['json'],
+                                                       carved=carved)
+    assert settings['system settings'] == []
+    assert settings['secure settings'] == [{ 'android_id' : 'abcdef', 'lock_screen' : '1' }]
+    assert settings['lock settings'] == [{ 'lockscreen.password_type' : '65536' }]
+    assert settings['softap settings'][0]['ssid'] == 'AndroidAP'
+    assert settings['wifi settings'][0]['PreSharedKey'] == 'secret'
+    assert skipped == [(0, spans[1][0])]
@@ -0,0 +1,98 @@
+'''
+    Round-trip tests of the result cache (result_cache.py)
+'''
+
+import argparse
+import os
+
+import pytest
+
+import callparser
+import result_cache
+from backup_reader import BackupDataFile
+from result_cache import ResultCache, AddCacheArguments
+
+def MakeKey(cache, input_path, options=None):
+    return cache.make_key(input_path, 'test', 1, options or {})
+
+def test_records_and_info_round_trip(tmp_path, call_log_path, monkeypatch):
+    monkeypatch.setattr(result_cache, 'RECORDS_PER_CHUNK', 7) # many chunks
+    cache = ResultCache(str(tmp_path / 'cache'))
+    key = MakeKey(cache, call_log_path)
+    assert cache.get(key) is None
+    rows = [(str(n), n, 'x' * (n % 5)) for n in range(100)]
+    writer = cache.writer(key)
+    writer.write_rows(('a', 'b', 'c'), rows[:50])
+    for row in rows[50:]:
+        writer.write(dict(zip(('a', 'b', 'c'), row)))
+    writer.info['skipped'] = [(0, 108)]
+    writer.finish()
+    cached = cache.get(key)
+    assert [tuple(row) for row in cached()] == rows
+    assert [tuple(row) for row in cached()] == rows # can be read again
+    assert cached.info == { 'skipped' : [(0, 108)] }
+
+def test_abort_leaves_no_entry(tmp_path, call_log_path):
+    cache = ResultCache(str(tmp_path / 'cache'))
+    key = MakeKey(cache, call_log_path)
+    writer = cache.writer(key)
+    writer.write(('1',))
+    writer.abort()
+    assert cache.get(key) is None
+    assert os.listdir(cache.folder) == []
+
+def test_damaged_entry_is_deleted(tmp_path, call_log_path):
+    cache = ResultCache(str(tmp_path / 'cache'))
+    key = MakeKey(cache, call_log_path)
+    writer = cache.writer(key)
+    writer.write_rows(('a',), [(str(n),) for n in range(1000)])
+    writer.finish()
+    path = cache.get_path(key)
+    with open(path, 'rb') as f:
+        raw = f.read()
+    with open(path, 'wb') as f:
+        f.write(raw[:-3])
+    assert cache.get(key) is None
+    assert not os.path.exists(path)
+
+def test_key_depends_on_content_and_options(tmp_path, call_log_path):
+    cache = ResultCache(str(tmp_path / 'cache'))
+    key = MakeKey(cache, call_log_path)
+    assert MakeKey(cache, call_log_path, { 'recover' : True }) != key
+    with open(call_log_path, 'ab') as f:
+        f.write(b'\x00')
+    assert MakeKey(cache, call_log_path) != key
+
+def test_least_recently_used_entries_are_evicted(tmp_path, call_log_path):
+    cache = ResultCache(str(tmp_path / 'cache'))
+    keys = [cache.make_key(call_log_path, 'test', version, {}) for version in range(3)]
+    for age, key in zip((300, 100, 200), keys):
+        writer = cache.writer(key)
+        writer.write(('row',))
+        writer.finish()
+        os.utime(cache.get_path(key), (1000 - age, 1000 - age))
+    cache.max_size = 2 * os.path.getsize(cache.get_path(keys[0]))
+    cache.evict()
+    assert [os.path.exists(cache.get_path(key)) for key in keys] == [False, True, True]
+
+def test_cached_call_logs_write_the_same_output(tmp_path, call_log_path):
+    cache = ResultCache(str(tmp_path / 'cache'))
+    key = MakeKey(cache, call_log_path)
+    parsed_path = str(tmp_path / 'parsed')
+    cached_path = str(tmp_path / 'cached')
+    os.makedirs(parsed_path)
+    os.makedirs(cached_path)
+    with BackupDataFile(call_log_path) as backup:
+        callparser.ParseCallLogs(backup.entities(), parsed_path, ['csv', 'json'], extra_sinks=[cache.writer(key)])
+    assert callparser.WriteCallLogRows(cache.get(key)(), cached_path, ['csv', 'json']) == 500
+    for name in ('call_logs.csv', 'call_logs.json'):
+        with open(os.path.join(parsed_path, name), 'rb') as parsed, open(os.path.join(cached_path, name), 'rb') as cached:
+            assert parsed.read() == cached.read()
+
+@pytest.mark.parametrize('size', ['0', '-5', 'x', '1.5'])
+def test_cache_size_must_be_positive(size):
+    parser = argparse.ArgumentParser()
+    AddCacheArguments(parser)
+    with pytest.raises(SystemExit):
+        parser.parse_args(['--cache', 'folder', '--cache-size', size])
+    assert parser.parse_args(['--cache-size', '1']).cache_size == 1
@@ -0,0 +1,72 @@
+'''
+    Tests of decoding settings name/value pairs (providers_settings_parser.IterNameValues)
+'''
+
+import struct
+
+import pytest
+
+from generate_test_data import BuildNameValues
+from providers_settings_parser import IterNameValues, ReadNameValuePairs, ReadNameValue2Pairs, _uint16, _uint32
+
+LENGTHS = { 4 : (_uint32, 0xFFFFFFFF), 2 : (_uint16, 0xFFFF) }
+
+def Decode(data, len_size):
+    progress = {}
+    pairs = list(IterNameValues(data, *LENGTHS[len_size], progress=progress))
+    return pairs, progress['end']
+
+@pytest.mark.parametrize('len_size', [4, 2])
+def test_pairs(len_size):
+    items = [('screen_brightness', '102'), ('é_name', 'välue'), ('empty', '')]
+    data = BuildNameValues(items, len_size)
+    assert Decode(data, len_size) == (items, len(data))
+
+@pytest.mark.parametrize('len_size', [4, 2])
+def test_null_values_keep_later_settings(len_size):
+    data = BuildNameValues([('a', None), ('b', '2'), ('c', None), ('d', None), ('e', '5')], len_size)
+    assert Decode(data, len_size) == ([('a', ''), ('b', '2'), ('c', ''), ('d', ''), ('e', '5')], len(data))
+
+@pytest.mark.parametrize('len_size', [4, 2])
+def test_null_value_last(len_size):
+    data = BuildNameValues([('a', '1'), ('b', None)], len_size)
+    assert Decode(data, len_size) == ([('a', '1'), ('b', '')], len(data))
+
+@pytest.mark.parametrize('len_size', [4, 2])
+def test_empty_names(len_size):
+    data = BuildNameValues([('', '1'), ('', None), ('x', '')], len_size)
+    assert Decode(data, len_size) == ([('', '1'), ('', ''), ('x', '')], len(data))
+
+def test_short_last_pair():
+    '''A uint16 pair of an empty name and empty value is only 4 bytes long'''
+    data = BuildNameValues([('a', '1'), ('', '')], 2)
+    assert Decode(data, 2) == ([('a', '1'), ('', '')], len(data))
+
+@pytest.mark.parametrize('len_size', [4, 2])
+def test_null_name_ends_pairs(len_size, capsys):
+    len_struct, null_len = LENGTHS[len_size]
+    good = BuildNameValues([('a', '1')], len_size)
+    data = good + len_struct.pack(null_len) + b'name' + BuildNameValues([('b', '2')], len_size)
+    assert Decode(data, len_size) == ([('a', '1')], len(good))
+    assert 'truncated name/value pair at offset {}'.format(len(good)) in capsys.readouterr().out
+
+@pytest.mark.parametrize('len_size', [4, 2])
+@pytest.mark.parametrize('cut', [1, 2, 3, 5])
+def test_truncated_last_pair(len_size, cut, capsys):
+    good = BuildNameValues([('a', '1'), ('b', None)], len_size)
+    data = good + BuildNameValues([('name', 'value')], len_size)[:-cut]
+    assert Decode(data, len_size) == ([('a', '1'), ('b', '')], len(good))
+    assert 'truncated name/value pair at offset {}, {} trailing bytes ignored'.format(len(good), len(data) - len(good)) \
+           in capsys.readouterr().out
+
+def test_truncated_length_field():
+    good = BuildNameValues([('a', '1')], 4)
+    assert Decode(good + b'\x00\x00', 4) == ([('a', '1')], len(good))
+    assert Decode(good + struct.pack('>I', 1) + b'x\x00', 4) == ([('a', '1')], len(good))
+
+def test_read_pairs():
+    logs = []
+    ReadNameValuePairs(BuildNameValues([('a', None), ('b', '2')], 4), logs)
+    ReadNameValue2Pairs(BuildNameValues([('c', None), ('d', '4')], 2), logs)
+    ReadNameValuePairs(b'', logs)
+    assert logs == [{ 'a' : '', 'b' : '2' }, { 'c' : '', 'd' : '4' }]
@@ -0,0 +1,38 @@
+'''
+    Tests of the pipelined settings parse (providers_settings_parser.ParseSettings
+    with pipeline=True), which writes the outputs on writer threads
+'''
+
+import os
+import threading
+
+import pytest
+
+import providers_settings_parser
+from backup_reader import BackupDataFile
+
+def ReadFiles(output_path):
+    files = {}
+    for name in sorted(os.listdir(output_path)):
+        with open(os.path.join(output_path, name), 'rb') as f:
+            files[name] = f.read()
+    return files
+
+def test_pipeline_matches_serial(settings_path, tmp_path):
+    outputs = {}
+    for pipeline in (False, True):
+        output_path = str(tmp_path / 'out_{}'.format(pipeline))
+        os.makedirs(output_path)
+        with BackupDataFile(settings_path) as backup:
+            providers_settings_parser.ParseSettings(backup.entities(), output_path, ['json', 'ndjson'], pipeline=pipeline)
+        outputs[pipeline] = ReadFiles(output_path)
+    assert outputs[True] == outputs[False]
+    assert 'wifi_new_config.xml' in outputs[True]
+
+def test_pipeline_stops_writers_on_error(settings_path, tmp_path):
+    threads = threading.active_count()
+    with BackupDataFile(settings_path) as backup:
+        entities = list(backup.entities()) + [('locale\x00', b'\xff\xfe')]
+        with pytest.raises(UnicodeDecodeError):
+            providers_settings_parser.ParseSettings(entities, str(tmp_path), ['json'], pipeline=True)
+    assert threading.active_count() == threads
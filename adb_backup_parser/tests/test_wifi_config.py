@@ -0,0 +1,115 @@
+'''
+    Tests that streaming the wifi settings xml (providers_settings_parser.IterWifiNetworks)
+    gives the same networks as reading the whole tree with findall(), as
+    the parser did before
+'''
+
+import random
+import xml.etree.ElementTree as ET
+
+import pytest
+
+import providers_settings_parser
+from generate_test_data import BuildWifiConfigXml, RandomNetworks
+
+WIFI_XML = b"""<?xml version='1.0' encoding='utf-8' standalone='yes' ?>
+<WifiConfigStoreData>
+<int name="Version" value="3" />
+<SoftAp><Network><WifiConfiguration><string name="SSID">"not a saved network"</string></WifiConfiguration></Network></SoftAp>
+<NetworkList>
+<Network>
+<WifiConfiguration>
+<string name="ConfigKey">"Home"WPA_PSK</string>
+<string name="SSID">"Home"</string>
+<string name="PreSharedKey">"secret &amp; more"</string>
+<string name="CreatorName"></string>
+<string name="LastUpdateName" />
+<boolean name="HiddenSSID" value="false" />
+<boolean value="true" />
+<byte-array name="AllowedKeyMgmt" num="1">02</byte-array>
+</WifiConfiguration>
+<NetworkStatus><string name="SelectionStatus">NETWORK_SELECTION_ENABLED</string></NetworkStatus>
+<IpConfiguration>
+<string name="IpAssignment">DHCP</string>
+<string>no name</string>
+</IpConfiguration>
+</Network>
+<Network />
+<Network>
+<WifiConfiguration>
+<string name="ConfigKey">Broken</string>
+<string name="SSID">"Office"</string>
+<null name="PreSharedKey" />
+</WifiConfiguration>
+<WifiEnterpriseConfiguration>
+<string name="Identity">user</string>
+<Nested><string name="Deep">value</string></Nested>
+</WifiEnterpriseConfiguration>
+<IpConfiguration />
+</Network>
+<Network><WifiConfiguration /></Network>
+</NetworkList>
+<DeletedEphemeralSsidList><set name="SsidList" /></DeletedEphemeralSsidList>
+<NetworkList><Network><WifiConfiguration><string name="SSID">"second list"</string></WifiConfiguration></Network></NetworkList>
+</WifiConfigStoreData>
+"""
+
+def ReadWifiNewConfigFindall(data):
+    '''The parser's original reading of the wifi settings xml, as the reference'''
+    logs = []
+    tree = ET.fromstring(str(data, 'utf8'))
+    for network in tree.findall('./NetworkList/Network'):
+        wifi = {}
+        for config in network:
+            if config.tag == 'WifiConfiguration':
+                for string in config.findall('string'):
+                    name = string.attrib.get('name', None)
+                    if name == 'ConfigKey':
+                        parts = string.text[1:].split('"')
+                        if len(parts) != 2:
+                            print('Problem parsing configKey = {}'.format(string.text))
+                            wifi['config_key'] = string.text
+                            continue
+                        ssid_part = parts[0]
+                        security = parts[1]
+                        wifi['config_key_ssid'] = ssid_part
+                        wifi['config_key_security'] = security
+                    elif name in ('PreSharedKey', 'SSID'):
+                        val = string.text[1:-1]
+                        wifi[name] = val
+                    else:
+                        wifi[name] = string.text
+                for boolean in config.findall('boolean'):
+                    name = boolean.attrib.get('name', 'NONAME')
+                    value = boolean.attrib.get('value', '')
+                    wifi[name] = value
+            elif config.tag == 'IpConfiguration':
+                for string in config.findall('string'):
+                    name = string.attrib.get('name', None)
+                    if name:
+                        wifi[name] = string.text
+        logs.append(wifi)
+    return logs
+
+def ReadStreamed(data):
+    logs = []
+    providers_settings_parser.ReadWifiNewConfig(memoryview(data), logs)
+    return logs
+
+@pytest.mark.parametrize('read_size', [7, 64, 64 * 1024])
+def test_streamed_matches_findall(monkeypatch, read_size):
+    monkeypatch.setattr(providers_settings_parser, 'WIFI_XML_READ_SIZE', read_size)
+    expected = ReadWifiNewConfigFindall(WIFI_XML)
+    assert len(expected) == 5
+    assert ReadStreamed(WIFI_XML) == expected
+
+def test_generated_networks_match_findall(monkeypatch):
+    monkeypatch.setattr(providers_settings_parser, 'WIFI_XML_READ_SIZE', 1000)
+    data = BuildWifiConfigXml(RandomNetworks(random.Random(3), 200))
+    expected = ReadWifiNewConfigFindall(data)
+    assert len(expected) == 200
+    assert ReadStreamed(data) == expected
+
+def test_bad_xml_raises():
+    with pytest.raises(ET.ParseError):
+        ReadStreamed(WIFI_XML[:-40])